@@ -7,37 +7,95 @@ API Backend for Armorum Financial System
 
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-import sqlite3
-import pandas as pd
 import os
-import json
+import hashlib
 from datetime import datetime
-import tempfile
-from werkzeug.utils import secure_filename
+import threading
 
 # Import our data generation modules
 from scripts.data_generation.generate_test_data import ArmorumDataGenerator
 from scripts.data_generation.file_generators import FileGenerators
 from scripts.data_generation.database_setup import DatabaseSetup
+from dian_client import create_dian_client_from_env
+from product_matcher import ProductMatcher
+from backend.artifact_store import ArtifactStore
+from backend.staging import StagingArea, StagingFullError
+from sqlite_pool import SQLitePool
+from migrations import apply_migrations
+from catalog_search import fts_match_query, keyset_page, table_version
+from dashboard_stats import read_statistics, reconcile_statistics, start_reconciler
+from invoice_loader import load_invoices, read_invoice_file
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'csv', 'xml', 'txt', 'xlsx'}
+# XML has no invoice-line layout that invoice_loader can read, so it is refused up front
+ALLOWED_EXTENSIONS = {'csv', 'txt', 'xlsx'}
 DB_PATH = 'data/armorum_production.db'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+CATALOG_PAGE_SIZE = 100
+CATALOG_MAX_PAGE_SIZE = 500
+CATALOG_FORMAT_VERSION = '1'  # Bump to invalidate catalog ETags after a response format change
+STATISTICS_RECONCILE_SECONDS = int(os.getenv('STATISTICS_RECONCILE_MINUTES', 60)) * 60
+DIAN_BULK_MAX_NITS = 1000
+HOMOLOGACION_MAX_PRODUCTOS = 10000
+EXPORTS_FOLDER = os.getenv('EXPORTS_FOLDER', 'exports')
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv('ARTIFACT_STORE_MAX_MB', 2048)) * 1024 * 1024
+PLANTILLA_FORMAT_VERSION = '1'  # Bump to invalidate stored plantillas after a format change
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+STAGING_FOLDER = os.path.join(UPLOAD_FOLDER, 'staging')
+STAGING_MAX_BYTES = int(os.getenv('STAGING_MAX_GB', 20)) * 1024 * 1024 * 1024
+STAGING_RETRY_AFTER_SECONDS = 30
+STAGING_ORPHAN_SECONDS = 6 * 3600
+STAGING_JANITOR_SECONDS = 15 * 60
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Shared DIAN client (concurrency pool, rate limit and coalescing across requests)
+dian_client = create_dian_client_from_env()
+
+# BMC catalog index, built on first use (see get_product_matcher)
+product_matcher = None
+product_matcher_lock = threading.Lock()
+
+# Generated Plantilla Simona files, stored once per lote data version
+artifact_store = ArtifactStore(EXPORTS_FOLDER, max_bytes=ARTIFACT_STORE_MAX_BYTES)
+
+# Uploads get a unique staging path each; the janitor removes crash leftovers
+upload_staging = StagingArea(
+    STAGING_FOLDER,
+    max_bytes=STAGING_MAX_BYTES,
+    retry_after=STAGING_RETRY_AFTER_SECONDS,
+    huerfanos_segundos=STAGING_ORPHAN_SECONDS
+)
+staged_in_use = set()  # Paths still owned by an upload request
+staged_in_use_lock = threading.Lock()
+
+def staged_paths_in_use():
+    with staged_in_use_lock:
+        return list(staged_in_use)
+
+def release_staged(path):
+    upload_staging.liberar(path)
+    with staged_in_use_lock:
+        staged_in_use.discard(path)
+
+upload_staging.iniciar_janitor(staged_paths_in_use, STAGING_JANITOR_SECONDS)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Pooled WAL connections; conn.close() gives the connection back to the pool
+db_pool = SQLitePool(DB_PATH, max_connections=DB_POOL_SIZE, pragmas={'busy_timeout': DB_BUSY_TIMEOUT_MS})
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db_pool.connection()
+
+@app.teardown_request
+def release_db_connection(exc):
+    """Return a connection left borrowed by a route that raised before conn.close()"""
+    db_pool.release_thread()
 
 def init_database():
     """Initialize database if it doesn't exist"""
@@ -51,6 +109,21 @@ def init_database():
         generator.create_master_files()
         generator.load_data_to_db()
         generator.close()
+    
+    # Schema changes on top of DatabaseSetup (indexes, items_count, file_hashes, dian_cache)
+    conn = get_db_connection()
+    apply_migrations(conn)
+    conn.close()
+
+def get_product_matcher(reload=False):
+    """Shared productos_bmc index; reload=True rebuilds it after catalog changes"""
+    global product_matcher
+    with product_matcher_lock:
+        if product_matcher is None or reload:
+            conn = get_db_connection()
+            product_matcher = ProductMatcher.from_sqlite(conn)
+            conn.close()
+        return product_matcher
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -90,16 +163,36 @@ def cargar_factura():
         if not allowed_file(file.filename):
             return jsonify({'error': 'File type not allowed'}), 400
         
-        # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
+        # Save uploaded file to a unique staging path (same-name uploads no longer collide)
+        try:
+            staged = upload_staging.guardar(file.stream, file.filename, request.content_length)
+        except StagingFullError as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 503
+        filename = staged['nombre']
+        filepath = staged['path']
+        with staged_in_use_lock:
+            staged_in_use.add(filepath)
+        
+        # Same file already processed for this client: answer with that lote (force=true reprocesses)
+        cliente = request.form.get('cliente', '')
+        force = request.form.get('force', request.args.get('force', '')).lower() in ('1', 'true', 'yes')
+        previous_lote_id = find_processed_lote(cliente, staged['sha256'])
+        if previous_lote_id is not None and not force:
+            release_staged(filepath)
+            return jsonify({
+                'status': 'success',
+                'lote_id': previous_lote_id,
+                'sha256': staged['sha256'],
+                'duplicate': True,
+                'message': f'File {filename} was already processed in lote {previous_lote_id}'
+            })
         
         # Determine file type
         file_ext = filename.rsplit('.', 1)[1].lower()
         file_type = {
             'csv': 'CSV',
-            'xml': 'XML',
             'txt': 'TXT',
             'xlsx': 'EXCEL'
         }.get(file_ext, 'UNKNOWN')
@@ -112,24 +205,55 @@ def cargar_factura():
             VALUES (?, ?, 'RECIBIDO')
         ''', (filename, file_type))
         lote_id = cursor.lastrowid
+        cursor.execute('''
+            INSERT INTO file_hashes (cliente, sha256, lote_id, fecha_registro) VALUES (?, ?, ?, ?)
+            ON CONFLICT(cliente, sha256) DO UPDATE SET
+                lote_id = excluded.lote_id,
+                fecha_registro = excluded.fecha_registro,
+                cargas_duplicadas = 0
+        ''', (cliente, staged['sha256'], lote_id, datetime.now().isoformat()))
         conn.commit()
         conn.close()
         
         # Process file asynchronously (for now just simulate)
         # In production, this should be a background task
-        process_file_async(lote_id, filepath, file_type)
+        try:
+            process_file_async(lote_id, filepath, file_type)
+        finally:
+            release_staged(filepath)
         
         return jsonify({
             'status': 'success',
             'lote_id': lote_id,
+            'sha256': staged['sha256'],
+            'duplicate': False,
             'message': f'File {filename} uploaded successfully'
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def find_processed_lote(cliente, sha256):
+    """Lote that already processed this file for the client, or None (failed lotes are reprocessed)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT h.lote_id FROM file_hashes h
+        JOIN lotes l ON l.id = h.lote_id
+        WHERE h.cliente = ? AND h.sha256 = ? AND l.estado != 'ERROR_PROCESAMIENTO'
+    ''', (cliente, sha256))
+    row = cursor.fetchone()
+    if row is not None:
+        cursor.execute('''
+            UPDATE file_hashes SET cargas_duplicadas = cargas_duplicadas + 1
+            WHERE cliente = ? AND sha256 = ?
+        ''', (cliente, sha256))
+        conn.commit()
+    conn.close()
+    return row['lote_id'] if row is not None else None
+
 def process_file_async(lote_id, filepath, file_type):
-    """Process uploaded file (simulate processing)"""
+    """Parse the uploaded file and load its facturas/items (replaces any previous load of the lote)"""
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -137,36 +261,14 @@ def process_file_async(lote_id, filepath, file_type):
         # Update status to processing
         cursor.execute('UPDATE lotes SET estado = "PROCESANDO" WHERE id = ?', (lote_id,))
         conn.commit()
+        # Don't hold a connection while parsing
+        conn.close()
         
-        # Simulate processing based on file type
-        if file_type == 'CSV':
-            df = pd.read_csv(filepath)
-            total_facturas = len(df)
-            
-            # Simulate some errors for demo
-            errores_productos = max(0, int(total_facturas * 0.1))  # 10% products with issues
-            errores_terceros = max(0, int(total_facturas * 0.05))  # 5% terceros with issues
-            facturas_procesadas = total_facturas - errores_productos - errores_terceros
-            
-            estado = 'COMPLETADO_EXITOSO' if errores_productos == 0 and errores_terceros == 0 else 'COMPLETADO_CON_ADVERTENCIAS'
-            
-        else:
-            # For other file types, simulate basic processing
-            total_facturas = 25  # Simulate
-            facturas_procesadas = 23
-            errores_productos = 1
-            errores_terceros = 1
-            estado = 'COMPLETADO_CON_ADVERTENCIAS'
-        
-        # Update lote with results
-        cursor.execute('''
-            UPDATE lotes 
-            SET estado = ?, total_facturas = ?, facturas_procesadas = ?,
-                errores_productos = ?, errores_terceros = ?
-            WHERE id = ?
-        ''', (estado, total_facturas, facturas_procesadas, errores_productos, errores_terceros, lote_id))
+        df = read_invoice_file(filepath, file_type)
         
-        conn.commit()
+        # Bulk insert in one transaction; also writes estado and counters to the lote
+        conn = get_db_connection()
+        load_invoices(conn, lote_id, df, get_product_matcher())
         conn.close()
         
     except Exception as e:
@@ -193,13 +295,12 @@ def get_lote_detail(lote_id):
         if not lote:
             return jsonify({'error': 'Lote not found'}), 404
         
-        # Get facturas for this lote
+        # Get facturas for this lote (items_count is kept up to date by triggers, see migrations.py)
         cursor.execute('''
-            SELECT f.*, COUNT(i.id) as items_count
+            SELECT f.*
             FROM facturas f
-            LEFT JOIN items_factura i ON f.id = i.factura_id
             WHERE f.lote_id = ?
-            GROUP BY f.id
+            ORDER BY f.id
         ''', (lote_id,))
         facturas = cursor.fetchall()
         
@@ -213,6 +314,22 @@ def get_lote_detail(lote_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def lote_data_version(cursor, lote):
+    """Hash of everything the Plantilla Simona of a lote is built from"""
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(MAX(id), 0) FROM facturas WHERE lote_id = ?
+    ''', (lote['id'],))
+    facturas = tuple(cursor.fetchone())
+    cursor.execute('''
+        SELECT COUNT(i.id), COALESCE(MAX(i.id), 0)
+        FROM items_factura i
+        JOIN facturas f ON f.id = i.factura_id
+        WHERE f.lote_id = ?
+    ''', (lote['id'],))
+    items = tuple(cursor.fetchone())
+    parts = (sorted(dict(lote).items()), facturas, items, PLANTILLA_FORMAT_VERSION)
+    return hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
 @app.route('/api/facturas/lotes/<int:lote_id>/descargar-simona', methods=['GET'])
 def descargar_plantilla_simona(lote_id):
     """Download Plantilla Simona for a processed lote"""
@@ -222,99 +339,235 @@ def descargar_plantilla_simona(lote_id):
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM lotes WHERE id = ?', (lote_id,))
         lote = cursor.fetchone()
-        conn.close()
         
         if not lote:
+            conn.close()
             return jsonify({'error': 'Lote not found'}), 404
         
         if lote['estado'] not in ['COMPLETADO_EXITOSO', 'COMPLETADO_CON_ADVERTENCIAS']:
+            conn.close()
             return jsonify({'error': 'Lote not ready for download'}), 400
         
-        # Generate Plantilla Simona
-        generator = ArmorumDataGenerator(DB_PATH)
-        file_gen = FileGenerators(generator.db_setup.conn)
-        
-        # Generate temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
-        temp_filename = temp_file.name
-        temp_file.close()
-        
-        file_gen.generate_plantilla_simona(lote_id, temp_filename)
-        generator.close()
+        version = lote_data_version(cursor, lote)
+        conn.close()
         
+        name = ArtifactStore.clave('plantilla_simona', lote_id, version, 'xlsx')
+        etag = ArtifactStore.etag(name)
+        # Revalidation answers before touching the store or the generator
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        def generate(path):
+            generator = ArmorumDataGenerator(DB_PATH)
+            try:
+                FileGenerators(generator.db_setup.conn).generate_plantilla_simona(lote_id, path)
+            finally:
+                generator.close()
+        
+        # Opened by the store, so LRU eviction can't unlink it before it is sent
+        artifact = artifact_store.abrir_o_generar(name, generate)
+        
+        # conditional=True handles If-None-Match and Range/If-Range (206) against our ETag
         return send_file(
-            temp_filename,
+            artifact,
             as_attachment=True,
             download_name=f'plantilla_simona_lote_{lote_id}.xlsx',
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            mimetype=XLSX_MIMETYPE,
+            conditional=True,
+            etag=etag
         )
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/uploads/stats', methods=['GET'])
+def get_uploads_stats():
+    """Staging quota usage, quota rejections and removed orphans"""
+    return jsonify(upload_staging.stats())
+
+@app.route('/api/estadisticas/reconciliar', methods=['POST'])
+def reconciliar_estadisticas():
+    """Recompute the dashboard counters from the source tables now"""
+    try:
+        conn = get_db_connection()
+        drift = reconcile_statistics(conn)
+        conn.close()
+        return jsonify({'status': 'success', 'corrected_counters': drift})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/stats', methods=['GET'])
+def get_db_stats():
+    """Connection pool usage: connections opened, reuse and waits"""
+    return jsonify(db_pool.stats())
+
+@app.route('/api/exports/stats', methods=['GET'])
+def get_exports_stats():
+    """Artifact store usage: entries, bytes, hits/misses and evictions"""
+    return jsonify(artifact_store.stats())
+
+def catalog_page_args():
+    """(limit, cursor) from the query string; ValueError for a bad limit"""
+    limit = int(request.args.get('limit', CATALOG_PAGE_SIZE))
+    if not 1 <= limit <= CATALOG_MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {CATALOG_MAX_PAGE_SIZE}')
+    return limit, request.args.get('cursor')
+
+def catalog_response(conn, table, build_page):
+    """
+    Page response with an ETag from the table's write version (bumped by triggers).
+
+    A matching If-None-Match is answered with 304 before running the query.
+    """
+    etag = f'{table}-{CATALOG_FORMAT_VERSION}-{table_version(conn, table)}'
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build_page())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @app.route('/api/productos', methods=['GET'])
 def get_productos():
-    """Get all BMC products"""
+    """Active BMC products, keyset-paginated (?limit, ?cursor), filtered by ?grupo and searched with ?q"""
     try:
+        limit, cursor = catalog_page_args()
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT codigo_bmc, desc_subya, desc_caracteristica, grupo, activo
-            FROM productos_bmc
-            WHERE activo = 1
-            ORDER BY desc_subya, desc_caracteristica
-        ''')
-        productos = cursor.fetchall()
+        
+        def build_page():
+            where, params = ['activo = 1'], []
+            if request.args.get('grupo'):
+                where.append('grupo = ?')
+                params.append(request.args['grupo'])
+            match = fts_match_query(request.args.get('q', ''))
+            if match:
+                where.append('rowid IN (SELECT rowid FROM productos_bmc_fts WHERE productos_bmc_fts MATCH ?)')
+                params.append(match)
+            return keyset_page(conn, '''
+                SELECT codigo_bmc, desc_subya, desc_caracteristica, grupo, activo
+                FROM productos_bmc
+            ''', where, params, ('desc_subya', 'desc_caracteristica', 'codigo_bmc'), cursor, limit)
+        
+        response = catalog_response(conn, 'productos_bmc', build_page)
         conn.close()
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/productos/homologar', methods=['POST'])
+def homologar_productos():
+    """Match product descriptions against the BMC catalog ({"productos": [...]})"""
+    try:
+        data = request.get_json(silent=True) or {}
+        productos = [str(p) for p in data.get('productos', []) if p is not None]
+        if not productos:
+            return jsonify({'error': 'No products provided'}), 400
+        if len(productos) > HOMOLOGACION_MAX_PRODUCTOS:
+            return jsonify({'error': f'Maximum {HOMOLOGACION_MAX_PRODUCTOS} products per request'}), 400
         
-        return jsonify([dict(p) for p in productos])
+        matcher = get_product_matcher(reload=bool(data.get('recargar')))
+        resultados = matcher.match_many(productos)
+        
+        return jsonify({
+            'resultados': [resultados[p] for p in dict.fromkeys(productos)],
+            'sin_coincidencia': sum(1 for r in resultados.values() if r['codigo_bmc'] is None),
+            'indice': matcher.stats
+        })
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/terceros', methods=['GET'])
 def get_terceros():
-    """Get all terceros"""
+    """Terceros, keyset-paginated (?limit, ?cursor), filtered by ?tipo_tercero / ?estado_dian and searched with ?q"""
     try:
+        limit, cursor = catalog_page_args()
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT nit, razon_social, tipo_tercero, ciudad, estado_dian
-            FROM terceros
-            ORDER BY razon_social
-        ''')
-        terceros = cursor.fetchall()
-        conn.close()
         
-        return jsonify([dict(t) for t in terceros])
+        def build_page():
+            where, params = [], []
+            for column in ('tipo_tercero', 'estado_dian'):
+                if request.args.get(column):
+                    where.append(f'{column} = ?')
+                    params.append(request.args[column])
+            match = fts_match_query(request.args.get('q', ''))
+            if match:
+                where.append('rowid IN (SELECT rowid FROM terceros_fts WHERE terceros_fts MATCH ?)')
+                params.append(match)
+            return keyset_page(conn, '''
+                SELECT nit, razon_social, tipo_tercero, ciudad, estado_dian
+                FROM terceros
+            ''', where, params, ('razon_social', 'nit'), cursor, limit)
+        
+        response = catalog_response(conn, 'terceros', build_page)
+        conn.close()
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def guardar_resultados_dian(resultados):
+    """Write DIAN results back to terceros and dian_cache in one transaction"""
+    fecha = datetime.now().isoformat()
+    filas = [(r['estado_dian'], r['nit']) for r in resultados if 'estado_dian' in r]
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.executemany('''
+        UPDATE terceros SET estado_dian = ? WHERE nit = ?
+    ''', filas)
+    cursor.executemany('''
+        INSERT INTO dian_cache (nit, estado_dian, fecha_validacion) VALUES (?, ?, ?)
+        ON CONFLICT(nit) DO UPDATE SET
+            estado_dian = excluded.estado_dian,
+            fecha_validacion = excluded.fecha_validacion
+    ''', [(nit, estado, fecha) for estado, nit in filas])
+    conn.commit()
+    conn.close()
+    return fecha
+
 @app.route('/api/terceros/<nit>/validar-dian', methods=['POST'])
 def validar_tercero_dian(nit):
-    """Validate tercero with DIAN (simulated)"""
+    """Validate tercero with DIAN"""
     try:
-        # Simulate DIAN validation
-        import time
-        time.sleep(1)  # Simulate API delay
+        resultado = dian_client.validar_sync(nit)
+        fecha = guardar_resultados_dian([resultado])
         
-        # Random validation result for demo
-        import random
-        estados = ['ACTIVO', 'INACTIVO', 'NO_ENCONTRADO']
-        estado = random.choice(estados)
+        return jsonify({
+            'nit': nit,
+            'estado_dian': resultado['estado_dian'],
+            'fecha_validacion': fecha
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/terceros/validar-dian', methods=['POST'])
+def validar_terceros_dian_bulk():
+    """Validate a list of NITs with DIAN in parallel ({"nits": [...]})"""
+    try:
+        data = request.get_json(silent=True) or {}
+        nits = [str(nit).strip() for nit in data.get('nits', []) if str(nit).strip()]
+        if not nits:
+            return jsonify({'error': 'No NITs provided'}), 400
+        if len(nits) > DIAN_BULK_MAX_NITS:
+            return jsonify({'error': f'Maximum {DIAN_BULK_MAX_NITS} NITs per request'}), 400
         
-        # Update tercero in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE terceros SET estado_dian = ? WHERE nit = ?
-        ''', (estado, nit))
-        conn.commit()
-        conn.close()
+        resultados = list(dian_client.validar_muchos_sync(nits).values())
+        fecha = guardar_resultados_dian(resultados)
         
         return jsonify({
-            'nit': nit,
-            'estado_dian': estado,
-            'fecha_validacion': datetime.now().isoformat()
+            'resultados': resultados,
+            'validados': sum(1 for r in resultados if 'estado_dian' in r),
+            'fallidos': sum(1 for r in resultados if 'error' in r),
+            'fecha_validacion': fecha,
+            'cliente': dian_client.stats
         })
     
     except Exception as e:
@@ -325,57 +578,28 @@ def get_estadisticas():
     """Get system statistics"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Count lotes by status
-        cursor.execute('''
-            SELECT estado, COUNT(*) as count
-            FROM lotes
-            GROUP BY estado
-        ''')
-        lotes_por_estado = dict(cursor.fetchall())
-        
-        # Count products by category
-        cursor.execute('''
-            SELECT grupo, COUNT(*) as count
-            FROM productos_bmc
-            WHERE activo = 1
-            GROUP BY grupo
-        ''')
-        productos_por_categoria = dict(cursor.fetchall())
-        
-        # Count terceros by DIAN status
-        cursor.execute('''
-            SELECT estado_dian, COUNT(*) as count
-            FROM terceros
-            GROUP BY estado_dian
-        ''')
-        terceros_por_estado_dian = dict(cursor.fetchall())
         
-        # Total facturas processed today
-        cursor.execute('''
-            SELECT COUNT(*) as count
-            FROM lotes
-            WHERE DATE(fecha_carga) = DATE('now')
-        ''')
-        lotes_hoy = cursor.fetchone()[0]
+        # Materialized counters (kept current by triggers, see migrations.py)
+        stats = read_statistics(conn)
         
         conn.close()
         
         return jsonify({
-            'lotes_por_estado': lotes_por_estado,
-            'productos_por_categoria': productos_por_categoria,
-            'terceros_por_estado_dian': terceros_por_estado_dian,
-            'lotes_procesados_hoy': lotes_hoy,
+            'lotes_por_estado': stats['lotes_por_estado'],
+            'productos_por_categoria': stats['productos_por_categoria'],
+            'terceros_por_estado_dian': stats['terceros_por_estado_dian'],
+            'lotes_procesados_hoy': stats['lotes_por_fecha'].get(datetime.utcnow().strftime('%Y-%m-%d'), 0),
             'timestamp': datetime.now().isoformat()
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Create and migrate the database at import, so WSGI servers that never run __main__ get the schema too
+init_database()
+
 if __name__ == '__main__':
-    # Initialize database on startup
-    init_database()
+    start_reconciler(get_db_connection, STATISTICS_RECONCILE_SECONDS)
     
     # Run the application
     app.run(host='0.0.0.0', port=8080, debug=True)
@@ -1,3 +1,5 @@
+import os
+
 # Firebase Project ID (replace with your actual project ID)
 FIREBASE_PROJECT_ID = "armorum-project"
 
@@ -7,12 +9,76 @@ COLLECTIONS = {
     "LOGS": "logs", 
     "ERRORES": "errores",
     "EXCEPCIONES_DIAN": "excepciones_dian",
-    "DIAN_CACHE": "dian_cache"
+    "DIAN_CACHE": "dian_cache",
+    "HOMOLOGACIONES": "homologaciones",
+    "GRUPOS_CARGA": "grupos_carga",
+    "FILE_HASHES": "file_hashes",
+    "ESTADISTICAS": "estadisticas"
+}
+
+# Local read cache in FirebaseService (TTL in seconds per collection)
+CACHE_TTL_SECONDS = {
+    "lotes": 5,  # Lotes en proceso: el frontend los consulta mientras cambian
+    "logs": 5,
+    "errores": 5,
+    "finalizados": 3600  # Lotes completados (y sus logs/errores) ya no cambian
 }
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 1000))  # Entradas por colección (LRU)
+
+# Contadores materializados del dashboard (un documento en 'estadisticas')
+ESTADISTICAS_DOC_ID = "global"
+ESTADISTICAS_DIAS = 90  # Días que se conservan en lotesPorFecha
+ESTADISTICAS_RECONCILIACION_MINUTOS = float(os.getenv("ESTADISTICAS_RECONCILIACION_MINUTOS", 60))
 
 # DIAN Cache TTL (days)
-DIAN_CACHE_TTL_DAYS = 30
+DIAN_CACHE_TTL_DAYS = int(os.getenv("DIAN_CACHE_TTL_DAYS", 30))
+DIAN_CACHE_NEGATIVE_TTL_DAYS = int(os.getenv("DIAN_CACHE_NEGATIVE_TTL_DAYS", 1))  # Resultados No_Encontrado
+# Capa en memoria delante de la colección dian_cache
+DIAN_CACHE_MEMORY_TTL_SECONDS = 3600
+DIAN_CACHE_MISS_TTL_SECONDS = 300  # NIT sin registro en Firestore
+DIAN_CACHE_MEMORY_ENTRIES = 50_000
+
+# Homologation memory: seconds before a client's mappings are reloaded from Firestore
+# (picks up corrections made on other instances)
+HOMOLOGACION_RECARGA_SEGUNDOS = int(os.getenv("HOMOLOGACION_RECARGA_SEGUNDOS", 300))
+
+# Topes de disco: los valores por defecto caben en el despliegue de deploy.sh
+# (Cloud Run, 512Mi, sin volumen: el sistema de archivos vive en la misma
+# memoria de la instancia). Archivos de varios GB requieren montar un volumen
+# en REGISTROS_DIR/EXPORTS_DIR/UPLOAD_SESSIONS_DIR/STAGING_DIR y subir estos topes.
+
+# Registros normalizados por lote y plantillas generadas para descarga
+REGISTROS_DIR = os.getenv("REGISTROS_DIR", "registros")
+EXPORTS_DIR = os.getenv("EXPORTS_DIR", "exports")
+# Tope del almacén de artefactos en EXPORTS_DIR (se desalojan los menos usados)
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_MAX_MB", 32)) * 1024 * 1024
 
 # File upload settings
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE_MB", 50)) * 1024 * 1024  # Carga en una sola solicitud
+# Cargas reanudables por bloques; la sesión reserva el tamaño completo al iniciar
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE_MB", 100)) * 1024 * 1024
+UPLOAD_MAX_CHUNK_SIZE = int(os.getenv("UPLOAD_MAX_CHUNK_MB", 64)) * 1024 * 1024
+UPLOAD_SESSIONS_DIR = os.getenv("UPLOAD_SESSIONS_DIR", os.path.join("uploads", "sesiones"))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", 24))  # Sesiones sin actividad se eliminan
+# Cupo de las sesiones abiertas: lo preasignado por todas juntas y cuántas pueden estar abiertas a la vez
+UPLOAD_SESSIONS_MAX_BYTES = int(os.getenv("UPLOAD_SESSIONS_MAX_MB", 100)) * 1024 * 1024
+UPLOAD_MAX_SESSIONS = int(os.getenv("UPLOAD_MAX_SESSIONS", 20))
+
+# Staging de archivos cargados: ruta única por carga y cupo de disco compartido
+STAGING_DIR = os.getenv("STAGING_DIR", os.path.join("uploads", "staging"))
+STAGING_MAX_BYTES = int(os.getenv("STAGING_MAX_MB", 128)) * 1024 * 1024
+STAGING_RETRY_AFTER_SECONDS = int(os.getenv("STAGING_RETRY_AFTER_SECONDS", 30))  # Retry-After del 503 por cupo
+STAGING_ORPHAN_HOURS = float(os.getenv("STAGING_ORPHAN_HOURS", 6))  # Sin actividad y sin trabajo activo
+STAGING_JANITOR_MINUTES = float(os.getenv("STAGING_JANITOR_MINUTES", 15))
 ALLOWED_EXTENSIONS = ['.xlsx', '.xls', '.csv', '.txt']
+MAX_ARCHIVOS_POR_GRUPO = int(os.getenv("MAX_ARCHIVOS_POR_GRUPO", 100))  # cargar-multiple (archivos o entradas del zip)
+MAX_EXCEPCIONES_BULK = int(os.getenv("MAX_EXCEPCIONES_BULK", 500))  # ids por solicitud en excepciones/bulk
+
+# Background processing (cola de lotes)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))  # Hilos que orquestan cada lote
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", 2))  # Procesos para parseo CPU-bound
+# Lotes 'En Cola'/'Procesando' sin trabajo en esta instancia ni archivo en staging: pasan a Error tras este tiempo
+JOB_HUERFANO_MINUTOS = float(os.getenv("JOB_HUERFANO_MINUTOS", 30))
+
+# Validación de registros: errores por lote que se escriben en Firestore (el conteo total se conserva)
+VALIDATION_MAX_STORED_ERRORS = int(os.getenv("VALIDATION_MAX_STORED_ERRORS", 10_000))
@@ -0,0 +1,238 @@
+# backend/artifact_store.py
+"""
+Almacén local de artefactos generados para descarga (plantillas de lotes).
+
+Cada artefacto se genera una sola vez y se guarda bajo una clave direccionada
+por contenido: lote + hash de la versión de sus datos. Mientras los datos no
+cambien, la misma clave (y el mismo ETag) sirve todas las descargas; si
+cambian, la clave cambia y la versión anterior sale por desalojo LRU cuando
+el almacén supera su tope de bytes.
+
+Los artefactos se entregan como archivos ya abiertos: el desalojo puede
+borrar un artefacto en cualquier momento, pero una descarga en curso sigue
+leyendo su descriptor (en POSIX el contenido vive hasta cerrarlo).
+
+No depende de FastAPI ni de Flask: las respuestas HTTP (ETag, Range) se arman
+en backend/main.py y en app.py, que comparten este módulo.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+HASH_BLOCK_SIZE = 1024 * 1024
+TEMP_SUFFIX = '.tmp'
+TEMP_MAX_AGE_SECONDS = 3600  # Temporales más viejos quedaron de una generación interrumpida
+
+_NOMBRE_INSEGURO_RE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def hash_archivo(path: str) -> str:
+    """SHA-256 del contenido, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(bloque)
+    return digest.hexdigest()
+
+def version_por_stat(path: str) -> str:
+    """Versión barata (tamaño + mtime) para archivos sin hash de contenido registrado"""
+    stat = os.stat(path)
+    return hashlib.sha256(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Rango de bytes (inicio, fin inclusive) de un encabezado Range de un solo rango.
+
+    None si el encabezado no aplica (otra unidad, varios rangos o sintaxis
+    inválida): se responde el archivo completo. ValueError si el rango no es
+    satisfacible (416).
+    """
+    unidad, _, especificacion = header.partition('=')
+    if unidad.strip().lower() != 'bytes' or ',' in especificacion:
+        return None
+    inicio, guion, fin = (p.strip() for p in especificacion.strip().partition('-'))
+    if not guion:
+        return None
+    if not (inicio or fin) or not (inicio or '0').isdigit() or not (fin or '0').isdigit():
+        return None
+    if not inicio:
+        # Sufijo: los últimos N bytes
+        sufijo = int(fin)
+        if sufijo == 0 or size == 0:
+            raise ValueError(f"Rango no satisfacible: {header}")
+        return max(0, size - sufijo), size - 1
+    inicio = int(inicio)
+    fin = int(fin) if fin else max(inicio, size - 1)
+    if fin < inicio:
+        return None
+    if inicio >= size:
+        raise ValueError(f"Rango no satisfacible: {header}")
+    return inicio, min(fin, size - 1)
+
+def iter_rango(archivo: BinaryIO, inicio: int, fin: int, bloque: int = 64 * 1024) -> Iterator[bytes]:
+    """Bytes [inicio, fin] de un archivo abierto, por bloques; lo cierra al terminar"""
+    with archivo as f:
+        f.seek(inicio)
+        restantes = fin - inicio + 1
+        while restantes > 0:
+            datos = f.read(min(bloque, restantes))
+            if not datos:
+                return
+            restantes -= len(datos)
+            yield datos
+
+
+class ArtifactStore:
+    """Directorio de artefactos inmutables con tope de tamaño y desalojo LRU"""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entradas: 'OrderedDict[str, int]' = OrderedDict()  # nombre -> bytes, del menos al más reciente
+        self._total = 0
+        self._generando: Dict[str, threading.Lock] = {}
+        self._stats = {'hits': 0, 'misses': 0, 'desalojos': 0, 'temporalesEliminados': 0}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.limpiar_temporales()
+        self._indexar()
+
+    @staticmethod
+    def clave(prefijo: str, lote_id: str, version: str, extension: str) -> str:
+        """Nombre del artefacto: cambia cuando cambia la versión de los datos"""
+        lote = _NOMBRE_INSEGURO_RE.sub('_', str(lote_id))
+        return f"{prefijo}_lote_{lote}-{version[:16]}.{extension}"
+
+    @staticmethod
+    def etag(nombre: str) -> str:
+        """ETag fuerte: el nombre ya identifica el contenido"""
+        return f'"{os.path.splitext(nombre)[0]}"'
+
+    def _indexar(self):
+        """Reconstruye el índice desde disco; el mtime guarda el último acceso entre reinicios"""
+        archivos = []
+        for entrada in os.scandir(self.root):
+            if entrada.is_file() and not entrada.name.endswith(TEMP_SUFFIX):
+                stat = entrada.stat()
+                archivos.append((stat.st_mtime, entrada.name, stat.st_size))
+        with self._lock:
+            for _, nombre, size in sorted(archivos):
+                self._entradas[nombre] = size
+                self._total += size
+        self._desalojar()
+
+    def limpiar_temporales(self, max_age: float = TEMP_MAX_AGE_SECONDS) -> int:
+        """Elimina temporales de generaciones interrumpidas"""
+        limite = time.time() - max_age
+        eliminados = 0
+        for entrada in os.scandir(self.root):
+            if entrada.name.endswith(TEMP_SUFFIX) and entrada.stat().st_mtime < limite:
+                try:
+                    os.remove(entrada.path)
+                    eliminados += 1
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            self._stats['temporalesEliminados'] += eliminados
+        return eliminados
+
+    def path(self, nombre: str) -> str:
+        return os.path.join(self.root, nombre)
+
+    def abrir(self, nombre: str) -> Optional[BinaryIO]:
+        """
+        Artefacto abierto para lectura si existe (lo marca como usado recientemente).
+
+        Se abre bajo el lock mientras sigue en el índice: _desalojar lo saca del
+        índice antes de borrarlo, así que nunca se abre uno ya elegido como víctima.
+        """
+        path = self.path(nombre)
+        with self._lock:
+            if nombre not in self._entradas:
+                return None
+            try:
+                archivo = open(path, 'rb')
+            except FileNotFoundError:
+                # Borrado por fuera del almacén
+                self._total -= self._entradas.pop(nombre)
+                return None
+            self._entradas.move_to_end(nombre)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return archivo
+
+    def abrir_o_generar(self, nombre: str, generar: Callable[[str], object]) -> BinaryIO:
+        """
+        Artefacto abierto para lectura; si no existe lo genera con generar(ruta_temporal).
+
+        Descargas concurrentes del mismo artefacto esperan una sola generación.
+        Quien llama debe cerrar el archivo (iter_rango lo cierra al terminar).
+        """
+        archivo = self.abrir(nombre)
+        if archivo is not None:
+            with self._lock:
+                self._stats['hits'] += 1
+            return archivo
+
+        with self._lock:
+            lock = self._generando.setdefault(nombre, threading.Lock())
+        with lock:
+            archivo = self.abrir(nombre)
+            if archivo is not None:
+                with self._lock:
+                    self._stats['hits'] += 1
+                return archivo
+
+            temporal = self.path(f".{nombre}.{uuid.uuid4().hex}{TEMP_SUFFIX}")
+            try:
+                generar(temporal)
+                size = os.path.getsize(temporal)
+                path = self.path(nombre)
+                os.replace(temporal, path)
+                with self._lock:
+                    archivo = open(path, 'rb')
+                    self._stats['misses'] += 1
+                    self._entradas[nombre] = size
+                    self._total += size
+            except BaseException:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+                raise
+            finally:
+                # Tras registrar la entrada: quien llegue después la encuentra con abrir()
+                with self._lock:
+                    self._generando.pop(nombre, None)
+        self._desalojar(protegido=nombre)
+        return archivo
+
+    def _desalojar(self, protegido: Optional[str] = None):
+        """Elimina los artefactos menos usados hasta quedar bajo max_bytes"""
+        while True:
+            with self._lock:
+                if self._total <= self.max_bytes:
+                    return
+                victima = next((n for n in self._entradas if n != protegido), None)
+                if victima is None:
+                    return
+                self._total -= self._entradas.pop(victima)
+                self._stats['desalojos'] += 1
+            try:
+                os.remove(self.path(victima))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entradas': len(self._entradas),
+                'bytes': self._total,
+                'maxBytes': self.max_bytes,
+                **self._stats,
+            }
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: lectura completa vs lectura por chunks en process_csv_excel_file.
+
+Genera un CSV sintético (1M filas por defecto) y ejecuta cada variante en un
+subproceso aislado para medir tiempo y pico de memoria (RSS).
+
+Uso:
+    python benchmarks/bench_csv_ingestion.py [--rows 1000000]
+"""
+import argparse
+import csv
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADERS = [
+    'NOMBRE USUARIO', 'NIT USUARIO', 'CIUDAD', 'FACT NRO', 'FECHA', 'FORMA DE PAGO',
+    'PRODUCTO', 'PRESENTACION', 'CANTIDAD', 'VALOR UNITARIO', 'TOTAL', '% IVA PRODUCTO'
+]
+
+def generate_csv(path: str, rows: int):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        for i in range(rows):
+            if i % 1000 == 999:
+                writer.writerow([''] * len(HEADERS))
+                continue
+            cantidad = i % 50 + 1
+            writer.writerow([
+                f"Cliente {i % 500} SAS", f"900{i % 1000000:06d}", "Bogotá", f"F-{i:07d}",
+                "15/03/2024", "CREDITO", "PAPA CRIOLLA", "KG", cantidad, 2500,
+                cantidad * 2500, 19
+            ])
+
+def legacy_read(path: str):
+    """Ruta anterior: DataFrame completo en memoria"""
+    import pandas as pd
+    df = pd.read_csv(path, encoding='utf-8')
+    return len(df), int(df.isnull().all(axis=1).sum())
+
+def chunked_read(path: str):
+    from file_processors import process_csv_excel_file
+    resultado = process_csv_excel_file(path, 'csv', os.path.basename(path))
+    return resultado['registros'], resultado['detalles']['emptyRows']
+
+def run_variant(variant: str, path: str):
+    import io
+    import contextlib
+    fn = legacy_read if variant == 'legacy' else chunked_read
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        registros, vacias = fn(path)
+    elapsed = time.perf_counter() - inicio
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{variant:8s} registros={registros} vacias={vacias} tiempo={elapsed:.2f}s rss_pico={peak_mb:.0f}MB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--variant', choices=['legacy', 'chunked'])
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'facturas.csv')
+        print(f"Generando CSV sintético de {args.rows} filas...")
+        generate_csv(path, args.rows)
+        print(f"Tamaño: {os.path.getsize(path) / 1024 / 1024:.1f}MB")
+        for variant in ('legacy', 'chunked'):
+            subprocess.run([sys.executable, __file__, '--variant', variant, '--file', path], check=True)
+
+if __name__ == '__main__':
+    main()
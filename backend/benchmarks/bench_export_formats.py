@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exportación de la plantilla en xlsx, csv, jsonl y parquet.
+
+Todos los formatos se generan desde el mismo CSV de registros normalizados
+(generar_exportacion). Cada formato corre en un subproceso aislado para medir
+filas/segundo, pico de memoria (RSS) y tamaño del archivo.
+
+Uso:
+    python benchmarks/bench_export_formats.py [--rows 1000000] [--formats csv jsonl parquet xlsx]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_plantilla_export import generate_registros
+from exports import FORMATOS_EXPORTACION, formatos_disponibles, generar_exportacion
+
+def run_format(formato: str, registros_path: str):
+    with tempfile.TemporaryDirectory() as tmp:
+        destino = os.path.join(tmp, f'plantilla.{formato}')
+        inicio = time.perf_counter()
+        filas = generar_exportacion(registros_path, destino, formato)
+        elapsed = time.perf_counter() - inicio
+        size_mb = os.path.getsize(destino) / 1024 / 1024
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{formato:8s} filas={filas:>8} tiempo={elapsed:7.2f}s filas/s={filas / elapsed:>10,.0f} "
+          f"rss_pico={peak_mb:6.0f}MB archivo={size_mb:6.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--formats', nargs='+', choices=list(FORMATOS_EXPORTACION), default=list(FORMATOS_EXPORTACION))
+    parser.add_argument('--format')
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.format:
+        run_format(args.format, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'registros.csv')
+        generate_registros(path, args.rows)
+        print(f"--- {args.rows} filas ({os.path.getsize(path) / 1024 / 1024:.1f}MB de registros)")
+        for formato in args.formats:
+            if formato not in formatos_disponibles():
+                print(f"{formato:8s} omitido (dependencia no instalada)")
+                continue
+            subprocess.run([sys.executable, __file__, '--format', formato, '--file', path], check=True)
+
+if __name__ == '__main__':
+    main()
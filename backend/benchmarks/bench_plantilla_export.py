@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exportación de la Plantilla Simona con Workbook normal vs write-only.
+
+Genera registros normalizados sintéticos (10k / 100k / 1M filas por defecto) y
+ejecuta cada variante en un subproceso aislado para medir filas/segundo y pico
+de memoria (RSS). La variante 'normal' (ws.cell sobre un Workbook en memoria,
+como la versión anterior de descargar_plantilla) se omite por encima de
+--normal-max-rows porque su memoria crece con cada celda.
+
+Uso:
+    python benchmarks/bench_plantilla_export.py [--rows 10000 100000 1000000]
+"""
+import argparse
+import csv
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exports import PLANTILLA_SIMONA_HEADERS
+
+def generate_registros(path: str, rows: int):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(PLANTILLA_SIMONA_HEADERS)
+        for i in range(rows):
+            cantidad = i % 50 + 1
+            writer.writerow([
+                f"Cliente {i % 500} SAS", f"900{i % 1000000:06d}-{i % 10}", "Bogotá", f"F-{i:07d}",
+                "15/03/2024", "CREDITO", "PAPA CRIOLLA", "KG", cantidad, 2500, cantidad * 2500, 19
+            ])
+
+def normal_export(registros_path: str, destino: str) -> int:
+    """Ruta anterior: Workbook en memoria y una llamada ws.cell por celda"""
+    from openpyxl import Workbook
+    from exports import COLUMNAS_NUMERICAS, _numero, iter_registros
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Plantilla Comiagro"
+    for col, header in enumerate(PLANTILLA_SIMONA_HEADERS, 1):
+        ws.cell(row=1, column=col, value=header)
+    filas = 0
+    for row, fila in enumerate(iter_registros(registros_path), 2):
+        for i in COLUMNAS_NUMERICAS:
+            fila[i] = _numero(fila[i])
+        for col, valor in enumerate(fila, 1):
+            ws.cell(row=row, column=col, value=valor)
+        filas += 1
+    wb.save(destino)
+    return filas
+
+def write_only_export(registros_path: str, destino: str) -> int:
+    from exports import generar_exportacion
+    return generar_exportacion(registros_path, destino, "xlsx")
+
+def run_variant(variant: str, registros_path: str):
+    fn = normal_export if variant == 'normal' else write_only_export
+    with tempfile.TemporaryDirectory() as tmp:
+        destino = os.path.join(tmp, 'plantilla.xlsx')
+        inicio = time.perf_counter()
+        filas = fn(registros_path, destino)
+        elapsed = time.perf_counter() - inicio
+        size_mb = os.path.getsize(destino) / 1024 / 1024
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{variant:10s} filas={filas:>8} tiempo={elapsed:7.2f}s filas/s={filas / elapsed:>9,.0f} "
+          f"rss_pico={peak_mb:6.0f}MB xlsx={size_mb:.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--normal-max-rows', type=int, default=100_000)
+    parser.add_argument('--variant', choices=['normal', 'write_only'])
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, f'registros_{rows}.csv')
+            generate_registros(path, rows)
+            print(f"--- {rows} filas ({os.path.getsize(path) / 1024 / 1024:.1f}MB de registros)")
+            variants = ['write_only'] + (['normal'] if rows <= args.normal_max_rows else [])
+            for variant in variants:
+                subprocess.run([sys.executable, __file__, '--variant', variant, '--file', path], check=True)
+
+if __name__ == '__main__':
+    main()
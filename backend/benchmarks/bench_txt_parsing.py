@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput (líneas/seg) del parser TXT en streaming.
+
+Genera un archivo plano de facturación con las 15 columnas estándar (500MB por
+defecto) y mide process_txt_file (conteo/validación) e iter_txt_records
+(registros estructurados), junto con el pico de memoria (RSS).
+
+Uso:
+    python benchmarks/bench_txt_parsing.py [--mb 500] [--separador tab|pipe|espacios]
+"""
+import argparse
+import contextlib
+import io
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_processors import TXT_EXPECTED_COLUMNS, iter_txt_records, process_txt_file, sniff_encoding
+
+SEPARADORES = {'tab': '\t', 'pipe': '|', 'espacios': '   '}
+
+def generate_txt(path: str, size_mb: int, separador: str) -> int:
+    objetivo = size_mb * 1024 * 1024
+    lineas = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("ARMORUM - FORMATO FACTURAS PLANO\n")
+        f.write("=" * 80 + "\n")
+        f.write(separador.join(TXT_EXPECTED_COLUMNS) + "\n")
+        while f.tell() < objetivo:
+            bloque = []
+            for i in range(lineas, lineas + 10_000):
+                cantidad = i % 50 + 1
+                bloque.append(separador.join([
+                    "DISTRIBUIDORA COMIAGRO SAS", "900123456", f"CLIENTE {i % 500} SAS",
+                    f"800{i % 1000000:06d}", "BOGOTÁ", f"{i:08d}", "FE", "15/03/2024", "30",
+                    "PAPA CRIOLLA", str(cantidad), "KG", "2500", str(cantidad * 2500), "19"
+                ]))
+            f.write("\n".join(bloque) + "\n")
+            lineas += 10_000
+    return lineas
+
+def medir(nombre: str, fn, lineas: int):
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = fn()
+    elapsed = time.perf_counter() - inicio
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{nombre:18s} registros={resultado} tiempo={elapsed:.2f}s "
+          f"lineas/seg={lineas / elapsed:,.0f} rss_pico={peak_mb:.0f}MB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=int, default=500)
+    parser.add_argument('--separador', choices=SEPARADORES.keys(), default='tab')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'facturas.txt')
+        print(f"Generando TXT sintético de ~{args.mb}MB ({args.separador})...")
+        lineas = generate_txt(path, args.mb, SEPARADORES[args.separador])
+        print(f"Tamaño: {os.path.getsize(path) / 1024 / 1024:.1f}MB, {lineas} líneas de datos")
+
+        medir("process_txt_file", lambda: process_txt_file(path, 'facturas.txt')['registros'], lineas)
+        encoding = sniff_encoding(path)
+        medir("iter_txt_records", lambda: sum(1 for _ in iter_txt_records(path, encoding)), lineas)
+
+if __name__ == '__main__':
+    main()
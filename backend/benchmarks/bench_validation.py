@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput del motor de validación vectorizado (validation.py).
+
+Genera un DataFrame sintético de columnas texto (como lo entrega el lector
+CSV con dtype=str) con ~2% de valores inválidos por regla y mide filas/segundo
+de evaluación de reglas en bloques de CSV_CHUNK_SIZE, sin contar la lectura.
+
+Uso:
+    python benchmarks/bench_validation.py [--rows 1000000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_processors import CSV_CHUNK_SIZE
+from validation import digito_verificacion, resolver_columnas, validar_registros
+
+def generate_frame(rows: int, error_rate: float = 0.02, seed: int = 42) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    base = [str(800000000 + i) for i in range(1000)]
+    nits_validos = np.array([f"{nit}-{digito_verificacion(nit)}" for nit in base], dtype=object)
+    nits = nits_validos[rng.integers(0, len(base), rows)]
+    cantidad = rng.integers(1, 50, rows)
+    valor = rng.integers(1, 100, rows) * 100
+    df = pd.DataFrame({
+        'NOMBRE USUARIO': np.array([f"Cliente {i} SAS" for i in range(1000)], dtype=object)[rng.integers(0, 1000, rows)],
+        'NIT USUARIO': nits,
+        'FECHA': np.array(['15/03/2024', '01/12/2023', '28/02/2024'], dtype=object)[rng.integers(0, 3, rows)],
+        'CANTIDAD': cantidad.astype(str).astype(object),
+        'VALOR UNITARIO': valor.astype(str).astype(object),
+        'TOTAL': (cantidad * valor).astype(str).astype(object),
+        '% IVA PRODUCTO': np.array(['0', '5', '19'], dtype=object)[rng.integers(0, 3, rows)],
+    })
+    corrupciones = {
+        'NIT USUARIO': '800000001-0', 'FECHA': '2024-03-15', 'CANTIDAD': 'N/A',
+        'VALOR UNITARIO': '1.000,50', 'TOTAL': '1', '% IVA PRODUCTO': '16',
+    }
+    for columna, valor_malo in corrupciones.items():
+        df.loc[rng.random(rows) < error_rate, columna] = valor_malo
+    return df.astype(str)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Generando {args.rows} filas sintéticas...")
+    df = generate_frame(args.rows)
+    chunks = [df.iloc[i:i + CSV_CHUNK_SIZE] for i in range(0, len(df), CSV_CHUNK_SIZE)]
+    columnas = resolver_columnas(df.columns)
+
+    mejor = None
+    for intento in range(args.repeat):
+        inicio = time.perf_counter()
+        errores = sum(len(validar_registros(chunk, columnas)) for chunk in chunks)
+        elapsed = time.perf_counter() - inicio
+        mejor = elapsed if mejor is None else min(mejor, elapsed)
+        print(f"intento {intento + 1}: errores={errores} tiempo={elapsed:.2f}s filas/s={args.rows / elapsed:,.0f}")
+    print(f"mejor: {args.rows / mejor:,.0f} filas/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ET.parse + findall (ruta anterior) vs parser en streaming de process_xml_file.
+
+Genera un XML UBL sintético con N facturas (10k por defecto) y ejecuta cada
+variante en un subproceso aislado para medir tiempo y pico de memoria (RSS).
+
+Uso:
+    python benchmarks/bench_xml_parsing.py [--invoices 10000]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_processors import process_xml_file
+
+UBL_NS = "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2"
+CBC_NS = "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2"
+CAC_NS = "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2"
+
+def generate_xml(path: str, invoices: int, lines_per_invoice: int = 5):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(f'<Facturas xmlns="{UBL_NS}" xmlns:cbc="{CBC_NS}" xmlns:cac="{CAC_NS}">\n')
+        for i in range(invoices):
+            f.write(f'<Invoice><cbc:ID>SETP{i:08d}</cbc:ID><cbc:IssueDate>2024-03-15</cbc:IssueDate>')
+            f.write(f'<cac:AccountingCustomerParty><cbc:CompanyID>900{i % 1000000:06d}</cbc:CompanyID>'
+                    f'</cac:AccountingCustomerParty>')
+            for j in range(lines_per_invoice):
+                f.write(f'<cac:InvoiceLine><cbc:ID>{j + 1}</cbc:ID><cbc:InvoicedQuantity>10</cbc:InvoicedQuantity>'
+                        f'<cbc:LineExtensionAmount>25000</cbc:LineExtensionAmount>'
+                        f'<cac:Item><cbc:Description>PAPA CRIOLLA</cbc:Description></cac:Item></cac:InvoiceLine>')
+            f.write('<cac:LegalMonetaryTotal><cbc:PayableAmount>125000</cbc:PayableAmount>'
+                    '</cac:LegalMonetaryTotal></Invoice>\n')
+        f.write('</Facturas>\n')
+
+def legacy_parse(path: str):
+    """Ruta anterior: árbol completo y hasta tres búsquedas sobre todo el documento"""
+    import xml.etree.ElementTree as ET
+    root = ET.parse(path).getroot()
+    for tag in ('FacturaElectronica', 'Factura', 'Invoice'):
+        found = root.findall(f".//{tag}")
+        if found:
+            return len(found)
+    # Con namespaces la ruta anterior no encuentra facturas y cuenta los hijos directos
+    return len(list(root))
+
+def streaming_parse(path: str):
+    return process_xml_file(path, os.path.basename(path))['registros']
+
+def run_variant(variant: str, path: str):
+    import io
+    import contextlib
+    fn = legacy_parse if variant == 'legacy' else streaming_parse
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        registros = fn(path)
+    elapsed = time.perf_counter() - inicio
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{variant:10s} facturas={registros} tiempo={elapsed:.2f}s rss_pico={peak_mb:.0f}MB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--invoices', type=int, default=10_000)
+    parser.add_argument('--variant', choices=['legacy', 'streaming'])
+    parser.add_argument('--file')
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'facturas.xml')
+        print(f"Generando XML sintético con {args.invoices} facturas...")
+        generate_xml(path, args.invoices)
+        print(f"Tamaño: {os.path.getsize(path) / 1024 / 1024:.1f}MB")
+        for variant in ('legacy', 'streaming'):
+            subprocess.run([sys.executable, __file__, '--variant', variant, '--file', path], check=True)
+
+if __name__ == '__main__':
+    main()
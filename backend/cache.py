@@ -0,0 +1,83 @@
+# backend/cache.py
+"""
+Caché local en memoria con expiración (TTL) por entrada y desalojo LRU.
+
+Es thread-safe porque la comparten los endpoints y los workers de la cola.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+MISS = object()  # Centinela: permite cachear valores None
+
+
+class TTLCache:
+    """Diccionario acotado: cada entrada expira tras su TTL y se desaloja la menos usada"""
+
+    def __init__(self, name: str, max_entries: int = 1000, default_ttl: float = 60.0,
+                 copy_values: bool = True):
+        self.name = name
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        # Los llamadores modifican los dicts devueltos (p.ej. fechas a ISO), por eso se copian
+        self.copy_values = copy_values
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Devuelve el valor o MISS si no existe o expiró"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+        return copy.deepcopy(value) if self.copy_values else value
+
+    def peek(self, key: Hashable) -> Any:
+        """Como get, pero sin afectar contadores ni el orden LRU"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return MISS
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.copy_values:
+            value = copy.deepcopy(value)
+        expires = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._data),
+                "maxEntradas": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRatio": round(self.hits / total, 4) if total else None,
+            }
@@ -13,6 +13,11 @@ echo "Deploying Armorum Backend to Google Cloud Run..."
 gcloud builds submit --tag gcr.io/${PROJECT_ID}/${SERVICE_NAME} .
 
 # Deploy to Cloud Run
+# Without a mounted volume the container filesystem is in-memory and shares the
+# 512Mi limit, so the disk caps stay at the config.py defaults (100MB uploads,
+# 100MB preallocated by open upload sessions, 128MB staging, 32MB exports). For
+# multi-GB uploads mount a volume for uploads/, registros/ and exports/ and raise
+# MAX_UPLOAD_SIZE_MB/UPLOAD_SESSIONS_MAX_MB/STAGING_MAX_MB.
 gcloud run deploy ${SERVICE_NAME} \
     --image gcr.io/${PROJECT_ID}/${SERVICE_NAME} \
     --platform managed \
@@ -0,0 +1,231 @@
+# backend/exports.py
+"""
+Registros normalizados por lote y exportación de la Plantilla Simona (Comiagro).
+
+Durante el procesamiento los registros del archivo se guardan una sola vez en
+un CSV con las columnas de la plantilla. Las descargas leen ese CSV en
+streaming y lo escriben en el formato pedido (xlsx con openpyxl write-only,
+CSV, JSONL o Parquet por row groups), de modo que la memoria no crece con el
+número de filas.
+
+Igual que file_processors, no depende de FastAPI ni de Firebase para poder
+ejecutarse en el pool de procesos.
+"""
+import csv
+import itertools
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional
+
+import pandas as pd
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet es opcional: sin pyarrow el formato no se ofrece
+    pa = pq = None
+
+PLANTILLA_SIMONA_HEADERS = [
+    "NOMBRE USUARIO (CLIENTE DEL CLIENTE)",
+    "NIT USUARIO (CLIENTE DEL CLIENTE)",
+    "CIUDAD DE ENTREGA DEL PRODUCTO",
+    "FACT NRO",
+    "FECHA",
+    "FORMA DE PAGO",
+    "PRODUCTO",
+    "PRESENTACION",
+    "CANTIDAD",
+    "VALOR UNITARIO",
+    "TOTAL",
+    "% IVA PRODUCTO"
+]
+
+# Encabezados de origen aceptados por columna de la plantilla (CSV/Excel y TXT de 15 columnas)
+PLANTILLA_ALIAS = {
+    "NOMBRE USUARIO (CLIENTE DEL CLIENTE)": ("NOMBRE USUARIO", "NOMBRE COMPRADOR"),
+    "NIT USUARIO (CLIENTE DEL CLIENTE)": ("NIT USUARIO", "NIT COMPRADOR"),
+    "CIUDAD DE ENTREGA DEL PRODUCTO": ("CIUDAD",),
+    "FACT NRO": ("FACTURA", "NUMERO FACTURA"),
+    "FECHA": (),
+    "FORMA DE PAGO": ("FORMA DE PAGO(#DIAS)",),
+    "PRODUCTO": (),
+    "PRESENTACION": ("UNIDAD",),
+    "CANTIDAD": (),
+    "VALOR UNITARIO": (),
+    "TOTAL": (),
+    "% IVA PRODUCTO": ("% IVA",),
+}
+COLUMNAS_NUMERICAS = [PLANTILLA_SIMONA_HEADERS.index(c) for c in ("CANTIDAD", "VALOR UNITARIO", "TOTAL", "% IVA PRODUCTO")]
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Forma parte de la clave de los artefactos: subirla invalida las plantillas ya generadas
+PLANTILLA_FORMATO_VERSION = "1"
+FORMATOS_EXPORTACION = {
+    "xlsx": XLSX_MEDIA_TYPE,
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+PARQUET_ROW_GROUP = 100_000
+
+
+def resolver_columnas_plantilla(columnas) -> List[Optional[str]]:
+    """Columna de origen para cada columna de la plantilla (None si el archivo no la trae)"""
+    normalizadas = {str(c).strip().upper(): c for c in columnas}
+    resueltas = []
+    for header in PLANTILLA_SIMONA_HEADERS:
+        candidatos = (header,) + PLANTILLA_ALIAS[header]
+        resueltas.append(next((normalizadas[c] for c in candidatos if c in normalizadas), None))
+    return resueltas
+
+@contextmanager
+def _archivo_atomico(destino: str):
+    """Ruta temporal junto a `destino` que se mueve al final: nunca se ve un archivo a medias"""
+    os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(destino) or '.', suffix='.tmp')
+    os.close(fd)
+    try:
+        yield temporal
+        os.replace(temporal, destino)
+    except BaseException:
+        os.remove(temporal)
+        raise
+
+def filas_plantilla(chunk: pd.DataFrame, columnas: List[Optional[str]]) -> List[tuple]:
+    """Filas del bloque con las columnas de la plantilla ('' donde el archivo no trae la columna)"""
+    seleccion = pd.DataFrame(
+        {h: (chunk[c] if c is not None else '') for h, c in zip(PLANTILLA_SIMONA_HEADERS, columnas)},
+        index=chunk.index
+    ).fillna('')
+    return list(seleccion.itertuples(index=False, name=None))
+
+@contextmanager
+def escritor_registros_normalizados(destino: str):
+    """
+    Escribe en `destino` (CSV con columnas de la plantilla) los bloques de
+    registros que se le pasen a la función entregada, que devuelve las filas
+    escritas. El archivo aparece en `destino` solo al cerrar el bloque with sin
+    error. Sin bloques (XML) queda solo el encabezado.
+    """
+    with _archivo_atomico(destino) as temporal:
+        with open(temporal, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(PLANTILLA_SIMONA_HEADERS)
+            columnas = None
+
+            def escribir(chunk: pd.DataFrame) -> int:
+                nonlocal columnas
+                if columnas is None:
+                    columnas = resolver_columnas_plantilla(chunk.columns)
+                filas = filas_plantilla(chunk, columnas)
+                writer.writerows(filas)
+                return len(filas)
+
+            yield escribir
+
+def iter_registros(registros_path: str) -> Iterator[List[str]]:
+    """Registros normalizados de un lote, sin encabezado"""
+    with open(registros_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        yield from reader
+
+def _numero(valor: str):
+    """Número cuando el texto lo permite; si no, el texto original"""
+    try:
+        return int(valor)
+    except ValueError:
+        try:
+            return float(valor)
+        except ValueError:
+            return valor
+
+def escribir_plantilla_xlsx(registros: Iterable[List], destino: str, titulo: str = "Plantilla Comiagro") -> int:
+    """Escribe la plantilla con Workbook(write_only=True): una fila por append, memoria constante"""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(titulo)
+    ws.append(PLANTILLA_SIMONA_HEADERS)
+    total = 0
+    for fila in registros:
+        fila = list(fila)
+        for i in COLUMNAS_NUMERICAS:
+            fila[i] = _numero(fila[i])
+        ws.append(fila)
+        total += 1
+    with _archivo_atomico(destino) as temporal:
+        wb.save(temporal)
+    return total
+
+def escribir_plantilla_csv(registros: Iterable[List], destino: str) -> int:
+    """CSV UTF-8 con encabezados de la plantilla; los valores se escriben tal como quedaron normalizados"""
+    total = 0
+    with _archivo_atomico(destino) as temporal:
+        with open(temporal, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(PLANTILLA_SIMONA_HEADERS)
+            for fila in registros:
+                writer.writerow(fila)
+                total += 1
+    return total
+
+def escribir_plantilla_jsonl(registros: Iterable[List], destino: str) -> int:
+    """Un objeto JSON por línea; columnas numéricas como número (null si vienen vacías)"""
+    total = 0
+    with _archivo_atomico(destino) as temporal:
+        with open(temporal, 'w', encoding='utf-8') as f:
+            for fila in registros:
+                fila = list(fila)
+                for i in COLUMNAS_NUMERICAS:
+                    fila[i] = _numero(fila[i]) if fila[i] != '' else None
+                f.write(json.dumps(dict(zip(PLANTILLA_SIMONA_HEADERS, fila)), ensure_ascii=False))
+                f.write('\n')
+                total += 1
+    return total
+
+def _esquema_parquet():
+    return pa.schema([
+        (h, pa.float64() if i in COLUMNAS_NUMERICAS else pa.string())
+        for i, h in enumerate(PLANTILLA_SIMONA_HEADERS)
+    ])
+
+def escribir_plantilla_parquet(registros: Iterable[List], destino: str, row_group: int = PARQUET_ROW_GROUP) -> int:
+    """
+    Parquet escrito por row groups de `row_group` filas (memoria acotada al bloque).
+
+    Columnas numéricas en float64: los valores que no son número quedan en null.
+    """
+    if pa is None:
+        raise RuntimeError("La exportación a Parquet requiere pyarrow")
+    esquema = _esquema_parquet()
+    registros = iter(registros)
+    total = 0
+    with _archivo_atomico(destino) as temporal:
+        with pq.ParquetWriter(temporal, esquema, compression='snappy') as writer:
+            while True:
+                bloque = list(itertools.islice(registros, row_group))
+                if not bloque:
+                    break
+                columnas = []
+                for i, valores in enumerate(zip(*bloque)):
+                    if i in COLUMNAS_NUMERICAS:
+                        valores = pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').to_numpy(dtype='float64')
+                    columnas.append(pa.array(valores, type=esquema.field(i).type, from_pandas=True))
+                writer.write_table(pa.Table.from_arrays(columnas, schema=esquema))
+                total += len(bloque)
+    return total
+
+ESCRITORES = {
+    "xlsx": escribir_plantilla_xlsx,
+    "csv": escribir_plantilla_csv,
+    "jsonl": escribir_plantilla_jsonl,
+    "parquet": escribir_plantilla_parquet,
+}
+
+def formatos_disponibles() -> List[str]:
+    return [f for f in FORMATOS_EXPORTACION if f != "parquet" or pa is not None]
+
+def generar_exportacion(registros_path: str, destino: str, formato: str = "xlsx") -> int:
+    """Plantilla de un lote en `formato`, a partir de sus registros normalizados"""
+    return ESCRITORES[formato](iter_registros(registros_path), destino)
@@ -0,0 +1,585 @@
+# backend/file_processors.py
+"""
+Procesadores de archivos de facturación (XML, CSV/Excel, TXT).
+
+Este módulo no depende de FastAPI ni de Firebase para que los workers del
+pool de procesos puedan importarlo sin inicializar servicios externos.
+"""
+import codecs
+import itertools
+import re
+import xml.etree.ElementTree as ET
+import pandas as pd
+
+CSV_CHUNK_SIZE = 50_000  # Filas por bloque al leer CSV
+ENCODING_SCAN_BLOCK = 1024 * 1024  # Bytes por lectura al verificar el encoding
+
+# Etiquetas de factura en orden de prioridad y campos mínimos esperados (sin namespace)
+XML_INVOICE_TAGS = ('FacturaElectronica', 'Factura', 'Invoice')
+XML_SAMPLE_FIELDS = {
+    'NumeroFactura', 'FechaEmision', 'Fecha', 'Total', 'TotalFactura',
+    'IssueDate', 'PayableAmount'  # UBL 2.1 (DIAN)
+}
+XML_READ_BLOCK = 64 * 1024  # Bytes entregados al parser en cada lectura
+
+# Estructura estándar esperada en TXT plano (15 columnas)
+TXT_EXPECTED_COLUMNS = [
+    'NOMBRE VENDEDOR', 'NIT VENDEDOR', 'NOMBRE COMPRADOR', 'NIT COMPRADOR',
+    'CIUDAD DE ENTREGA DEL PRODUCTO', 'FACT NRO', 'PREFIJO', 'FECHA',
+    'FORMA DE PAGO(#DIAS)', 'PRODUCTO', 'CANTIDAD', 'UNIDAD',
+    'VALOR UNITARIO', 'TOTAL', '% IVA PRODUCTO'
+]
+TXT_MIN_FIELDS = 10  # Campos mínimos para considerar una línea como registro
+TXT_HEADER_SCAN_LINES = 50  # Líneas iniciales donde se busca el header
+TXT_DECORATION_PREFIXES = ('=', '-')
+TXT_MULTISPACE_RE = re.compile(r'\s{2,}')
+# Se aplican sobre line.upper(): re.IGNORECASE es ~3x más lento en cada línea
+TXT_HEADER_RE = re.compile(r'NOMBRE VENDEDOR.*NIT VENDEDOR|NIT VENDEDOR.*NOMBRE VENDEDOR')
+TXT_ALT_HEADER_RE = re.compile(r'FACT NRO|FECHA|PRODUCTO')
+TXT_TITLE_RE = re.compile(r'FACTURAS|ARMORUM|FORMATO')
+TXT_NON_DATA_RE = re.compile(r'FACTURAS|ARMORUM|FORMATO|NOVEDADES')
+
+def detect_file_format_by_content(file_path: str, filename: str) -> str:
+    """Detecta el formato del archivo por contenido, no solo por extensión"""
+    print(f"[CONSOLE LOG] Detectando formato para archivo: {filename}")
+    
+    try:
+        # Leer primeras líneas para detectar formato
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            first_lines = f.read(1024)  # Leer primeros 1KB
+        
+        # Detectar XML
+        if first_lines.strip().startswith('<?xml') or '<' in first_lines:
+            print(f"[CONSOLE LOG] Formato detectado por contenido: XML")
+            return 'xml'
+        
+        # Detectar CSV por delimitadores
+        if ',' in first_lines and ('\n' in first_lines or '\r' in first_lines):
+            lines = first_lines.split('\n')[:3]
+            comma_count = sum(line.count(',') for line in lines)
+            if comma_count > 0:
+                print(f"[CONSOLE LOG] Formato detectado por contenido: CSV")
+                return 'csv_excel'
+        
+        # Detectar TXT estructurado (con múltiples espacios como separadores)
+        if '    ' in first_lines or '\t' in first_lines:
+            print(f"[CONSOLE LOG] Formato detectado por contenido: TXT estructurado")
+            return 'txt_plano'
+        
+        # Fallback a extensión
+        extension = filename.lower().split('.')[-1]
+        print(f"[CONSOLE LOG] Usando extensión como fallback: {extension}")
+        
+        if extension == 'xml':
+            return 'xml'
+        elif extension in ['csv', 'xlsx', 'xls']:
+            return 'csv_excel'
+        elif extension == 'txt':
+            return 'txt_plano'
+        else:
+            return 'unknown'
+            
+    except Exception as e:
+        print(f"[CONSOLE LOG] Error detectando formato: {e}")
+        return 'unknown'
+
+def process_file_by_type(file_path: str, formato: str, filename: str, al_bloque=None):
+    """
+    Procesa archivos según su tipo (XML, CSV/Excel, TXT).
+
+    Si se pasa `al_bloque`, recibe cada bloque de registros (DataFrame con
+    índice continuo en todo el archivo) durante la misma lectura. XML no tiene
+    registros tabulares (solo se verifica su estructura y se cuentan las
+    facturas) y no lo invoca: sus lotes no tienen registros normalizados,
+    validación por filas ni plantilla para descargar.
+    """
+    print(f"[CONSOLE LOG] Procesando archivo: {filename} con formato: {formato}")
+    
+    # Si es auto_detect, usar detección inteligente por contenido
+    if formato == 'auto_detect':
+        formato = detect_file_format_by_content(file_path, filename)
+        print(f"[CONSOLE LOG] Formato auto-detectado: {formato}")
+    
+    try:
+        if formato == "xml":
+            return process_xml_file(file_path, filename)
+        elif formato in ["csv_excel", "plantilla51"]:
+            extension = filename.lower().split('.')[-1]
+            return process_csv_excel_file(file_path, extension, filename, al_bloque)
+        elif formato == "txt_plano":
+            return process_txt_file(file_path, filename, al_bloque)
+        else:
+            print(f"[CONSOLE LOG] ERROR: Formato no reconocido: {formato}")
+            return {
+                "success": False,
+                "registros": 0,
+                "errores": [f"Formato de archivo no reconocido: {formato}"]
+            }
+    except Exception as e:
+        print(f"[CONSOLE LOG] ERROR en procesamiento: {str(e)}")
+        return {
+            "success": False,
+            "registros": 0,
+            "errores": [f"Error procesando archivo: {str(e)}"]
+        }
+
+def _local_name(tag: str) -> str:
+    """Quita el namespace '{uri}' de una etiqueta XML"""
+    return tag.rsplit('}', 1)[-1]
+
+class _XmlInvoiceScanner:
+    """Target de XMLParser que cuenta facturas en una sola pasada sin construir el árbol"""
+    
+    def __init__(self):
+        self.root_tag = None
+        self.conteos = {tag: 0 for tag in XML_INVOICE_TAGS}
+        # Campos de muestra encontrados dentro de la primera factura de cada tipo
+        self.campos_muestra = {tag: set() for tag in XML_INVOICE_TAGS}
+        self.campos_documento = set()
+        self.primera_abierta = {}  # etiqueta -> profundidad de la primera factura aún abierta
+        self.namespaces = {}
+        self.hijos_directos = 0
+        self.depth = 0
+        self._nombres = {}  # Cache etiqueta -> nombre local (las etiquetas se repiten mucho)
+    
+    def _name(self, tag: str) -> str:
+        name = self._nombres.get(tag)
+        if name is None:
+            name = self._nombres[tag] = _local_name(tag)
+        return name
+    
+    def start_ns(self, prefix: str, uri: str):
+        self.namespaces.setdefault(prefix, uri)
+    
+    def start(self, tag: str, attrib: dict):
+        if self.root_tag is None:
+            self.root_tag = tag
+        self.depth += 1
+        if self.depth == 2:
+            self.hijos_directos += 1
+        name = self._name(tag)
+        if self.depth > 1 and name in self.conteos:
+            self.conteos[name] += 1
+            if self.conteos[name] == 1:
+                self.primera_abierta[name] = self.depth
+    
+    def end(self, tag: str):
+        name = self._name(tag)
+        if name in XML_SAMPLE_FIELDS:
+            self.campos_documento.add(name)
+            for abierta in self.primera_abierta:
+                self.campos_muestra[abierta].add(name)
+        if self.primera_abierta.get(name) == self.depth:
+            del self.primera_abierta[name]
+        self.depth -= 1
+    
+    def close(self):
+        return self
+
+def process_xml_file(file_path: str, filename: str):
+    """Procesa archivos XML de facturas electrónicas en una sola pasada (streaming)"""
+    print(f"[CONSOLE LOG] Iniciando procesamiento XML: {filename}")
+    
+    try:
+        scanner = _XmlInvoiceScanner()
+        parser = ET.XMLParser(target=scanner)
+        with open(file_path, 'rb') as f:
+            for bloque in iter(lambda: f.read(XML_READ_BLOCK), b''):
+                parser.feed(bloque)
+        parser.close()
+        
+        root_tag = scanner.root_tag
+        conteos = scanner.conteos
+        errores = []
+        
+        print(f"[CONSOLE LOG] XML parseado exitosamente. Root element: {root_tag}")
+        
+        # Prioridad: FacturaElectronica > Factura > Invoice
+        etiqueta = next((tag for tag in XML_INVOICE_TAGS if conteos[tag]), None)
+        if etiqueta:
+            facturas_encontradas = conteos[etiqueta]
+            campos_encontrados = scanner.campos_muestra[etiqueta]
+            print(f"[CONSOLE LOG] Encontradas {facturas_encontradas} {etiqueta}")
+        else:
+            root_name = _local_name(root_tag).lower()
+            if "factura" in root_name or "invoice" in root_name:
+                facturas_encontradas = 1
+                print(f"[CONSOLE LOG] Root element es una factura: {root_tag}")
+            elif scanner.hijos_directos:
+                # Como último recurso, contar elementos hijos directos que podrían ser facturas
+                facturas_encontradas = scanner.hijos_directos
+                print(f"[CONSOLE LOG] Contando elementos hijos como facturas: {facturas_encontradas}")
+            else:
+                facturas_encontradas = 1  # Al menos hay un XML válido
+                print(f"[CONSOLE LOG] XML válido pero sin estructura de facturas clara")
+            # Sin etiqueta de factura, la muestra es el documento completo
+            campos_encontrados = scanner.campos_documento
+        
+        # Validar datos mínimos en las facturas encontradas
+        if not campos_encontrados:
+            errores.append("XML válido pero sin estructura de factura reconocible")
+            print(f"[CONSOLE LOG] WARNING: No se encontraron datos de factura estándar")
+        
+        print(f"[CONSOLE LOG] Procesamiento XML completado: {facturas_encontradas} facturas")
+        return {
+            "success": True,
+            "registros": facturas_encontradas,
+            "errores": errores,
+            "tipo": "XML",
+            "detalles": {
+                "rootElement": root_tag,
+                "etiquetaFactura": etiqueta,
+                "namespaces": list(scanner.namespaces.keys())
+            }
+        }
+        
+    except ET.ParseError as e:
+        error_msg = f"Error parsing XML: {str(e)}"
+        print(f"[CONSOLE LOG] ERROR: {error_msg}")
+        return {
+            "success": False,
+            "registros": 0,
+            "errores": [error_msg]
+        }
+    except Exception as e:
+        error_msg = f"Error inesperado procesando XML: {str(e)}"
+        print(f"[CONSOLE LOG] ERROR: {error_msg}")
+        return {
+            "success": False,
+            "registros": 0,
+            "errores": [error_msg]
+        }
+
+def sniff_encoding(file_path: str) -> str:
+    """
+    Detecta el encoding verificando el archivo completo: utf-8 solo si todos
+    los bytes decodifican como utf-8, si no latin-1 (que acepta cualquier
+    byte). Una muestra inicial no basta: un byte latin-1 al final del archivo
+    se perdería al leerlo como utf-8.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(file_path, 'rb') as f:
+        block = f.read(ENCODING_SCAN_BLOCK)
+        encoding = 'utf-8-sig' if block.startswith(codecs.BOM_UTF8) else 'utf-8'
+        try:
+            while block:
+                # Un bloque ASCII es válido sin decodificar (salvo que complete un carácter pendiente)
+                if not block.isascii() or decoder.getstate()[0]:
+                    decoder.decode(block)
+                block = f.read(ENCODING_SCAN_BLOCK)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return 'latin-1'
+    return encoding
+
+def iter_dataframe_chunks(file_path: str, extension: str, encoding: str = None, dtype=None):
+    """Itera el archivo por bloques de filas para mantener la memoria constante"""
+    if extension == "csv":
+        # Decodificación estricta: sniff_encoding ya verificó el archivo completo
+        yield from pd.read_csv(
+            file_path,
+            encoding=encoding,
+            chunksize=CSV_CHUNK_SIZE,
+            dtype=dtype
+        )
+    else:
+        # Excel no soporta lectura por chunks en pandas
+        yield pd.read_excel(file_path, dtype=dtype)
+
+def process_csv_excel_file(file_path: str, extension: str, filename: str, al_bloque=None):
+    """
+    Procesa archivos CSV y Excel de forma incremental (por chunks).
+
+    CSV se lee como texto (conserva ceros a la izquierda y el guion del DV);
+    Excel como object (conserva las fechas tipadas y los NIT numéricos).
+    """
+    print(f"[CONSOLE LOG] Iniciando procesamiento {extension.upper()}: {filename}")
+    
+    try:
+        encoding = None
+        if extension == "csv":
+            encoding = sniff_encoding(file_path)
+            print(f"[CONSOLE LOG] CSV se leerá con encoding {encoding}")
+        
+        registros = 0
+        empty_rows = 0
+        columns = []
+        sample_data = []
+        
+        dtype = str if extension == "csv" else object
+        for chunk_idx, chunk in enumerate(iter_dataframe_chunks(file_path, extension, encoding, dtype=dtype)):
+            if chunk_idx == 0:
+                columns = list(chunk.columns)
+                sample_data = chunk.head(3).to_dict('records')
+            registros += len(chunk)
+            # Detectar filas vacías
+            empty_rows += int(chunk.isnull().all(axis=1).sum())
+            if al_bloque is not None:
+                al_bloque(chunk)
+        
+        # Verificar si tiene datos
+        errores = []
+        print(f"[CONSOLE LOG] Total de registros encontrados: {registros}")
+        print(f"[CONSOLE LOG] Columnas encontradas: {columns}")
+        
+        # Validaciones básicas
+        if registros == 0:
+            errores.append("El archivo no contiene datos")
+            print(f"[CONSOLE LOG] ERROR: Archivo vacío")
+        
+        # Verificar si tiene columnas
+        if len(columns) == 0:
+            errores.append("El archivo no tiene columnas definidas")
+            print(f"[CONSOLE LOG] ERROR: Sin columnas definidas")
+        
+        # Validaciones específicas para archivos de factura
+        column_names = [str(col).strip().upper() for col in columns]
+        expected_columns = [
+            'NOMBRE USUARIO', 'NIT USUARIO', 'FACT NRO', 'FECHA', 
+            'PRODUCTO', 'CANTIDAD', 'VALOR UNITARIO', 'TOTAL'
+        ]
+        
+        # Verificar si parece un archivo de facturas
+        is_invoice_file = False
+        for exp_col in expected_columns[:4]:  # Verificar al menos las primeras 4 columnas
+            if any(exp_col in col for col in column_names):
+                is_invoice_file = True
+                break
+        
+        if not is_invoice_file and registros > 0:
+            print(f"[CONSOLE LOG] WARNING: Archivo no parece tener estructura de facturas estándar")
+        
+        if empty_rows > 0:
+            print(f"[CONSOLE LOG] WARNING: {empty_rows} filas vacías encontradas")
+        
+        print(f"[CONSOLE LOG] Procesamiento {extension.upper()} completado exitosamente")
+        return {
+            "success": len(errores) == 0,
+            "registros": registros,
+            "errores": errores,
+            "tipo": f"CSV/Excel ({extension.upper()})",
+            "columnas": columns[:15],  # Primeras 15 columnas
+            "detalles": {
+                "emptyRows": empty_rows,
+                "isInvoiceFormat": is_invoice_file,
+                "sampleData": sample_data,
+                "encoding": encoding
+            }
+        }
+        
+    except pd.errors.EmptyDataError:
+        error_msg = "El archivo está vacío o no contiene datos válidos"
+        print(f"[CONSOLE LOG] ERROR: {error_msg}")
+        return {
+            "success": False,
+            "registros": 0,
+            "errores": [error_msg]
+        }
+    except pd.errors.ParserError as e:
+        error_msg = f"Error parseando {extension.upper()}: {str(e)}"
+        print(f"[CONSOLE LOG] ERROR: {error_msg}")
+        return {
+            "success": False,
+            "registros": 0,
+            "errores": [error_msg]
+        }
+    except Exception as e:
+        error_msg = f"Error procesando {extension.upper()}: {str(e)}"
+        print(f"[CONSOLE LOG] ERROR: {error_msg}")
+        return {
+            "success": False,
+            "registros": 0,
+            "errores": [error_msg]
+        }
+
+def iter_txt_lines(file_path: str, encoding: str):
+    """
+    Produce las líneas no vacías (sin espacios extremos) leyendo el archivo en
+    streaming. La decodificación es estricta: el encoding viene de
+    sniff_encoding, que verifica el archivo completo.
+    """
+    with open(file_path, 'r', encoding=encoding) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield line
+
+def _split_txt_line(line: str, separador: str):
+    """Separa una línea de datos; None si la línea es decorativa (títulos, separadores)"""
+    if line.startswith(TXT_DECORATION_PREFIXES) or TXT_NON_DATA_RE.search(line.upper()):
+        return None
+    if separador == 'espacios':
+        return TXT_MULTISPACE_RE.split(line)
+    if separador:
+        return line.split(separador)
+    return [line]
+
+def detect_txt_layout(file_path: str, encoding: str) -> dict:
+    """Detecta header y separador una sola vez con las primeras líneas del archivo"""
+    lines = list(itertools.islice(iter_txt_lines(file_path, encoding), TXT_HEADER_SCAN_LINES))
+    
+    # Buscar línea de cabecera con las columnas estándar
+    header_line_idx = -1
+    for i, line in enumerate(lines):
+        line_upper = line.upper()
+        if TXT_HEADER_RE.search(line_upper):
+            header_line_idx = i
+            print(f"[CONSOLE LOG] Header encontrado en línea {i}")
+            break
+        elif TXT_ALT_HEADER_RE.search(line_upper):
+            header_line_idx = i
+            print(f"[CONSOLE LOG] Posible header alternativo en línea {i}")
+            break
+    
+    # Detectar separador basado en la línea de header o primera línea de datos
+    sample_line = None
+    if header_line_idx >= 0 and header_line_idx + 1 < len(lines):
+        sample_line = lines[header_line_idx + 1]  # Primera línea de datos
+    else:
+        # Buscar primera línea que parezca datos
+        for line in lines:
+            if not line.startswith(TXT_DECORATION_PREFIXES) and not TXT_TITLE_RE.search(line.upper()):
+                sample_line = line
+                break
+    
+    estructura_detectada = "Texto libre"
+    separador_detectado = None
+    if sample_line:
+        print(f"[CONSOLE LOG] Línea de muestra: {sample_line[:100]}...")
+        
+        # Detectar separadores
+        if '\t' in sample_line:
+            estructura_detectada = "Delimitado por tabs"
+            separador_detectado = '\t'
+        elif '|' in sample_line:
+            estructura_detectada = "Delimitado por |"
+            separador_detectado = '|'
+        elif sample_line.count(',') >= 5:  # Al menos 5 comas para 15 columnas
+            estructura_detectada = "Posiblemente CSV"
+            separador_detectado = ','
+        elif sample_line.count('   ') >= 3:  # Múltiples espacios para separar campos
+            estructura_detectada = "Delimitado por espacios múltiples"
+            separador_detectado = 'espacios'
+        print(f"[CONSOLE LOG] Estructura detectada: {estructura_detectada}")
+    
+    return {
+        "headerLineIdx": header_line_idx,
+        "headerLine": lines[header_line_idx] if header_line_idx >= 0 else None,
+        "inicioDatos": header_line_idx + 1 if header_line_idx >= 0 else 0,
+        "separador": separador_detectado,
+        "estructura": estructura_detectada
+    }
+
+def iter_txt_records(file_path: str, encoding: str = None, layout: dict = None):
+    """Produce de forma perezosa un dict por registro con las 15 columnas estándar"""
+    encoding = encoding or sniff_encoding(file_path)
+    layout = layout or detect_txt_layout(file_path, encoding)
+    separador = layout["separador"]
+    if not separador:
+        return
+    
+    lines = itertools.islice(iter_txt_lines(file_path, encoding), layout["inicioDatos"], None)
+    for line in lines:
+        campos = _split_txt_line(line, separador)
+        if campos is not None and len(campos) >= TXT_MIN_FIELDS:
+            yield dict(zip(TXT_EXPECTED_COLUMNS, map(str.strip, campos)))
+
+def _bloque_txt(registros: list, inicio: int) -> pd.DataFrame:
+    return pd.DataFrame.from_records(
+        registros, columns=TXT_EXPECTED_COLUMNS, index=pd.RangeIndex(inicio, inicio + len(registros))
+    )
+
+def process_txt_file(file_path: str, filename: str, al_bloque=None):
+    """
+    Procesa archivos de texto plano con estructura de facturación (lectura en streaming).
+
+    Los registros que entrega a `al_bloque` son los mismos que iter_txt_records.
+    """
+    print(f"[CONSOLE LOG] Iniciando procesamiento TXT: {filename}")
+    
+    try:
+        encoding_used = sniff_encoding(file_path)
+        print(f"[CONSOLE LOG] TXT se leerá con encoding {encoding_used}")
+        
+        layout = detect_txt_layout(file_path, encoding_used)
+        separador_detectado = layout["separador"]
+        inicio_datos = layout["inicioDatos"]
+        
+        # Contar registros de datos en una sola pasada
+        total_lines = 0
+        registros_datos = 0
+        sample_records = []
+        bloque, inicio_bloque = [], 0
+        for idx, line in enumerate(iter_txt_lines(file_path, encoding_used)):
+            total_lines += 1
+            if idx < inicio_datos:
+                continue
+            
+            campos = _split_txt_line(line, separador_detectado)
+            if campos is None:
+                continue
+            # Validar que la línea tenga la estructura esperada (al menos 10 de los 15 campos)
+            if separador_detectado and len(campos) < TXT_MIN_FIELDS:
+                continue
+            registros_datos += 1
+            if separador_detectado and len(sample_records) < 3:
+                sample_records.append(campos[:15])  # Máximo 15 campos
+            if al_bloque is not None and separador_detectado:
+                bloque.append(dict(zip(TXT_EXPECTED_COLUMNS, map(str.strip, campos))))
+                if len(bloque) == CSV_CHUNK_SIZE:
+                    al_bloque(_bloque_txt(bloque, inicio_bloque))
+                    inicio_bloque += len(bloque)
+                    bloque = []
+        if bloque:
+            al_bloque(_bloque_txt(bloque, inicio_bloque))
+        
+        print(f"[CONSOLE LOG] Total de líneas no vacías: {total_lines}")
+        
+        errores = []
+        if total_lines == 0:
+            errores.append("El archivo de texto está vacío")
+            print(f"[CONSOLE LOG] ERROR: Archivo vacío")
+            return {
+                "success": False,
+                "registros": 0,
+                "errores": errores
+            }
+        
+        print(f"[CONSOLE LOG] Registros de datos detectados: {registros_datos}")
+        
+        # Validar estructura estándar si se detectó header
+        header_encontrado = layout["headerLineIdx"] >= 0
+        if header_encontrado:
+            header_upper = layout["headerLine"].upper()
+            # Verificar al menos 10 de las 15 columnas
+            matched_columns = sum(1 for col in TXT_EXPECTED_COLUMNS[:10] if col in header_upper)
+            
+            if matched_columns < 5:
+                errores.append(f"Estructura no coincide con formato estándar de facturación. Solo {matched_columns} columnas reconocidas")
+                print(f"[CONSOLE LOG] WARNING: Estructura no estándar")
+        
+        print(f"[CONSOLE LOG] Procesamiento TXT completado")
+        return {
+            "success": len(errores) == 0,
+            "registros": registros_datos,
+            "errores": errores,
+            "tipo": "TXT",
+            "estructura": layout["estructura"],
+            "detalles": {
+                "separador": separador_detectado,
+                "headerEncontrado": header_encontrado,
+                "totalLineas": total_lines,
+                "estructuraEstandar": header_encontrado,
+                "sampleRecords": sample_records,
+                "encoding": encoding_used
+            }
+        }
+        
+    except Exception as e:
+        error_msg = f"Error procesando TXT: {str(e)}"
+        print(f"[CONSOLE LOG] ERROR: {error_msg}")
+        return {
+            "success": False,
+            "registros": 0,
+            "errores": [error_msg]
+        }
@@ -1,10 +1,29 @@
 # backend/app/services/firebase_service.py
 import firebase_admin
 from firebase_admin import credentials, firestore
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import os
-from datetime import datetime
+import base64
+import binascii
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 import json
+from collections import Counter
+
+from app.config import (
+    CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, ESTADISTICAS_DIAS, ESTADISTICAS_DOC_ID,
+    DIAN_CACHE_TTL_DAYS, DIAN_CACHE_NEGATIVE_TTL_DAYS, DIAN_CACHE_MISS_TTL_SECONDS,
+    DIAN_CACHE_MEMORY_TTL_SECONDS, DIAN_CACHE_MEMORY_ENTRIES
+)
+from cache import MISS, TTLCache
+
+# Firestore rejects batches with more than 500 operations
+FIRESTORE_BATCH_LIMIT = 500
+
+# Lotes in these states no longer change, so they are cached with the long TTL
+ESTADOS_FINALES = {"Completado", "Completado con Advertencias", "Error"}
 
 class FirebaseService:
     _instance = None
@@ -19,6 +38,17 @@ class FirebaseService:
         if not self._initialized:
             self._init_firebase()
             self.db = firestore.client()
+            self._log_buffer: List[Dict] = []
+            self._log_lock = threading.Lock()
+            self._caches = {
+                name: TTLCache(name, max_entries=CACHE_MAX_ENTRIES, default_ttl=CACHE_TTL_SECONDS[name])
+                for name in ('lotes', 'logs', 'errores')
+            }
+            self._dian_memory = TTLCache('dian_cache', max_entries=DIAN_CACHE_MEMORY_ENTRIES,
+                                         default_ttl=DIAN_CACHE_MEMORY_TTL_SECONDS)
+            self._dian_stats = {'memoriaHits': 0, 'firestoreHits': 0, 'misses': 0,
+                                'consultas': 0, 'segundosTotales': 0.0}
+            self._dian_stats_lock = threading.Lock()
             self._initialized = True
     
     def _init_firebase(self):
@@ -38,44 +68,196 @@ class FirebaseService:
             # App already initialized
             pass
     
+    def _commit_batched(self, writes: List[Tuple[Any, Dict]], stats=None) -> int:
+        """Write (doc_ref, data) pairs with WriteBatch, chunked at the 500-op limit.
+        
+        stats(chunk_data) returns the statistics deltas of a chunk; they are written
+        in the same batch, so no document is ever visible without its counters.
+        """
+        size = FIRESTORE_BATCH_LIMIT - 1 if stats else FIRESTORE_BATCH_LIMIT
+        for start in range(0, len(writes), size):
+            batch = self.db.batch()
+            chunk = writes[start:start + size]
+            for doc_ref, data in chunk:
+                batch.set(doc_ref, data)
+            if stats:
+                increments = self._stats_increments(**stats([data for _, data in chunk]))
+                if increments:
+                    batch.set(self._stats_ref(), increments, merge=True)
+            batch.commit()
+        return len(writes)
+    
     # CRUD operations for lotes
     def create_lote(self, lote_data: Dict) -> str:
         """Create a new lote in Firestore"""
         doc_ref = self.db.collection('lotes').document()
         lote_data['id'] = doc_ref.id
         lote_data['fechaCarga'] = datetime.utcnow()
-        doc_ref.set(lote_data)
+        self._commit_batched([(doc_ref, lote_data)], stats=self._lote_stats)
         return doc_ref.id
     
-    def get_lotes(self, limit: int = 20, offset: int = 0) -> List[Dict]:
-        """Get paginated lotes from Firestore"""
-        query = self.db.collection('lotes').order_by('fechaCarga', direction=firestore.Query.DESCENDING)
+    def create_lotes_bulk(self, lotes_data: List[Dict]) -> List[str]:
+        """Create many lotes with batched writes; returns their ids in order"""
+        lotes_ref = self.db.collection('lotes')
+        now = datetime.utcnow()
+        writes = []
+        for lote_data in lotes_data:
+            doc_ref = lotes_ref.document()
+            lote_data['id'] = doc_ref.id
+            lote_data['fechaCarga'] = now
+            writes.append((doc_ref, lote_data))
+        self._commit_batched(writes, stats=self._lote_stats)
+        return [doc_ref.id for doc_ref, _ in writes]
+    
+    def get_lotes(self, limit: int = 20, cursor: Optional[str] = None,
+                  estado: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of lotes (newest first) and the cursor for the next page"""
+        lotes_ref = self.db.collection('lotes')
+        query = lotes_ref
+        if estado:
+            # Requires the (estado, fechaCarga DESC) composite index in firestore.indexes.json
+            query = query.where('estado', '==', estado)
+        query = query.order_by('fechaCarga', direction=firestore.Query.DESCENDING) \
+                     .order_by('__name__', direction=firestore.Query.DESCENDING)
         
-        if offset > 0:
-            # For pagination, you'd need to implement cursor-based pagination
-            # This is a simplified version
-            pass
+        if cursor:
+            fecha_carga, doc_id = self._decode_cursor(cursor)
+            query = query.start_after({'fechaCarga': fecha_carga, '__name__': lotes_ref.document(doc_id)})
         
-        docs = query.limit(limit).get()
+        # Fetch one extra document to know whether there is a next page
+        docs = list(query.limit(limit + 1).get())
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        lotes = [doc.to_dict() for doc in docs]
+        next_cursor = self._encode_cursor(lotes[-1]['fechaCarga'], docs[-1].id) if has_more else None
+        return lotes, next_cursor
+    
+    def get_lotes_by_estados(self, estados: List[str]) -> List[Dict]:
+        """Lotes in any of the given states (e.g. left pending by a restart)"""
+        docs = self.db.collection('lotes').where('estado', 'in', list(estados)).get()
         return [doc.to_dict() for doc in docs]
     
+    def count_lotes(self, estado: Optional[str] = None) -> int:
+        """Count lotes with a server-side aggregation query"""
+        query = self.db.collection('lotes')
+        if estado:
+            query = query.where('estado', '==', estado)
+        result = query.count().get()
+        return int(result[0][0].value)
+    
+    @staticmethod
+    def _encode_cursor(fecha_carga: datetime, doc_id: str) -> str:
+        """Opaque pagination token for (fechaCarga, document id)"""
+        raw = json.dumps({'f': fecha_carga.isoformat(), 'id': doc_id})
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """Inverse of _encode_cursor; raises ValueError for malformed tokens"""
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return datetime.fromisoformat(data['f']), data['id']
+        except (KeyError, TypeError, UnicodeError, binascii.Error, json.JSONDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+    
+    # Local read-through cache
+    def _lote_finalizado(self, lote_id: str) -> bool:
+        lote = self._caches['lotes'].peek(lote_id)
+        return lote is not MISS and lote.get('estado') in ESTADOS_FINALES
+    
+    def _cache_ttl(self, collection: str, lote_id: str, value: Any) -> float:
+        """Completed lotes (and their logs/errors) are immutable and cached much longer"""
+        if collection == 'lotes':
+            finalizado = value.get('estado') in ESTADOS_FINALES
+        else:
+            finalizado = self._lote_finalizado(lote_id)
+        if finalizado:
+            return CACHE_TTL_SECONDS['finalizados']
+        return CACHE_TTL_SECONDS[collection]
+    
+    def _cached_read(self, collection: str, lote_id: str, loader):
+        cache = self._caches[collection]
+        value = cache.get(lote_id)
+        if value is MISS:
+            value = loader()
+            if value is not None:
+                cache.set(lote_id, value, ttl=self._cache_ttl(collection, lote_id, value))
+        return value
+    
+    def cache_stats(self) -> Dict:
+        """Hit/miss counters per cached collection"""
+        stats = {name: cache.stats() for name, cache in self._caches.items()}
+        stats['dian'] = self.dian_cache_stats()
+        return stats
+    
     def get_lote_by_id(self, lote_id: str) -> Optional[Dict]:
         """Get a specific lote by ID"""
-        doc = self.db.collection('lotes').document(lote_id).get()
-        return doc.to_dict() if doc.exists else None
+        def _load():
+            doc = self.db.collection('lotes').document(lote_id).get()
+            return doc.to_dict() if doc.exists else None
+        return self._cached_read('lotes', lote_id, _load)
+    
+    def get_lotes_by_ids(self, lote_ids: List[str]) -> List[Dict]:
+        """Lotes in the given order (missing ones skipped): cache first, then one get_all for the rest"""
+        cache = self._caches['lotes']
+        found = {}
+        pending = []
+        for lote_id in dict.fromkeys(lote_ids):
+            value = cache.get(lote_id)
+            if value is MISS:
+                pending.append(lote_id)
+            else:
+                found[lote_id] = value
+        lotes_ref = self.db.collection('lotes')
+        for start in range(0, len(pending), FIRESTORE_BATCH_LIMIT):
+            refs = [lotes_ref.document(lote_id) for lote_id in pending[start:start + FIRESTORE_BATCH_LIMIT]]
+            for doc in self.db.get_all(refs):
+                if doc.exists:
+                    data = doc.to_dict()
+                    cache.set(doc.id, data, ttl=self._cache_ttl('lotes', doc.id, data))
+                    found[doc.id] = data
+        return [found[lote_id] for lote_id in lote_ids if lote_id in found]
     
     def update_lote(self, lote_id: str, updates: Dict) -> bool:
-        """Update a lote"""
+        """Update a lote (state changes also move the statistics counters, in the same transaction)"""
         try:
             updates['fechaUltimaActualizacion'] = datetime.utcnow()
-            self.db.collection('lotes').document(lote_id).update(updates)
+            lote_ref = self.db.collection('lotes').document(lote_id)
+            if 'estado' in updates:
+                self._update_lote_estado(lote_ref, updates)
+            else:
+                lote_ref.update(updates)
             return True
         except Exception:
             return False
+        finally:
+            self._caches['lotes'].invalidate(lote_id)
+    
+    def _update_lote_estado(self, lote_ref, updates: Dict):
+        @firestore.transactional
+        def _apply(transaction):
+            # The previous state is read inside the transaction, so each transition is counted once
+            previous = lote_ref.get(transaction=transaction).to_dict() or {}
+            transaction.update(lote_ref, updates)
+            anterior, nuevo = previous.get('estado'), updates['estado']
+            if anterior == nuevo:
+                return
+            delta = {
+                'lotes_por_estado': {nuevo: 1, **({anterior: -1} if anterior is not None else {})}
+            }
+            if nuevo in ESTADOS_FINALES and anterior not in ESTADOS_FINALES:
+                delta['registrosProcesados'] = updates.get('registrosTotales', previous.get('registrosTotales')) or 0
+                delta['erroresDetectados'] = updates.get('errores', previous.get('errores')) or 0
+            data = self._stats_increments(**delta)
+            if data:
+                transaction.set(self._stats_ref(), data, merge=True)
+        
+        _apply(self.db.transaction())
     
     # Logs operations
-    def add_log(self, lote_id: str, mensaje: str, nivel: str = "INFO", detalles: Dict = None):
-        """Add a log entry for a lote"""
+    def add_log(self, lote_id: str, mensaje: str, nivel: str = "INFO", detalles: Dict = None,
+                buffered: bool = False):
+        """Add a log entry for a lote (buffered entries are written on flush_logs)"""
         log_data = {
             'loteId': lote_id,
             'timestamp': datetime.utcnow(),
@@ -83,12 +265,33 @@ class FirebaseService:
             'mensaje': mensaje,
             'detalles': detalles or {}
         }
+        if buffered:
+            with self._log_lock:
+                self._log_buffer.append(log_data)
+            return
         self.db.collection('logs').add(log_data)
+        self._caches['logs'].invalidate(lote_id)
+    
+    def flush_logs(self, lote_id: Optional[str] = None) -> int:
+        """Write buffered logs (all, or only those of one lote) in batches"""
+        with self._log_lock:
+            if lote_id is None:
+                pending, self._log_buffer = self._log_buffer, []
+            else:
+                pending = [log for log in self._log_buffer if log['loteId'] == lote_id]
+                self._log_buffer = [log for log in self._log_buffer if log['loteId'] != lote_id]
+        logs_ref = self.db.collection('logs')
+        written = self._commit_batched([(logs_ref.document(), log) for log in pending])
+        for log_lote_id in {log['loteId'] for log in pending}:
+            self._caches['logs'].invalidate(log_lote_id)
+        return written
     
     def get_logs_by_lote(self, lote_id: str) -> List[Dict]:
         """Get all logs for a specific lote"""
-        docs = self.db.collection('logs').where('loteId', '==', lote_id).order_by('timestamp').get()
-        return [doc.to_dict() for doc in docs]
+        def _load():
+            docs = self.db.collection('logs').where('loteId', '==', lote_id).order_by('timestamp').get()
+            return [doc.to_dict() for doc in docs]
+        return self._cached_read('logs', lote_id, _load)
     
     # Errors operations
     def add_error(self, lote_id: str, fila: int, campo: str, mensaje: str, severidad: str = "ERROR"):
@@ -102,11 +305,33 @@ class FirebaseService:
             'fechaDeteccion': datetime.utcnow()
         }
         self.db.collection('errores').add(error_data)
+        self._caches['errores'].invalidate(lote_id)
+    
+    def add_errors_bulk(self, lote_id: str, errores: List[Dict]) -> int:
+        """Add many errors for a lote; each item has fila, campo, mensaje and severidad"""
+        now = datetime.utcnow()
+        errores_ref = self.db.collection('errores')
+        writes = [
+            (errores_ref.document(), {
+                'loteId': lote_id,
+                'fila': error['fila'],
+                'campo': error['campo'],
+                'mensaje': error['mensaje'],
+                'severidad': error.get('severidad', 'ERROR'),
+                'fechaDeteccion': now
+            })
+            for error in errores
+        ]
+        written = self._commit_batched(writes)
+        self._caches['errores'].invalidate(lote_id)
+        return written
     
     def get_errors_by_lote(self, lote_id: str) -> List[Dict]:
         """Get all errors for a specific lote"""
-        docs = self.db.collection('errores').where('loteId', '==', lote_id).get()
-        return [doc.to_dict() for doc in docs]
+        def _load():
+            docs = self.db.collection('errores').where('loteId', '==', lote_id).get()
+            return [doc.to_dict() for doc in docs]
+        return self._cached_read('errores', lote_id, _load)
     
     # Excepciones DIAN operations
     def create_excepcion_dian(self, excepcion_data: Dict) -> str:
@@ -114,9 +339,20 @@ class FirebaseService:
         doc_ref = self.db.collection('excepciones_dian').document()
         excepcion_data['id'] = doc_ref.id
         excepcion_data['fechaDeteccion'] = datetime.utcnow()
-        doc_ref.set(excepcion_data)
+        self._commit_batched([(doc_ref, excepcion_data)], stats=self._excepcion_stats)
         return doc_ref.id
     
+    def create_excepciones_bulk(self, excepciones: List[Dict]) -> List[str]:
+        """Create many DIAN exceptions in batched writes"""
+        now = datetime.utcnow()
+        excepciones_ref = self.db.collection('excepciones_dian')
+        writes = []
+        for excepcion_data in excepciones:
+            doc_ref = excepciones_ref.document()
+            writes.append((doc_ref, {**excepcion_data, 'id': doc_ref.id, 'fechaDeteccion': now}))
+        self._commit_batched(writes, stats=self._excepcion_stats)
+        return [doc_ref.id for doc_ref, _ in writes]
+    
     def get_excepciones_dian(self, filters: Dict = None) -> List[Dict]:
         """Get DIAN exceptions with optional filters"""
         query = self.db.collection('excepciones_dian')
@@ -139,18 +375,123 @@ class FirebaseService:
         except Exception:
             return False
     
+    def update_excepciones_transactional(self, excepcion_ids: List[str], updates: Dict,
+                                         expected_estado_gestion: Optional[str] = None) -> Dict[str, Dict]:
+        """Read-check-write DIAN exceptions inside transactions (up to 500 per transaction).
+        
+        Returns {id: {'status': 'updated' | 'not_found' | 'conflict', 'previous': dict | None}}.
+        An exception is a conflict when expected_estado_gestion is given and no longer matches.
+        """
+        results: Dict[str, Dict] = {}
+        excepciones_ref = self.db.collection('excepciones_dian')
+        unique_ids = list(dict.fromkeys(excepcion_ids))
+        
+        @firestore.transactional
+        def _apply(transaction, refs):
+            chunk_results = {}
+            snapshots = {snap.id: snap for snap in transaction.get_all(refs)}
+            now = datetime.utcnow()
+            por_estado = Counter()
+            for ref in refs:
+                snapshot = snapshots.get(ref.id)
+                if snapshot is None or not snapshot.exists:
+                    chunk_results[ref.id] = {'status': 'not_found', 'previous': None}
+                    continue
+                previous = snapshot.to_dict()
+                if expected_estado_gestion is not None and \
+                        previous.get('estadoGestion') != expected_estado_gestion:
+                    chunk_results[ref.id] = {'status': 'conflict', 'previous': previous}
+                    continue
+                transaction.update(ref, {**updates, 'fechaUltimaActualizacion': now})
+                chunk_results[ref.id] = {'status': 'updated', 'previous': previous}
+                if 'estadoGestion' in updates and previous.get('estadoGestion') != updates['estadoGestion']:
+                    por_estado[updates['estadoGestion']] += 1
+                    por_estado[previous.get('estadoGestion')] -= 1
+            stats = self._stats_increments(excepciones_por_estado=por_estado)
+            if stats:
+                transaction.set(self._stats_ref(), stats, merge=True)
+            return chunk_results
+        
+        for start in range(0, len(unique_ids), FIRESTORE_BATCH_LIMIT):
+            refs = [excepciones_ref.document(i) for i in unique_ids[start:start + FIRESTORE_BATCH_LIMIT]]
+            results.update(_apply(self.db.transaction(), refs))
+        return results
+    
     # DIAN Cache operations (for NIT validation)
+    # Two tiers: an in-memory LRU in front of the 'dian_cache' Firestore collection
+    @staticmethod
+    def _dian_ttl(data: Dict) -> timedelta:
+        """Negative results (No_Encontrado) expire sooner so new registrations are picked up"""
+        if data.get('estadoValidacion') == 'No_Encontrado':
+            return timedelta(days=DIAN_CACHE_NEGATIVE_TTL_DAYS)
+        return timedelta(days=DIAN_CACHE_TTL_DAYS)
+    
+    def _dian_remaining_seconds(self, data: Dict) -> float:
+        """Seconds until a cached validation stops being fresh (<= 0 when stale)"""
+        fecha = data.get('fechaValidacion')
+        if not fecha:
+            return 0
+        if fecha.tzinfo is not None:
+            # Firestore returns timezone-aware UTC timestamps
+            fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+        return (fecha + self._dian_ttl(data) - datetime.utcnow()).total_seconds()
+    
+    def _remember_dian(self, nit: str, data: Optional[Dict]):
+        """Store a Firestore-tier result (or its absence) in the memory tier"""
+        if data is None:
+            self._dian_memory.set(nit, None, ttl=DIAN_CACHE_MISS_TTL_SECONDS)
+        else:
+            ttl = min(self._dian_remaining_seconds(data), DIAN_CACHE_MEMORY_TTL_SECONDS)
+            self._dian_memory.set(nit, data, ttl=ttl)
+    
+    def _record_dian_lookup(self, memory_hits: int, firestore_hits: int, misses: int, started: float):
+        with self._dian_stats_lock:
+            stats = self._dian_stats
+            stats['memoriaHits'] += memory_hits
+            stats['firestoreHits'] += firestore_hits
+            stats['misses'] += misses
+            stats['consultas'] += 1
+            stats['segundosTotales'] += time.perf_counter() - started
+    
     def get_dian_cache(self, nit: str) -> Optional[Dict]:
         """Get cached DIAN validation for a NIT"""
-        doc = self.db.collection('dian_cache').document(nit).get()
-        if doc.exists:
-            data = doc.to_dict()
-            # Check if cache is still fresh (e.g., 30 days)
-            if data.get('fechaValidacion'):
-                age_days = (datetime.utcnow() - data['fechaValidacion']).days
-                if age_days <= 30:
-                    return data
-        return None
+        return self.get_dian_cache_many([nit]).get(nit)
+    
+    def get_dian_cache_many(self, nits: List[str]) -> Dict[str, Optional[Dict]]:
+        """Get cached DIAN validations for many NITs: memory first, then one get_all for the rest"""
+        started = time.perf_counter()
+        results: Dict[str, Optional[Dict]] = {}
+        pending = []
+        for nit in dict.fromkeys(nits):
+            value = self._dian_memory.get(nit)
+            if value is MISS:
+                pending.append(nit)
+            else:
+                results[nit] = value
+        # Remembered Firestore misses (None) are cheap but still count as misses
+        memory_hits = sum(1 for value in results.values() if value is not None)
+        
+        firestore_hits = 0
+        if pending:
+            cache_ref = self.db.collection('dian_cache')
+            found = {}
+            for start in range(0, len(pending), FIRESTORE_BATCH_LIMIT):
+                refs = [cache_ref.document(nit) for nit in pending[start:start + FIRESTORE_BATCH_LIMIT]]
+                for doc in self.db.get_all(refs):
+                    if doc.exists:
+                        found[doc.id] = doc.to_dict()
+            for nit in pending:
+                data = found.get(nit)
+                if data is not None and self._dian_remaining_seconds(data) <= 0:
+                    data = None
+                self._remember_dian(nit, data)
+                results[nit] = data
+                if data is not None:
+                    firestore_hits += 1
+        
+        misses = sum(1 for value in results.values() if value is None)
+        self._record_dian_lookup(memory_hits, firestore_hits, misses, started)
+        return results
     
     def set_dian_cache(self, nit: str, validation_data: Dict):
         """Cache DIAN validation result"""
@@ -160,6 +501,231 @@ class FirebaseService:
             **validation_data
         }
         self.db.collection('dian_cache').document(nit).set(cache_data)
+        self._remember_dian(nit, cache_data)
+    
+    def set_dian_cache_many(self, validations: Dict[str, Dict]):
+        """Cache many DIAN validation results (nit -> validation data) in batched writes"""
+        now = datetime.utcnow()
+        cache_ref = self.db.collection('dian_cache')
+        writes = []
+        for nit, validation_data in validations.items():
+            cache_data = {'nit': nit, 'fechaValidacion': now, **validation_data}
+            writes.append((cache_ref.document(nit), cache_data))
+        self._commit_batched(writes)
+        for doc_ref, cache_data in writes:
+            self._remember_dian(doc_ref.id, cache_data)
+    
+    def dian_cache_stats(self) -> Dict:
+        """Hit ratio per tier and average lookup latency"""
+        with self._dian_stats_lock:
+            stats = dict(self._dian_stats)
+        resueltos = stats['memoriaHits'] + stats['firestoreHits'] + stats['misses']
+        return {
+            'memoria': self._dian_memory.stats(),
+            'nitsConsultados': resueltos,
+            'hitRatioMemoria': round(stats['memoriaHits'] / resueltos, 4) if resueltos else None,
+            'hitRatioTotal': round((resueltos - stats['misses']) / resueltos, 4) if resueltos else None,
+            'latenciaPromedioMs': round(stats['segundosTotales'] / stats['consultas'] * 1000, 3)
+                                  if stats['consultas'] else None,
+            **{k: stats[k] for k in ('memoriaHits', 'firestoreHits', 'misses', 'consultas')}
+        }
+
+    # Homologation memory: learned corrections per (cliente, tipo, valor original)
+    def get_homologaciones(self, cliente: Optional[str] = None) -> List[Dict]:
+        """All learned mappings, optionally for a single client"""
+        query = self.db.collection('homologaciones')
+        if cliente is not None:
+            query = query.where('cliente', '==', cliente)
+        return [doc.to_dict() for doc in query.stream()]
+    
+    def set_homologaciones_many(self, mappings: List[Dict]) -> int:
+        """Upsert mappings (each carries its document 'id') in batched writes"""
+        homologaciones_ref = self.db.collection('homologaciones')
+        writes = [(homologaciones_ref.document(m['id']), m) for m in mappings]
+        return self._commit_batched(writes)
+
+    # Upload groups: several files (one lote each) received in a single request
+    def create_grupo_carga(self, grupo_data: Dict) -> str:
+        doc_ref = self.db.collection('grupos_carga').document()
+        grupo_data['id'] = doc_ref.id
+        grupo_data['fechaCarga'] = datetime.utcnow()
+        doc_ref.set(grupo_data)
+        return doc_ref.id
+    
+    def get_grupo_carga(self, grupo_id: str) -> Optional[Dict]:
+        doc = self.db.collection('grupos_carga').document(grupo_id).get()
+        return doc.to_dict() if doc.exists else None
+    
+    def update_grupo_carga(self, grupo_id: str, updates: Dict) -> bool:
+        try:
+            updates['fechaUltimaActualizacion'] = datetime.utcnow()
+            self.db.collection('grupos_carga').document(grupo_id).update(updates)
+            return True
+        except Exception:
+            return False
+
+    # Content-hash index: which lote already processed a given file for a client
+    @staticmethod
+    def _file_hash_id(cliente: str, sha256: str) -> str:
+        return hashlib.sha256(f"{cliente}|{sha256}".encode('utf-8')).hexdigest()
+    
+    def get_file_hashes(self, cliente: str, hashes: List[str]) -> Dict[str, Dict]:
+        """Index entries for the given file hashes of a client (one get_all), keyed by hash"""
+        hashes_ref = self.db.collection('file_hashes')
+        unique = list(dict.fromkeys(hashes))
+        found = {}
+        for start in range(0, len(unique), FIRESTORE_BATCH_LIMIT):
+            refs = [hashes_ref.document(self._file_hash_id(cliente, h)) for h in unique[start:start + FIRESTORE_BATCH_LIMIT]]
+            for doc in self.db.get_all(refs):
+                if doc.exists:
+                    data = doc.to_dict()
+                    found[data['sha256']] = data
+        return found
+    
+    def set_file_hashes(self, entries: List[Dict]) -> int:
+        """Point each (cliente, sha256) at the lote that holds its results (batched upsert)"""
+        hashes_ref = self.db.collection('file_hashes')
+        now = datetime.utcnow()
+        writes = []
+        for entry in entries:
+            data = {**entry, 'fechaRegistro': now, 'cargasDuplicadas': 0}
+            writes.append((hashes_ref.document(self._file_hash_id(entry['cliente'], entry['sha256'])), data))
+        return self._commit_batched(writes)
+    
+    def record_duplicate_upload(self, cliente: str, sha256: str) -> bool:
+        """Count a re-upload that was answered from the index"""
+        try:
+            self.db.collection('file_hashes').document(self._file_hash_id(cliente, sha256)).update({
+                'cargasDuplicadas': firestore.Increment(1),
+                'ultimaCargaDuplicada': datetime.utcnow()
+            })
+            return True
+        except Exception:
+            return False
+
+    # Materialized dashboard statistics: one document kept current with Increment() deltas
+    # (lotes by state and by day, excepciones by estadoGestion, records/errors of finished lotes)
+    def _stats_ref(self):
+        return self.db.collection('estadisticas').document(ESTADISTICAS_DOC_ID)
+    
+    @staticmethod
+    def _stats_day(fecha: datetime) -> str:
+        return fecha.strftime('%Y-%m-%d')
+    
+    @staticmethod
+    def _stats_increments(lotes_por_estado: Optional[Dict] = None, lotes_por_fecha: Optional[Dict] = None,
+                          excepciones_por_estado: Optional[Dict] = None, **totales) -> Dict:
+        """Nested Increment() map for set(merge=True); zero deltas and None keys are skipped"""
+        data = {}
+        for field, deltas in (('lotesPorEstado', lotes_por_estado), ('lotesPorFecha', lotes_por_fecha),
+                              ('excepcionesPorEstado', excepciones_por_estado)):
+            changes = {str(k): firestore.Increment(v) for k, v in (deltas or {}).items() if k is not None and v}
+            if changes:
+                data[field] = changes
+        for field, delta in totales.items():
+            if delta:
+                data[field] = firestore.Increment(delta)
+        return data
+    
+    def _lote_stats(self, lotes: List[Dict]) -> Dict:
+        """Deltas for newly created lotes"""
+        return {
+            'lotes_por_estado': Counter(lote.get('estado') for lote in lotes),
+            'lotes_por_fecha': Counter(self._stats_day(lote['fechaCarga']) for lote in lotes),
+        }
+    
+    @staticmethod
+    def _excepcion_stats(excepciones: List[Dict]) -> Dict:
+        """Deltas for newly created DIAN exceptions"""
+        return {'excepciones_por_estado': Counter(e.get('estadoGestion') for e in excepciones)}
+    
+    def get_estadisticas(self) -> Dict:
+        """The statistics document (single read)"""
+        doc = self._stats_ref().get()
+        return doc.to_dict() if doc.exists else {}
+    
+    def _iter_paged(self, query, page_size: int = FIRESTORE_BATCH_LIMIT):
+        """Stream a query in document-id order, one short read per page (no long-lived read)"""
+        query = query.order_by('__name__').limit(page_size)
+        last = None
+        while True:
+            docs = list((query.start_after(last) if last is not None else query).get())
+            yield from docs
+            if len(docs) < page_size:
+                return
+            last = docs[-1]
+    
+    def reconcile_estadisticas(self) -> Dict:
+        """Recount from lotes and excepciones_dian and correct the counters.
+        
+        Both collections are recounted with paged select() reads outside any
+        transaction, so the recount takes no locks that creates and state
+        updates would contend with. The difference against the stored counters
+        is then applied as Increment() deltas in a short transaction on the
+        statistics document alone. A write that lands while the pages are read
+        may be off by one until the next pass. Per-day counters older than
+        ESTADISTICAS_DIAS are dropped.
+        Returns {'correcciones': counters fixed, 'eliminados': days dropped}.
+        """
+        stats_ref = self._stats_ref()
+        since = datetime.now(timezone.utc) - timedelta(days=ESTADISTICAS_DIAS)
+        
+        lotes_por_estado, lotes_por_fecha = Counter(), Counter()
+        registros = errores = 0
+        lotes_query = self.db.collection('lotes').select(['estado', 'fechaCarga', 'registrosTotales', 'errores'])
+        for doc in self._iter_paged(lotes_query):
+            lote = doc.to_dict()
+            if lote.get('estado') is not None:
+                lotes_por_estado[str(lote['estado'])] += 1
+            fecha = lote.get('fechaCarga')
+            if fecha is not None and fecha >= since:
+                lotes_por_fecha[self._stats_day(fecha)] += 1
+            if lote.get('estado') in ESTADOS_FINALES:
+                registros += lote.get('registrosTotales') or 0
+                errores += lote.get('errores') or 0
+        excepciones_por_estado = Counter()
+        for doc in self._iter_paged(self.db.collection('excepciones_dian').select(['estadoGestion'])):
+            estado = doc.to_dict().get('estadoGestion')
+            if estado is not None:
+                excepciones_por_estado[str(estado)] += 1
+        
+        actual = {
+            'lotesPorEstado': lotes_por_estado,
+            'lotesPorFecha': lotes_por_fecha,
+            'excepcionesPorEstado': excepciones_por_estado,
+            'registrosProcesados': registros,
+            'erroresDetectados': errores,
+        }
+        since_day = self._stats_day(since)
+        
+        @firestore.transactional
+        def _apply(transaction):
+            snapshot = stats_ref.get(transaction=transaction)
+            stored = snapshot.to_dict() if snapshot.exists else {}
+            old_days = [day for day in stored.get('lotesPorFecha') or {} if day < since_day]
+            deltas = {}
+            for field, value in actual.items():
+                current = stored.get(field)
+                if isinstance(value, Counter):
+                    current = {k: v for k, v in (current or {}).items() if k not in old_days}
+                    deltas[field] = {k: value.get(k, 0) - (current.get(k) or 0) for k in set(current) | set(value)}
+                else:
+                    deltas[field] = value - (current or 0)
+            corrections = sum(
+                sum(1 for v in delta.values() if v) if isinstance(delta, dict) else int(bool(delta))
+                for delta in deltas.values()
+            )
+            data = self._stats_increments(
+                lotes_por_estado=deltas['lotesPorEstado'], lotes_por_fecha=deltas['lotesPorFecha'],
+                excepciones_por_estado=deltas['excepcionesPorEstado'],
+                registrosProcesados=deltas['registrosProcesados'], erroresDetectados=deltas['erroresDetectados'],
+            )
+            if old_days:
+                data.setdefault('lotesPorFecha', {}).update({day: firestore.DELETE_FIELD for day in old_days})
+            transaction.set(stats_ref, {**data, 'fechaReconciliacion': datetime.utcnow()}, merge=True)
+            return {'correcciones': corrections, 'eliminados': len(old_days)}
+        
+        return _apply(self.db.transaction())
 
 # Singleton instance
 firebase_service = FirebaseService()
@@ -0,0 +1,202 @@
+# backend/homologation.py
+"""
+Memoria de homologación: correcciones aprendidas por (cliente, tipo, valor original).
+
+Cada corrección que un revisor hace sobre una excepción queda guardada en
+Firestore ('homologaciones'). Al procesar un lote, los valores con corrección
+conocida se reemplazan en los registros antes de validarlos y normalizarlos
+(ver pipeline.aplicar_homologaciones), así que las descargas salen corregidas
+y los NIT que un cliente repite en cada lote se resuelven con un acceso a
+diccionario. Las correcciones sin valor de reemplazo solo descartan los
+errores del valor original.
+
+Los mapeos de producto se aplican a la columna PRODUCTO de este pipeline; el
+ProductMatcher de la app Flask (catálogo BMC en SQLite) no los consulta.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TIPOS_HOMOLOGACION = ('nit', 'producto')
+# Campos de la corrección (datosCorreccion) con el valor que reemplaza al original, por tipo
+CAMPOS_REEMPLAZO = {
+    'nit': ('nit', 'documento'),
+    'producto': ('producto', 'descripcion'),
+}
+
+_NIT_RE = re.compile(r'[^0-9-]')
+_NO_ALFANUMERICO_RE = re.compile(r'[^A-Z0-9]+')
+
+
+def normalizar_valor(tipo: str, valor) -> str:
+    """Clave de búsqueda: sin tildes ni mayúsculas; los NIT solo conservan dígitos y guion"""
+    texto = unicodedata.normalize('NFKD', str(valor).upper()).encode('ascii', 'ignore').decode('ascii')
+    if tipo == 'nit':
+        return _NIT_RE.sub('', texto)
+    return _NO_ALFANUMERICO_RE.sub(' ', texto).strip()
+
+def valor_reemplazo(tipo: str, correccion: Dict) -> Optional[str]:
+    """Valor corregido que reemplaza al original, None si la corrección no lo trae"""
+    for campo in CAMPOS_REEMPLAZO.get(tipo, ()):
+        valor = correccion.get(campo)
+        if valor not in (None, ''):
+            return str(valor).strip()
+    return None
+
+def id_homologacion(cliente: str, tipo: str, clave: str) -> str:
+    """Id de documento estable (los valores originales pueden contener '/')"""
+    return hashlib.sha1(f"{cliente}|{tipo}|{clave}".encode('utf-8')).hexdigest()
+
+
+class HomologationMemory:
+    """Diccionario por cliente delante de la colección 'homologaciones'"""
+
+    def __init__(self, store, recarga_segundos: float = 300):
+        self.store = store
+        self.recarga_segundos = recarga_segundos
+        self._clientes: Dict[str, Tuple[float, Dict[Tuple[str, str], Dict]]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _mapa(self, cliente: str) -> Dict[Tuple[str, str], Dict]:
+        """Mapeos del cliente, cargados con una sola consulta y recargados tras recarga_segundos"""
+        with self._lock:
+            cargado = self._clientes.get(cliente)
+        if cargado is not None and time.monotonic() - cargado[0] < self.recarga_segundos:
+            return cargado[1]
+        mapa = {(m['tipo'], m['clave']): m for m in self.store.get_homologaciones(cliente)}
+        with self._lock:
+            self._clientes[cliente] = (time.monotonic(), mapa)
+        return mapa
+
+    def buscar_muchos(self, cliente: str, tipo: str, valores: Iterable) -> Dict[str, Dict]:
+        """Corrección conocida para cada valor distinto (solo los que tienen mapeo)"""
+        mapa = self._mapa(cliente)
+        unicos = set(valores)
+        encontrados = {}
+        for valor in unicos:
+            mapeo = mapa.get((tipo, normalizar_valor(tipo, valor)))
+            if mapeo is not None:
+                encontrados[valor] = mapeo
+        with self._lock:
+            stats = self._stats.setdefault(cliente, {'hits': 0, 'misses': 0})
+            stats['hits'] += len(encontrados)
+            stats['misses'] += len(unicos) - len(encontrados)
+        return encontrados
+
+    def buscar(self, cliente: str, tipo: str, valor) -> Optional[Dict]:
+        return self.buscar_muchos(cliente, tipo, [valor]).get(valor)
+
+    def reemplazos(self, cliente: str) -> Dict[str, Dict[str, str]]:
+        """
+        {tipo: {clave normalizada: valor corregido}} del cliente, solo con los
+        mapeos que traen valor de reemplazo. Es un dict simple para enviarlo al
+        pool de procesos junto con el archivo.
+        """
+        reemplazos = {tipo: {} for tipo in TIPOS_HOMOLOGACION}
+        for (tipo, clave), mapeo in self._mapa(cliente).items():
+            valor = valor_reemplazo(tipo, mapeo.get('correccion') or {})
+            if valor is not None and tipo in reemplazos:
+                reemplazos[tipo][clave] = valor
+        return reemplazos
+
+    def registrar_consultas(self, cliente: str, hits: int, misses: int):
+        """Suma al hit rate las búsquedas hechas fuera de buscar_muchos (pool de procesos)"""
+        with self._lock:
+            stats = self._stats.setdefault(cliente, {'hits': 0, 'misses': 0})
+            stats['hits'] += hits
+            stats['misses'] += misses
+
+    def aprender_muchos(self, entradas: List[Dict], fuente: str = 'excepcion') -> int:
+        """
+        Guarda correcciones: cada entrada trae cliente, tipo, valorOriginal y correccion
+        (dict). Opcionalmente excepcionId como referencia de origen.
+        """
+        ahora = datetime.utcnow()
+        mapeos = []
+        for entrada in entradas:
+            if not isinstance(entrada, dict):
+                raise ValueError(f"Mapeo inválido: {entrada}")
+            cliente, tipo = entrada.get('cliente'), entrada.get('tipo')
+            valor_original, correccion = entrada.get('valorOriginal'), entrada.get('correccion')
+            if not cliente or tipo not in TIPOS_HOMOLOGACION or valor_original in (None, ''):
+                raise ValueError(f"Mapeo inválido: {entrada}")
+            if not isinstance(correccion, dict) or not correccion:
+                raise ValueError(f"Mapeo sin corrección: {entrada}")
+            clave = normalizar_valor(tipo, valor_original)
+            mapeos.append({
+                'id': id_homologacion(cliente, tipo, clave),
+                'cliente': cliente,
+                'tipo': tipo,
+                'clave': clave,
+                'valorOriginal': str(valor_original),
+                'correccion': correccion,
+                'fuente': entrada.get('fuente', fuente),
+                'excepcionId': entrada.get('excepcionId'),
+                'fechaActualizacion': ahora,
+            })
+        if not mapeos:
+            return 0
+
+        self.store.set_homologaciones_many(mapeos)
+        # Los clientes ya cargados ven la corrección de inmediato
+        with self._lock:
+            for mapeo in mapeos:
+                cargado = self._clientes.get(mapeo['cliente'])
+                if cargado is not None:
+                    cargado[1][(mapeo['tipo'], mapeo['clave'])] = mapeo
+        return len(mapeos)
+
+    def aprender(self, cliente: str, tipo: str, valor_original, correccion: Dict, **extra) -> int:
+        return self.aprender_muchos([{
+            'cliente': cliente, 'tipo': tipo, 'valorOriginal': valor_original, 'correccion': correccion, **extra
+        }])
+
+    def exportar(self, cliente: Optional[str] = None) -> List[Dict]:
+        """Mapeos en formato importable (fechas en ISO)"""
+        mapeos = []
+        for mapeo in self.store.get_homologaciones(cliente):
+            fecha = mapeo.get('fechaActualizacion')
+            mapeos.append({
+                'cliente': mapeo['cliente'],
+                'tipo': mapeo['tipo'],
+                'valorOriginal': mapeo['valorOriginal'],
+                'correccion': mapeo['correccion'],
+                'fuente': mapeo.get('fuente'),
+                'excepcionId': mapeo.get('excepcionId'),
+                'fechaActualizacion': fecha.isoformat() if hasattr(fecha, 'isoformat') else fecha,
+            })
+        return mapeos
+
+    def importar(self, mapeos: List[Dict]) -> int:
+        """Carga mapeos exportados (valida todos antes de escribir)"""
+        if not isinstance(mapeos, list):
+            raise ValueError("mapeos debe ser una lista")
+        for m in mapeos:
+            if not isinstance(m, dict):
+                raise ValueError(f"Mapeo inválido: {m}")
+        return self.aprender_muchos(
+            [{k: v for k, v in m.items() if k != 'fechaActualizacion'} for m in mapeos],
+            fuente='importacion'
+        )
+
+    def stats(self) -> Dict[str, Dict]:
+        """Hit rate por cliente y entradas en memoria"""
+        with self._lock:
+            clientes = set(self._stats) | set(self._clientes)
+            resultado = {}
+            for cliente in sorted(clientes):
+                stats = self._stats.get(cliente, {'hits': 0, 'misses': 0})
+                total = stats['hits'] + stats['misses']
+                cargado = self._clientes.get(cliente)
+                resultado[cliente] = {
+                    'entradas': len(cargado[1]) if cargado else None,
+                    'hits': stats['hits'],
+                    'misses': stats['misses'],
+                    'hitRate': round(stats['hits'] / total, 4) if total else None,
+                }
+            return resultado
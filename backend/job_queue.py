@@ -0,0 +1,187 @@
+# backend/job_queue.py
+"""
+Cola local de trabajos para el procesamiento de lotes.
+
+Los endpoints encolan el lote y responden de inmediato; un pool de hilos
+consume la cola y delega el parseo (CPU) a un pool de procesos para no
+bloquear el event loop de uvicorn.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+class Job:
+    """Trabajo encolado con sus tiempos de espera y ejecución"""
+
+    def __init__(self, job_id: str, payload: Dict):
+        self.id = job_id
+        self.payload = payload
+        self.estado = "En Cola"
+        self.error: Optional[str] = None
+        self.encolado = time.monotonic()
+        self.inicio: Optional[float] = None
+        self.fin: Optional[float] = None
+        self.fecha_encolado = datetime.utcnow()
+
+    def to_dict(self) -> Dict:
+        espera = (self.inicio or time.monotonic()) - self.encolado
+        ejecucion = None
+        if self.inicio is not None:
+            ejecucion = (self.fin or time.monotonic()) - self.inicio
+        return {
+            "id": self.id,
+            "estado": self.estado,
+            "error": self.error,
+            "fechaEncolado": self.fecha_encolado.isoformat(),
+            "segundosEnCola": round(espera, 3),
+            "segundosProcesando": round(ejecucion, 3) if ejecucion is not None else None,
+        }
+
+
+class JobQueue:
+    """Cola en memoria con workers de orquestación y pool de procesos para parseo"""
+
+    def __init__(self, handler: Callable[..., None], workers: int = 2,
+                 process_workers: int = 2, history_size: int = 100):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.process_workers = max(1, process_workers)
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._activos: Dict[str, Job] = {}
+        self._historial: deque = deque(maxlen=history_size)
+        self._completados = 0
+        self._fallidos = 0
+        self._tiempo_total = 0.0
+        self._pools_recreados = 0
+
+    def start(self):
+        """Arranca los workers (idempotente)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._pool = ProcessPoolExecutor(max_workers=self.process_workers)
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        print(f"[CONSOLE LOG] Cola de trabajos iniciada: {self.workers} workers, {self.process_workers} procesos")
+
+    def shutdown(self, wait: bool = True):
+        """Detiene los workers después de vaciar la cola"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+        if self._pool:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+    def submit(self, job_id: str, **payload) -> Job:
+        """Encola un trabajo; el handler recibe el payload como kwargs"""
+        self.start()
+        job = Job(job_id, payload)
+        with self._lock:
+            self._activos[job_id] = job
+        self._queue.put(job)
+        return job
+
+    def _reemplazar_pool(self, roto: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Cambia un pool roto por uno nuevo (una sola vez aunque varios hilos lo detecten)"""
+        with self._lock:
+            if self._pool is None:
+                raise BrokenProcessPool("La cola de trabajos se detuvo")
+            if self._pool is roto:
+                print(f"[CONSOLE LOG] WARNING: un proceso de parseo terminó abruptamente; se recrea el pool")
+                self._pool = ProcessPoolExecutor(max_workers=self.process_workers)
+                self._pools_recreados += 1
+                roto.shutdown(wait=False)
+            return self._pool
+
+    def run_in_process(self, fn: Callable, *args):
+        """
+        Ejecuta fn en el pool de procesos y espera el resultado.
+
+        Si un proceso muere (p. ej. por falta de memoria) el pool queda roto
+        para todas las tareas: se recrea y la tarea se reintenta una vez. Si
+        vuelve a romperlo, el error llega al handler del trabajo.
+        """
+        pool = self._pool
+        if pool is None:
+            return fn(*args)
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            pool = self._reemplazar_pool(pool)
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._reemplazar_pool(pool)
+            raise
+
+    def payloads_activos(self) -> List[Dict]:
+        """Payloads de los trabajos en cola o en proceso"""
+        with self._lock:
+            return [dict(job.payload) for job in self._activos.values()]
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            job = self._activos.get(job_id)
+            if job is None:
+                job = next((j for j in self._historial if j.id == job_id), None)
+            return job.to_dict() if job else None
+
+    def stats(self) -> Dict:
+        """Profundidad de cola, workers y tiempos para dimensionar el pool"""
+        with self._lock:
+            en_proceso = [j for j in self._activos.values() if j.estado == "Procesando"]
+            terminados = self._completados + self._fallidos
+            return {
+                "profundidadCola": self._queue.qsize(),
+                "workers": self.workers,
+                "procesosParseo": self.process_workers,
+                "enProceso": len(en_proceso),
+                "completados": self._completados,
+                "fallidos": self._fallidos,
+                "segundosPromedio": round(self._tiempo_total / terminados, 3) if terminados else None,
+                "poolsRecreados": self._pools_recreados,
+                "recientes": [j.to_dict() for j in reversed(self._historial)],
+            }
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._queue.task_done()
+                return
+            job.estado = "Procesando"
+            job.inicio = time.monotonic()
+            try:
+                self.handler(**job.payload)
+                job.estado = "Completado"
+            except Exception as e:
+                job.estado = "Error"
+                job.error = str(e)
+                print(f"[CONSOLE LOG] ERROR en trabajo {job.id}: {e}")
+            finally:
+                job.fin = time.monotonic()
+                with self._lock:
+                    self._activos.pop(job.id, None)
+                    self._historial.append(job)
+                    if job.estado == "Completado":
+                        self._completados += 1
+                    else:
+                        self._fallidos += 1
+                    self._tiempo_total += job.fin - job.inicio
+                self._queue.task_done()
@@ -1,23 +1,40 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 import os
-import shutil
 import json
-from datetime import datetime
-from typing import List, Optional
-import tempfile
-from openpyxl import Workbook
+import hashlib
+import threading
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, List, Optional
 from dotenv import load_dotenv
-import xml.etree.ElementTree as ET
-import csv
-import pandas as pd
 
 # Cargar variables de entorno al inicio
 load_dotenv()
 
 # Firebase service - importación simplificada
 from firebase_service import firebase_service
+from app.config import (
+    ARTIFACT_STORE_MAX_BYTES, ESTADISTICAS_RECONCILIACION_MINUTOS, EXPORTS_DIR, HOMOLOGACION_RECARGA_SEGUNDOS, JOB_HUERFANO_MINUTOS,
+    JOB_WORKERS, MAX_ARCHIVOS_POR_GRUPO, MAX_EXCEPCIONES_BULK,
+    MAX_FILE_SIZE, MAX_UPLOAD_SIZE, PARSE_PROCESSES, REGISTROS_DIR, STAGING_DIR, STAGING_JANITOR_MINUTES,
+    STAGING_MAX_BYTES, STAGING_ORPHAN_HOURS, STAGING_RETRY_AFTER_SECONDS, UPLOAD_MAX_CHUNK_SIZE,
+    UPLOAD_MAX_SESSIONS, UPLOAD_SESSION_TTL_HOURS, UPLOAD_SESSIONS_DIR, UPLOAD_SESSIONS_MAX_BYTES,
+    VALIDATION_MAX_STORED_ERRORS
+)
+from file_processors import detect_file_format_by_content
+from validation import documentos_error, documentos_excepcion, resumen_errores
+from exports import FORMATOS_EXPORTACION, PLANTILLA_FORMATO_VERSION, formatos_disponibles, generar_exportacion
+from pipeline import procesar_archivo
+from artifact_store import ArtifactStore, iter_rango, parse_range, version_por_stat
+from homologation import HomologationMemory
+from resumable_upload import ResumableUploadManager, UploadError
+from staging import StagedFileTooLarge, StagingArea, StagingFullError, nombre_seguro
+from job_queue import JobQueue
 
 app = FastAPI(title="Armorum API", version="1.0.0")
 
@@ -30,463 +47,149 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def detect_file_format_by_content(file_path: str, filename: str) -> str:
-    """Detecta el formato del archivo por contenido, no solo por extensión"""
-    print(f"[CONSOLE LOG] Detectando formato para archivo: {filename}")
-    
-    try:
-        # Leer primeras líneas para detectar formato
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            first_lines = f.read(1024)  # Leer primeros 1KB
-        
-        # Detectar XML
-        if first_lines.strip().startswith('<?xml') or '<' in first_lines:
-            print(f"[CONSOLE LOG] Formato detectado por contenido: XML")
-            return 'xml'
-        
-        # Detectar CSV por delimitadores
-        if ',' in first_lines and ('\n' in first_lines or '\r' in first_lines):
-            lines = first_lines.split('\n')[:3]
-            comma_count = sum(line.count(',') for line in lines)
-            if comma_count > 0:
-                print(f"[CONSOLE LOG] Formato detectado por contenido: CSV")
-                return 'csv_excel'
-        
-        # Detectar TXT estructurado (con múltiples espacios como separadores)
-        if '    ' in first_lines or '\t' in first_lines:
-            print(f"[CONSOLE LOG] Formato detectado por contenido: TXT estructurado")
-            return 'txt_plano'
-        
-        # Fallback a extensión
-        extension = filename.lower().split('.')[-1]
-        print(f"[CONSOLE LOG] Usando extensión como fallback: {extension}")
-        
-        if extension == 'xml':
-            return 'xml'
-        elif extension in ['csv', 'xlsx', 'xls']:
-            return 'csv_excel'
-        elif extension == 'txt':
-            return 'txt_plano'
-        else:
-            return 'unknown'
-            
-    except Exception as e:
-        print(f"[CONSOLE LOG] Error detectando formato: {e}")
-        return 'unknown'
+@app.get("/")
+async def root():
+    return {"message": "Armorum API funcionando en Firebase"}
 
-def process_file_by_type(file_path: str, formato: str, filename: str):
-    """Procesa archivos según su tipo (XML, CSV/Excel, TXT)"""
-    print(f"[CONSOLE LOG] Procesando archivo: {filename} con formato: {formato}")
-    
-    # Si es auto_detect, usar detección inteligente por contenido
-    if formato == 'auto_detect':
-        formato = detect_file_format_by_content(file_path, filename)
-        print(f"[CONSOLE LOG] Formato auto-detectado: {formato}")
-    
-    try:
-        if formato == "xml":
-            return process_xml_file(file_path, filename)
-        elif formato in ["csv_excel", "plantilla51"]:
-            extension = filename.lower().split('.')[-1]
-            return process_csv_excel_file(file_path, extension, filename)
-        elif formato == "txt_plano":
-            return process_txt_file(file_path, filename)
-        else:
-            print(f"[CONSOLE LOG] ERROR: Formato no reconocido: {formato}")
-            return {
-                "success": False,
-                "registros": 0,
-                "errores": [f"Formato de archivo no reconocido: {formato}"]
-            }
-    except Exception as e:
-        print(f"[CONSOLE LOG] ERROR en procesamiento: {str(e)}")
-        return {
-            "success": False,
-            "registros": 0,
-            "errores": [f"Error procesando archivo: {str(e)}"]
-        }
+EXTENSIONES_CARGA = ['.xml', '.csv', '.xlsx', '.xls', '.txt']
+CLIENTE_NOMBRES = {"1": "Comiagro", "2": "Olímpica", "3": "Cliente Regional"}
 
-def process_xml_file(file_path: str, filename: str):
-    """Procesa archivos XML de facturas electrónicas"""
-    print(f"[CONSOLE LOG] Iniciando procesamiento XML: {filename}")
-    
-    try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        print(f"[CONSOLE LOG] XML parseado exitosamente. Root element: {root.tag}")
-        
-        # Buscar facturas de manera más precisa
-        facturas_encontradas = 0
-        errores = []
-        
-        # Patrón 1: Buscar elementos con "Factura" en el nombre (caso común)
-        facturas_found = root.findall(".//FacturaElectronica")
-        if facturas_found:
-            facturas_encontradas = len(facturas_found)
-            print(f"[CONSOLE LOG] Encontradas {facturas_encontradas} FacturaElectronica")
-        
-        # Patrón 2: Si no encuentra, buscar por otros patrones comunes
-        if facturas_encontradas == 0:
-            facturas_found = root.findall(".//Factura")
-            if facturas_found:
-                facturas_encontradas = len(facturas_found)
-                print(f"[CONSOLE LOG] Encontradas {facturas_encontradas} Factura")
-        
-        # Patrón 3: Si no encuentra, buscar por Invoice (formato internacional)
-        if facturas_encontradas == 0:
-            facturas_found = root.findall(".//Invoice")
-            if facturas_found:
-                facturas_encontradas = len(facturas_found)
-                print(f"[CONSOLE LOG] Encontradas {facturas_encontradas} Invoice")
-        
-        # Si aún no encuentra facturas, verificar si el root es una factura
-        if facturas_encontradas == 0:
-            if "factura" in root.tag.lower() or "invoice" in root.tag.lower():
-                facturas_encontradas = 1
-                print(f"[CONSOLE LOG] Root element es una factura: {root.tag}")
-            else:
-                # Como último recurso, contar elementos hijos directos que podrían ser facturas
-                children = list(root)
-                if children:
-                    facturas_encontradas = len(children)
-                    print(f"[CONSOLE LOG] Contando elementos hijos como facturas: {facturas_encontradas}")
-                else:
-                    facturas_encontradas = 1  # Al menos hay un XML válido
-                    print(f"[CONSOLE LOG] XML válido pero sin estructura de facturas clara")
-        
-        # Validar datos mínimos en las facturas encontradas
-        if facturas_encontradas > 0:
-            # Verificar que al menos una factura tenga datos
-            sample_factura = facturas_found[0] if facturas_found else root
-            
-            # Buscar elementos comunes en facturas
-            numero_factura = sample_factura.find(".//NumeroFactura")
-            fecha = sample_factura.find(".//FechaEmision") or sample_factura.find(".//Fecha")
-            total = sample_factura.find(".//Total") or sample_factura.find(".//TotalFactura")
-            
-            if not any([numero_factura, fecha, total]):
-                errores.append("XML válido pero sin estructura de factura reconocible")
-                print(f"[CONSOLE LOG] WARNING: No se encontraron datos de factura estándar")
-        
-        print(f"[CONSOLE LOG] Procesamiento XML completado: {facturas_encontradas} facturas")
-        return {
-            "success": True,
-            "registros": facturas_encontradas,
-            "errores": errores,
-            "tipo": "XML",
-            "detalles": {
-                "rootElement": root.tag,
-                "namespaces": list(root.nsmap.keys()) if hasattr(root, 'nsmap') else []
-            }
-        }
-        
-    except ET.ParseError as e:
-        error_msg = f"Error parsing XML: {str(e)}"
-        print(f"[CONSOLE LOG] ERROR: {error_msg}")
-        return {
-            "success": False,
-            "registros": 0,
-            "errores": [error_msg]
-        }
-    except Exception as e:
-        error_msg = f"Error inesperado procesando XML: {str(e)}"
-        print(f"[CONSOLE LOG] ERROR: {error_msg}")
-        return {
-            "success": False,
-            "registros": 0,
-            "errores": [error_msg]
-        }
+def sin_espacio(e: StagingFullError) -> HTTPException:
+    """503 con Retry-After: el cliente reintenta cuando el procesamiento libere staging"""
+    print(f"[CONSOLE LOG] WARNING: {e}")
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
-def process_csv_excel_file(file_path: str, extension: str, filename: str):
-    """Procesa archivos CSV y Excel"""
-    print(f"[CONSOLE LOG] Iniciando procesamiento {extension.upper()}: {filename}")
-    
-    try:
-        # Intentar diferentes encodings para CSV
-        if extension == "csv":
-            # Primero intentar con UTF-8
-            try:
-                df = pd.read_csv(file_path, encoding='utf-8')
-                print(f"[CONSOLE LOG] CSV leído con encoding UTF-8")
-            except UnicodeDecodeError:
-                # Si falla, intentar con latin-1
-                df = pd.read_csv(file_path, encoding='latin-1')
-                print(f"[CONSOLE LOG] CSV leído con encoding latin-1")
-        else:
-            # Leer Excel
-            df = pd.read_excel(file_path)
-            print(f"[CONSOLE LOG] Excel leído exitosamente")
-        
-        # Verificar si tiene datos
-        registros = len(df)
-        errores = []
-        print(f"[CONSOLE LOG] Total de registros encontrados: {registros}")
-        print(f"[CONSOLE LOG] Columnas encontradas: {list(df.columns)}")
-        
-        # Validaciones básicas
-        if registros == 0:
-            errores.append("El archivo no contiene datos")
-            print(f"[CONSOLE LOG] ERROR: Archivo vacío")
-        
-        # Verificar si tiene columnas
-        if len(df.columns) == 0:
-            errores.append("El archivo no tiene columnas definidas")
-            print(f"[CONSOLE LOG] ERROR: Sin columnas definidas")
-        
-        # Validaciones específicas para archivos de factura
-        column_names = [col.strip().upper() for col in df.columns]
-        expected_columns = [
-            'NOMBRE USUARIO', 'NIT USUARIO', 'FACT NRO', 'FECHA', 
-            'PRODUCTO', 'CANTIDAD', 'VALOR UNITARIO', 'TOTAL'
-        ]
-        
-        # Verificar si parece un archivo de facturas
-        is_invoice_file = False
-        for exp_col in expected_columns[:4]:  # Verificar al menos las primeras 4 columnas
-            if any(exp_col in col for col in column_names):
-                is_invoice_file = True
-                break
-        
-        if not is_invoice_file and registros > 0:
-            print(f"[CONSOLE LOG] WARNING: Archivo no parece tener estructura de facturas estándar")
-        
-        # Detectar filas vacías
-        empty_rows = df.isnull().all(axis=1).sum()
-        if empty_rows > 0:
-            print(f"[CONSOLE LOG] WARNING: {empty_rows} filas vacías encontradas")
-        
-        # Información adicional
-        sample_data = df.head(3).to_dict('records') if registros > 0 else []
-        
-        print(f"[CONSOLE LOG] Procesamiento {extension.upper()} completado exitosamente")
-        return {
-            "success": len(errores) == 0,
-            "registros": registros,
-            "errores": errores,
-            "tipo": f"CSV/Excel ({extension.upper()})",
-            "columnas": list(df.columns)[:15],  # Primeras 15 columnas
-            "detalles": {
-                "emptyRows": empty_rows,
-                "isInvoiceFormat": is_invoice_file,
-                "sampleData": sample_data
-            }
-        }
-        
-    except pd.errors.EmptyDataError:
-        error_msg = "El archivo está vacío o no contiene datos válidos"
-        print(f"[CONSOLE LOG] ERROR: {error_msg}")
-        return {
-            "success": False,
-            "registros": 0,
-            "errores": [error_msg]
-        }
-    except pd.errors.ParserError as e:
-        error_msg = f"Error parseando {extension.upper()}: {str(e)}"
-        print(f"[CONSOLE LOG] ERROR: {error_msg}")
-        return {
-            "success": False,
-            "registros": 0,
-            "errores": [error_msg]
-        }
-    except Exception as e:
-        error_msg = f"Error procesando {extension.upper()}: {str(e)}"
-        print(f"[CONSOLE LOG] ERROR: {error_msg}")
+def datos_lote(file_path: str, filename: str, cliente: str, formato_archivo: str, grupo_id: Optional[str] = None) -> dict:
+    """Documento de un lote nuevo (con detección de formato si es 'auto_detect')"""
+    formato_final = formato_archivo
+    if formato_archivo == 'auto_detect':
+        print(f"[CONSOLE LOG] Iniciando detección automática de formato")
+        formato_final = detect_file_format_by_content(file_path, filename)
+        print(f"[CONSOLE LOG] Formato detectado automáticamente: {formato_final}")
+    lote_data = {
+        "nombreArchivo": filename,
+        "cliente": cliente,
+        "formato": formato_final,
+        "estado": "En Cola",
+        "registrosTotales": 0,
+        "errores": 0,
+        "filePath": file_path
+    }
+    if grupo_id:
+        lote_data["grupoId"] = grupo_id
+    return lote_data
+
+def encolar_lote(lote_id: str, lote_data: dict, mensaje: Optional[str] = None):
+    mensaje = mensaje or f"Archivo recibido. Tipo: {lote_data['formato']}. Cliente: {lote_data['cliente']}"
+    firebase_service.add_log(lote_id, mensaje, buffered=True)
+    job_queue.submit(
+        lote_id,
+        lote_id=lote_id,
+        file_path=lote_data["filePath"],
+        formato_final=lote_data["formato"],
+        filename=lote_data["nombreArchivo"],
+        cliente=lote_data["cliente"]
+    )
+    firebase_service.add_log(lote_id, "Lote encolado para procesamiento", buffered=True)
+    firebase_service.flush_logs(lote_id)
+
+def lotes_previos(cliente: str, hashes: List[str]) -> dict:
+    """
+    Lote que ya procesó cada SHA-256 para el cliente (índice file_hashes), por hash.
+
+    Solo cuentan lotes cuyos resultados siguen sirviendo: los que terminaron en
+    Error o cuyos registros normalizados ya no están en disco se reprocesan.
+    """
+    indice = firebase_service.get_file_hashes(cliente, hashes) if hashes else {}
+    if not indice:
+        return {}
+    lotes = {lote["id"]: lote for lote in firebase_service.get_lotes_by_ids([e["loteId"] for e in indice.values()])}
+    previos = {}
+    for sha256, entrada in indice.items():
+        lote = lotes.get(entrada["loteId"])
+        if not lote or lote.get("estado") == "Error":
+            continue
+        if lote.get("registrosPath") and not os.path.exists(lote["registrosPath"]):
+            continue
+        previos[sha256] = lote
+    return previos
+
+def registrar_hashes(lotes: List[tuple]):
+    """Indexa (cliente, sha256) → lote para las cargas siguientes; recibe pares (lote_id, lote_data)"""
+    firebase_service.set_file_hashes([
+        {"cliente": data["cliente"], "sha256": data["sha256"], "loteId": lote_id, "nombreArchivo": data["nombreArchivo"]}
+        for lote_id, data in lotes
+    ])
+
+def reutilizar_lote(lote: dict, nombre: str, sha256: str) -> dict:
+    """Anota la carga repetida en el lote existente; devuelve su entrada para la respuesta"""
+    firebase_service.record_duplicate_upload(lote["cliente"], sha256)
+    firebase_service.add_log(lote["id"], f"Archivo {nombre} cargado de nuevo (sha256 {sha256[:12]}): se reutilizan estos resultados", buffered=True)
+    firebase_service.flush_logs(lote["id"])
+    print(f"[CONSOLE LOG] {nombre} ya fue procesado en el lote {lote['id']}: no se reprocesa")
+    fecha_carga = lote.get("fechaCarga")
+    return {
+        "loteId": lote["id"],
+        "nombreArchivo": nombre,
+        "estado": lote.get("estado"),
+        "fechaCarga": fecha_carga.isoformat() if isinstance(fecha_carga, datetime) else fecha_carga,
+        "formatoDetectado": lote.get("formato"),
+        "duplicado": True
+    }
+
+def marcar_reproceso(lote_data: dict, previo: Optional[dict]):
+    """Lote nuevo de un archivo ya procesado (forzarReproceso): queda enlazado al anterior"""
+    if previo:
+        lote_data["lotePrevioId"] = previo["id"]
+        lote_data["reprocesoForzado"] = True
+
+def registrar_carga(file_path: str, nombre: str, sha256: str, cliente: str, formato: str, forzar: bool) -> dict:
+    """
+    Lote de un archivo ya en staging: reutiliza el lote previo del mismo
+    SHA-256 o crea, indexa y encola uno nuevo. Hace llamadas bloqueantes
+    (Firestore, lectura del archivo para detectar el formato): los endpoints
+    la ejecutan con run_in_threadpool. Devuelve la respuesta del endpoint.
+    """
+    # Mismo archivo ya procesado para este cliente: se devuelve ese lote sin reprocesar
+    previo = lotes_previos(cliente, [sha256]).get(sha256)
+    if previo and not forzar:
+        staging.liberar(file_path)
         return {
-            "success": False,
-            "registros": 0,
-            "errores": [error_msg]
+            "success": True,
+            "message": "Archivo ya procesado: se reutiliza el lote existente",
+            "data": {**reutilizar_lote(previo, nombre, sha256), "sha256": sha256}
         }
-
-def process_txt_file(file_path: str, filename: str):
-    """Procesa archivos de texto plano con estructura de facturación"""
-    print(f"[CONSOLE LOG] Iniciando procesamiento TXT: {filename}")
     
-    # Estructura estándar esperada (15 columnas)
-    EXPECTED_COLUMNS = [
-        'NOMBRE VENDEDOR', 'NIT VENDEDOR', 'NOMBRE COMPRADOR', 'NIT COMPRADOR',
-        'CIUDAD DE ENTREGA DEL PRODUCTO', 'FACT NRO', 'PREFIJO', 'FECHA',
-        'FORMA DE PAGO(#DIAS)', 'PRODUCTO', 'CANTIDAD', 'UNIDAD',
-        'VALOR UNITARIO', 'TOTAL', '% IVA PRODUCTO'
-    ]
+    print(f"[CONSOLE LOG] Creando lote en Firestore")
+    lote_data = datos_lote(file_path, nombre, cliente, formato)
+    lote_data["sha256"] = sha256
+    marcar_reproceso(lote_data, previo)
+    lote_id = firebase_service.create_lote(lote_data)
+    registrar_hashes([(lote_id, lote_data)])
+    print(f"[CONSOLE LOG] Lote creado con ID: {lote_id}")
     
-    try:
-        # Intentar diferentes encodings
-        content = None
-        encoding_used = None
-        
-        for encoding in ['utf-8', 'latin-1', 'cp1252']:
-            try:
-                with open(file_path, 'r', encoding=encoding) as file:
-                    content = file.read()
-                    encoding_used = encoding
-                    print(f"[CONSOLE LOG] TXT leído con encoding {encoding}")
-                    break
-            except UnicodeDecodeError:
-                continue
-        
-        if content is None:
-            raise Exception("No se pudo leer el archivo con ningún encoding")
-        
-        lines = content.split('\n')
-        
-        # Filtrar líneas no vacías y quitar espacios extra
-        non_empty_lines = [line.strip() for line in lines if line.strip()]
-        total_lines = len(non_empty_lines)
-        print(f"[CONSOLE LOG] Total de líneas no vacías: {total_lines}")
-        
-        errores = []
-        if total_lines == 0:
-            errores.append("El archivo de texto está vacío")
-            print(f"[CONSOLE LOG] ERROR: Archivo vacío")
-            return {
-                "success": False,
-                "registros": 0,
-                "errores": errores
-            }
-        
-        # Analizar estructura del archivo
-        estructura_detectada = "Texto libre"
-        registros_datos = 0
-        separador_detectado = None
-        
-        # Buscar línea de cabecera con las columnas estándar
-        header_line_idx = -1
-        for i, line in enumerate(non_empty_lines):
-            # Verificar si contiene columnas estándar de facturación
-            line_upper = line.upper()
-            if 'NOMBRE VENDEDOR' in line_upper and 'NIT VENDEDOR' in line_upper:
-                header_line_idx = i
-                print(f"[CONSOLE LOG] Header encontrado en línea {i}")
-                break
-            elif any(keyword in line_upper for keyword in ['FACT NRO', 'FECHA', 'PRODUCTO']):
-                header_line_idx = i
-                print(f"[CONSOLE LOG] Posible header alternativo en línea {i}")
-                break
-        
-        # Detectar separador basado en la línea de header o primera línea de datos
-        sample_line = None
-        if header_line_idx >= 0 and header_line_idx + 1 < len(non_empty_lines):
-            sample_line = non_empty_lines[header_line_idx + 1]  # Primera línea de datos
-        else:
-            # Buscar primera línea que parezca datos
-            for line in non_empty_lines:
-                if not line.startswith('=') and not line.startswith('-') and \
-                   not any(keyword in line.upper() for keyword in ['FACTURAS', 'ARMORUM', 'FORMATO']):
-                    sample_line = line
-                    break
-        
-        if sample_line:
-            print(f"[CONSOLE LOG] Línea de muestra: {sample_line[:100]}...")
-            
-            # Detectar separadores
-            if '\t' in sample_line:
-                estructura_detectada = "Delimitado por tabs"
-                separador_detectado = '\t'
-                print(f"[CONSOLE LOG] Detectado delimitador TAB")
-            elif '|' in sample_line:
-                estructura_detectada = "Delimitado por |"
-                separador_detectado = '|'
-                print(f"[CONSOLE LOG] Detectado delimitador |")
-            elif sample_line.count(',') >= 5:  # Al menos 5 comas para 15 columnas
-                estructura_detectada = "Posiblemente CSV"
-                separador_detectado = ','
-                print(f"[CONSOLE LOG] Detectado delimitador ,")
-            elif sample_line.count('   ') >= 3:  # Múltiples espacios para separar campos
-                estructura_detectada = "Delimitado por espacios múltiples"
-                separador_detectado = 'espacios'
-                print(f"[CONSOLE LOG] Detectado delimitador por espacios múltiples")
-        
-        # Contar registros de datos
-        start_idx = max(header_line_idx + 1, 0) if header_line_idx >= 0 else 0
-        registros_datos = 0
-        
-        for i in range(start_idx, len(non_empty_lines)):
-            line = non_empty_lines[i]
-            
-            # Saltar líneas que claramente no son datos
-            if line.startswith('=') or line.startswith('-') or \
-               any(keyword in line.upper() for keyword in ['FACTURAS', 'ARMORUM', 'FORMATO', 'NOVEDADES']):
-                continue
-            
-            # Validar que la línea tenga la estructura esperada
-            if separador_detectado and separador_detectado != 'espacios':
-                campos = line.split(separador_detectado)
-                if len(campos) >= 10:  # Al menos 10 campos de los 15 esperados
-                    registros_datos += 1
-            elif separador_detectado == 'espacios':
-                # Para espacios múltiples, usar expresión regular para separar
-                import re
-                campos = re.split(r'\s{2,}', line)
-                if len(campos) >= 10:
-                    registros_datos += 1
-            else:
-                # Sin separador claro, asumir formato libre
-                registros_datos += 1
-        
-        print(f"[CONSOLE LOG] Registros de datos detectados: {registros_datos}")
-        print(f"[CONSOLE LOG] Estructura detectada: {estructura_detectada}")
-        
-        # Validar estructura estándar si se detectó header
-        if header_line_idx >= 0:
-            header_line = non_empty_lines[header_line_idx]
-            matched_columns = 0
-            for expected_col in EXPECTED_COLUMNS[:10]:  # Verificar al menos 10 de las 15 columnas
-                if expected_col.upper() in header_line.upper():
-                    matched_columns += 1
-            
-            if matched_columns < 5:
-                errores.append(f"Estructura no coincide con formato estándar de facturación. Solo {matched_columns} columnas reconocidas")
-                print(f"[CONSOLE LOG] WARNING: Estructura no estándar")
-        
-        # Extraer muestra de datos para análisis
-        sample_records = []
-        if registros_datos > 0 and separador_detectado:
-            for i in range(min(3, registros_datos)):
-                line_idx = start_idx + i
-                if line_idx < len(non_empty_lines):
-                    line = non_empty_lines[line_idx]
-                    if separador_detectado == 'espacios':
-                        import re
-                        campos = re.split(r'\s{2,}', line)
-                    else:
-                        campos = line.split(separador_detectado)
-                    sample_records.append(campos[:15])  # Máximo 15 campos
-        
-        print(f"[CONSOLE LOG] Procesamiento TXT completado")
-        return {
-            "success": len(errores) == 0,
-            "registros": registros_datos,
-            "errores": errores,
-            "tipo": "TXT",
-            "estructura": estructura_detectada,
-            "detalles": {
-                "separador": separador_detectado,
-                "headerEncontrado": header_line_idx >= 0,
-                "totalLineas": total_lines,
-                "estructuraEstandar": header_line_idx >= 0,
-                "sampleRecords": sample_records,
-                "encoding": encoding_used
-            }
-        }
-        
-    except Exception as e:
-        error_msg = f"Error procesando TXT: {str(e)}"
-        print(f"[CONSOLE LOG] ERROR: {error_msg}")
-        return {
-            "success": False,
-            "registros": 0,
-            "errores": [error_msg]
+    encolar_lote(lote_id, lote_data)
+    print(f"[CONSOLE LOG] Lote {lote_id} encolado. Profundidad de cola: {job_queue.stats()['profundidadCola']}")
+    return {
+        "success": True,
+        "message": "Archivo recibido y encolado para procesamiento",
+        "data": {
+            "loteId": lote_id,
+            "nombreArchivo": nombre,
+            "estado": "En Cola",
+            "fechaCarga": datetime.utcnow().isoformat(),
+            "formatoDetectado": lote_data["formato"],
+            "sha256": sha256,
+            "duplicado": False
         }
-
-@app.get("/")
-async def root():
-    return {"message": "Armorum API funcionando en Firebase"}
+    }
 
 @app.post("/api/facturas/cargar")
 async def cargar_archivo(
     archivo: UploadFile = File(...),
     clienteId: str = Form(...),
-    formatoArchivo: str = Form(...)
+    formatoArchivo: str = Form(...),
+    forzarReproceso: bool = Form(False)
 ):
     print(f"[CONSOLE LOG] ==== INICIO CARGA ARCHIVO ====")
     print(f"[CONSOLE LOG] Archivo: {archivo.filename}")
@@ -494,153 +197,416 @@ async def cargar_archivo(
     print(f"[CONSOLE LOG] Formato solicitado: {formatoArchivo}")
     print(f"[CONSOLE LOG] Tamaño archivo: {archivo.size} bytes")
     
-    # Validaciones básicas
-    if archivo.size > 50 * 1024 * 1024:  # 50MB
+    # Validaciones básicas (archivos más grandes van por /api/facturas/cargas, reanudable)
+    if archivo.size > MAX_FILE_SIZE:
         print(f"[CONSOLE LOG] ERROR: Archivo muy grande ({archivo.size} bytes)")
-        raise HTTPException(status_code=413, detail="Archivo muy grande")
+        raise HTTPException(status_code=413, detail="Archivo muy grande: use la carga reanudable (/api/facturas/cargas)")
     
     # Validar extensión
-    allowed_extensions = ['.xml', '.csv', '.xlsx', '.xls', '.txt']
     file_extension = os.path.splitext(archivo.filename)[1].lower()
-    if file_extension not in allowed_extensions:
+    if file_extension not in EXTENSIONES_CARGA:
         print(f"[CONSOLE LOG] WARNING: Extensión no estándar: {file_extension}")
     
-    # Guardar archivo temporalmente
-    file_path = f"uploads/{archivo.filename}"
-    os.makedirs("uploads", exist_ok=True)
-    print(f"[CONSOLE LOG] Guardando archivo en: {file_path}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(archivo.file, buffer)
-    print(f"[CONSOLE LOG] Archivo guardado exitosamente")
+    # Guardar archivo en staging (ruta única por carga, SHA-256 en el mismo recorrido)
+    try:
+        guardado = await run_in_threadpool(staging.guardar, archivo.file, archivo.filename, archivo.size)
+    except StagingFullError as e:
+        raise sin_espacio(e)
+    file_path = guardado["path"]
+    print(f"[CONSOLE LOG] Archivo guardado en: {file_path} (sha256 {guardado['sha256']})")
     
     # Mapeo de clientes
-    cliente_nombres = {"1": "Comiagro", "2": "Olímpica", "3": "Cliente Regional"}
-    cliente_seleccionado = cliente_nombres.get(clienteId, "Cliente Desconocido")
+    cliente_seleccionado = CLIENTE_NOMBRES.get(clienteId, "Cliente Desconocido")
     print(f"[CONSOLE LOG] Cliente seleccionado: {cliente_seleccionado}")
     
-    # Detección automática de formato si es 'auto_detect'
-    formato_final = formatoArchivo
-    if formatoArchivo == 'auto_detect':
-        print(f"[CONSOLE LOG] Iniciando detección automática de formato")
-        formato_final = detect_file_format_by_content(file_path, archivo.filename)
-        print(f"[CONSOLE LOG] Formato detectado automáticamente: {formato_final}")
+    # Firestore y detección de formato fuera del event loop
+    respuesta = await run_in_threadpool(
+        registrar_carga, file_path, archivo.filename, guardado["sha256"],
+        cliente_seleccionado, formatoArchivo, forzarReproceso
+    )
+    print(f"[CONSOLE LOG] ==== FIN CARGA ARCHIVO ====")
+    return respuesta
+
+# Carga reanudable: POST (iniciar) → PUT ?offset= (bloques) → POST /finalizar (checksum y lote)
+@app.post("/api/facturas/cargas")
+async def iniciar_carga_reanudable(payload: dict):
+    """
+    payload: nombreArchivo, tamano, clienteId, formatoArchivo, sha256 y forzarReproceso (opcionales).
+
+    Con sha256 declarado, un archivo que el cliente ya cargó responde con el
+    lote existente (duplicado: true) sin abrir sesión ni subir nada.
+    """
+    nombre = nombre_seguro(str(payload.get('nombreArchivo') or ''))
+    try:
+        tamano = int(payload.get('tamano'))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="tamano es obligatorio (bytes)")
+    if 'clienteId' not in payload:
+        raise HTTPException(status_code=400, detail="clienteId es obligatorio")
+    forzar = bool(payload.get('forzarReproceso'))
+    sha256 = (payload.get('sha256') or '').lower() or None
+    if sha256 and not forzar:
+        cliente_seleccionado = CLIENTE_NOMBRES.get(str(payload['clienteId']), "Cliente Desconocido")
+        previo = (await run_in_threadpool(lotes_previos, cliente_seleccionado, [sha256])).get(sha256)
+        if previo:
+            duplicado = await run_in_threadpool(reutilizar_lote, previo, nombre, sha256)
+            return {"success": True, "data": {**duplicado, "sha256": sha256}}
+    try:
+        # Al finalizar el archivo pasa a staging: si hoy no cabe, mejor saberlo antes de subirlo
+        staging.verificar_cupo(tamano)
+    except StagingFullError as e:
+        raise sin_espacio(e)
+    try:
+        estado = await run_in_threadpool(
+            cargas_reanudables.iniciar, nombre, tamano, sha256,
+            clienteId=str(payload['clienteId']),
+            formatoArchivo=payload.get('formatoArchivo', 'auto_detect'),
+            forzarReproceso=forzar
+        )
+    except StagingFullError as e:
+        # Cupo de sesiones abiertas agotado (lo preasignado aún no llegó a staging)
+        raise sin_espacio(e)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    print(f"[CONSOLE LOG] Carga reanudable {estado['uploadId']} iniciada: {nombre} ({tamano} bytes)")
+    return {"success": True, "data": {**estado, "duplicado": False}}
+
+@app.get("/api/facturas/cargas/{upload_id}")
+async def estado_carga_reanudable(upload_id: str):
+    """Rangos recibidos: el cliente retoma desde siguienteOffset tras un corte"""
+    try:
+        return {"success": True, "data": cargas_reanudables.estado(upload_id)}
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.put("/api/facturas/cargas/{upload_id}")
+async def subir_bloque(upload_id: str, request: Request, offset: int = Query(..., ge=0)):
+    """Cuerpo crudo del bloque; se escribe en su posición a medida que llega (sin cargarlo entero)"""
+    try:
+        cargas_reanudables.estado(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    declarado = request.headers.get("content-length")
+    if declarado is not None and not declarado.strip().isdigit():
+        raise HTTPException(status_code=400, detail="Content-Length inválido")
+    if declarado is not None and int(declarado) > UPLOAD_MAX_CHUNK_SIZE:
+        raise HTTPException(status_code=413, detail=f"Bloque muy grande (máximo {UPLOAD_MAX_CHUNK_SIZE} bytes)")
     
-    # Crear lote en Firestore
-    print(f"[CONSOLE LOG] Creando lote en Firestore")
-    lote_data = {
-        "nombreArchivo": archivo.filename,
-        "cliente": cliente_seleccionado,
-        "formato": formato_final,
-        "estado": "Procesando",
-        "registrosTotales": 0,
-        "errores": 0,
-        "filePath": file_path
+    posicion, recibidos = offset, 0
+    buffer = bytearray()
+    try:
+        async for datos in request.stream():
+            recibidos += len(datos)
+            if recibidos > UPLOAD_MAX_CHUNK_SIZE:
+                raise HTTPException(status_code=413, detail=f"Bloque muy grande (máximo {UPLOAD_MAX_CHUNK_SIZE} bytes)")
+            buffer += datos
+            if len(buffer) >= UPLOAD_WRITE_BUFFER:
+                posicion = await run_in_threadpool(cargas_reanudables.escribir, upload_id, posicion, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            posicion = await run_in_threadpool(cargas_reanudables.escribir, upload_id, posicion, bytes(buffer))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ClientDisconnect:
+        # Lo escrito hasta el corte queda registrado; el cliente retoma con GET del estado
+        print(f"[CONSOLE LOG] Carga {upload_id}: conexión cortada en el offset {posicion}")
+    finally:
+        await run_in_threadpool(cargas_reanudables.confirmar, upload_id)
+    return {"success": True, "data": cargas_reanudables.estado(upload_id)}
+
+@app.post("/api/facturas/cargas/{upload_id}/finalizar")
+async def finalizar_carga_reanudable(upload_id: str, payload: Optional[dict] = None):
+    """Verifica el SHA-256 (payload.sha256 o el declarado al iniciar) y crea el lote (o reutiliza uno previo)"""
+    def _finalizar():
+        sesion = cargas_reanudables.estado(upload_id)
+        # Verificado el checksum, el archivo pasa directo a su ruta única de staging
+        destino = staging.nueva_ruta(sesion['nombreArchivo'])
+        meta = cargas_reanudables.finalizar(upload_id, destino, (payload or {}).get('sha256'))
+        staging.registrar(meta['path'])
+        return meta
+    
+    try:
+        meta = await run_in_threadpool(_finalizar)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    
+    cliente_seleccionado = CLIENTE_NOMBRES.get(meta['clienteId'], "Cliente Desconocido")
+    forzar = bool((payload or {}).get('forzarReproceso', meta.get('forzarReproceso')))
+    # El formato ya se detectó con el primer bloque
+    formato = meta['formatoArchivo']
+    if formato == 'auto_detect' and meta.get('formatoDetectado'):
+        formato = meta['formatoDetectado']
+    respuesta = await run_in_threadpool(
+        registrar_carga, meta['path'], meta['nombreArchivo'], meta['sha256'], cliente_seleccionado, formato, forzar
+    )
+    print(f"[CONSOLE LOG] Carga {upload_id} finalizada ({meta['tamano']} bytes): lote {respuesta['data']['loteId']}")
+    return respuesta
+
+@app.delete("/api/facturas/cargas/{upload_id}")
+async def cancelar_carga_reanudable(upload_id: str):
+    try:
+        await run_in_threadpool(cargas_reanudables.cancelar, upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return {"success": True, "message": "Carga cancelada"}
+
+def guardar_archivos_grupo(archivos: List[UploadFile]):
+    """
+    Guarda en staging los archivos de una carga múltiple.
+
+    Un .zip se desempaca entrada por entrada (zipfile lee el índice central y
+    cada archivo se copia por bloques, sin cargarlo en memoria). Devuelve
+    ([archivo guardado], [omitidos]). Si staging se llena, libera lo que ya
+    guardó de esta carga y relanza StagingFullError.
+    """
+    guardados, omitidos = [], []
+    
+    def _guardar(origen, nombre, tamano):
+        if len(guardados) >= MAX_ARCHIVOS_POR_GRUPO:
+            omitidos.append({"nombreArchivo": nombre, "motivo": "Límite de archivos por grupo"})
+            return
+        try:
+            guardados.append(staging.guardar(origen, nombre, tamano, limite=MAX_FILE_SIZE))
+        except StagedFileTooLarge as e:
+            omitidos.append({"nombreArchivo": nombre, "motivo": str(e)})
+    
+    try:
+        for archivo in archivos:
+            nombre = nombre_seguro(archivo.filename or "")
+            if not nombre.lower().endswith(".zip"):
+                _guardar(archivo.file, nombre, archivo.size)
+                continue
+            
+            try:
+                zf = zipfile.ZipFile(archivo.file)
+            except zipfile.BadZipFile:
+                omitidos.append({"nombreArchivo": nombre, "motivo": "Zip inválido"})
+                continue
+            with zf:
+                for info in zf.infolist():
+                    # nombre_seguro reduce la entrada a su nombre base (descarta rutas y '../')
+                    miembro = nombre_seguro(info.filename)
+                    base = os.path.basename(info.filename.replace("\\", "/"))
+                    if info.is_dir() or info.filename.startswith("__MACOSX/") or base.startswith("."):
+                        continue
+                    if os.path.splitext(miembro)[1].lower() not in EXTENSIONES_CARGA:
+                        omitidos.append({"nombreArchivo": miembro, "motivo": "Extensión no soportada"})
+                        continue
+                    try:
+                        # El tamaño declarado en el zip no es confiable: staging vuelve a limitar al copiar
+                        with zf.open(info) as origen:
+                            _guardar(origen, miembro, info.file_size)
+                    except (zipfile.BadZipFile, RuntimeError) as e:
+                        omitidos.append({"nombreArchivo": miembro, "motivo": str(e)})
+    except StagingFullError:
+        for guardado in guardados:
+            staging.liberar(guardado["path"])
+        raise
+    return guardados, omitidos
+
+@app.post("/api/facturas/cargar-multiple")
+async def cargar_multiples_archivos(
+    archivos: List[UploadFile] = File(...),
+    clienteId: str = Form(...),
+    formatoArchivo: str = Form("auto_detect"),
+    forzarReproceso: bool = Form(False)
+):
+    """
+    Varios archivos (o un .zip) en una solicitud: un lote por archivo dentro de un grupo de carga.
+
+    Archivos ya procesados para el cliente (o repetidos dentro de la misma
+    carga) no generan lote: el grupo enlaza el lote existente.
+    """
+    cliente_seleccionado = CLIENTE_NOMBRES.get(clienteId, "Cliente Desconocido")
+    print(f"[CONSOLE LOG] Carga múltiple: {len(archivos)} archivos de {cliente_seleccionado}")
+    
+    # Escritura a staging y desempaque fuera del event loop
+    try:
+        guardados, omitidos = await run_in_threadpool(guardar_archivos_grupo, archivos)
+    except StagingFullError as e:
+        raise sin_espacio(e)
+    if not guardados:
+        raise HTTPException(status_code=400, detail={"message": "Ningún archivo válido en la carga", "omitidos": omitidos})
+    
+    # Deduplicación, Firestore y detección de formato fuera del event loop
+    def _registrar_grupo():
+        # SHA-256 contra el índice y dentro de la misma carga
+        previos = lotes_previos(cliente_seleccionado, [g["sha256"] for g in guardados])
+        nuevos, duplicados, repetidos, primeros = [], [], [], {}
+        for guardado in guardados:
+            previo = previos.get(guardado["sha256"])
+            if previo and not forzarReproceso:
+                duplicados.append(reutilizar_lote(previo, guardado["nombre"], guardado["sha256"]))
+                staging.liberar(guardado["path"])
+            elif guardado["sha256"] in primeros:
+                repetidos.append(guardado)
+                staging.liberar(guardado["path"])
+            else:
+                primeros[guardado["sha256"]] = len(nuevos)
+                nuevos.append(guardado)
+        
+        grupo_id = firebase_service.create_grupo_carga({
+            "cliente": cliente_seleccionado,
+            "archivosRecibidos": [a.filename for a in archivos],
+            "loteIds": [],
+            "estado": "Recibiendo"
+        })
+        
+        lotes_data = []
+        for guardado in nuevos:
+            lote_data = datos_lote(guardado["path"], guardado["nombre"], cliente_seleccionado, formatoArchivo, grupo_id)
+            lote_data["sha256"] = guardado["sha256"]
+            marcar_reproceso(lote_data, previos.get(guardado["sha256"]))
+            lotes_data.append(lote_data)
+        lote_ids = firebase_service.create_lotes_bulk(lotes_data)
+        registrar_hashes(list(zip(lote_ids, lotes_data)))
+        for guardado in repetidos:
+            duplicados.append({
+                "loteId": lote_ids[primeros[guardado["sha256"]]],
+                "nombreArchivo": guardado["nombre"],
+                "estado": "En Cola",
+                "formatoDetectado": lotes_data[primeros[guardado["sha256"]]]["formato"],
+                "duplicado": True
+            })
+        ids_grupo = list(dict.fromkeys(lote_ids + [d["loteId"] for d in duplicados]))
+        firebase_service.update_grupo_carga(grupo_id, {
+            "loteIds": ids_grupo,
+            "totalArchivos": len(ids_grupo),
+            "duplicados": len(duplicados),
+            "omitidos": omitidos,
+            "estado": "En Proceso"
+        })
+        
+        # Los lotes se procesan en paralelo según JOB_WORKERS y el pool de procesos de parseo
+        for lote_id, lote_data in zip(lote_ids, lotes_data):
+            encolar_lote(lote_id, lote_data)
+        print(f"[CONSOLE LOG] Grupo {grupo_id}: {len(lote_ids)} lotes encolados, {len(duplicados)} duplicados, {len(omitidos)} omitidos")
+        
+        return {
+            "success": True,
+            "message": f"{len(lote_ids)} archivos encolados para procesamiento, {len(duplicados)} ya procesados",
+            "data": {
+                "grupoId": grupo_id,
+                "lotes": [
+                    {"loteId": lote_id, "nombreArchivo": data["nombreArchivo"], "formatoDetectado": data["formato"], "estado": "En Cola", "duplicado": False}
+                    for lote_id, data in zip(lote_ids, lotes_data)
+                ] + duplicados,
+                "omitidos": omitidos,
+                "fechaCarga": datetime.utcnow().isoformat()
+            }
+        }
+        
+    return await run_in_threadpool(_registrar_grupo)
+
+def resumen_grupo(lotes: List[dict]) -> dict:
+    """Estado agregado de los lotes de un grupo"""
+    por_estado = Counter(lote.get("estado") for lote in lotes)
+    pendientes = por_estado["En Cola"] + por_estado["Procesando"]
+    if pendientes:
+        estado = "En Proceso"
+    elif lotes and por_estado["Error"] == len(lotes):
+        estado = "Error"
+    elif por_estado["Error"] or por_estado["Completado con Advertencias"]:
+        estado = "Completado con Advertencias"
+    else:
+        estado = "Completado"
+    return {
+        "estado": estado,
+        "totalLotes": len(lotes),
+        "lotesTerminados": len(lotes) - pendientes,
+        "progreso": round((len(lotes) - pendientes) / len(lotes), 4) if lotes else None,
+        "lotesPorEstado": dict(por_estado),
+        "registrosTotales": sum(lote.get("registrosTotales") or 0 for lote in lotes),
+        "errores": sum(lote.get("errores") or 0 for lote in lotes)
     }
+
+@app.get("/api/facturas/grupos/{grupo_id}")
+async def obtener_grupo(grupo_id: str):
+    grupo = firebase_service.get_grupo_carga(grupo_id)
+    if not grupo:
+        raise HTTPException(status_code=404, detail="Grupo no encontrado")
     
-    lote_id = firebase_service.create_lote(lote_data)
-    print(f"[CONSOLE LOG] Lote creado con ID: {lote_id}")
-    firebase_service.add_log(lote_id, f"Archivo recibido. Tipo: {formato_final}. Cliente: {cliente_seleccionado}")
+    lotes = firebase_service.get_lotes_by_ids(grupo.get("loteIds", []))
+    return {
+        "success": True,
+        "data": {
+            "grupoId": grupo_id,
+            "cliente": grupo.get("cliente"),
+            "fechaCarga": grupo.get("fechaCarga"),
+            "omitidos": grupo.get("omitidos", []),
+            **resumen_grupo(lotes),
+            "lotes": [
+                {
+                    "loteId": lote["id"],
+                    "nombreArchivo": lote.get("nombreArchivo"),
+                    "estado": lote.get("estado"),
+                    "registrosTotales": lote.get("registrosTotales", 0),
+                    "errores": lote.get("errores", 0),
+                    "procesamiento": job_queue.get_job(lote["id"])
+                }
+                for lote in lotes
+            ]
+        }
+    }
+
+def procesar_lote(lote_id: str, file_path: str, formato_final: str, filename: str,
+                  cliente: Optional[str] = None):
+    """Pipeline de un lote: parseo en el pool de procesos y escritura de resultados en Firestore"""
+    print(f"[CONSOLE LOG] ==== INICIO PROCESAMIENTO LOTE {lote_id} ====")
+    firebase_service.update_lote(lote_id, {"estado": "Procesando"})
     
     # Procesar archivo según tipo
     try:
         print(f"[CONSOLE LOG] Iniciando procesamiento del archivo")
-        resultado_procesamiento = process_file_by_type(file_path, formato_final, archivo.filename)
+        # Una sola lectura en el pool de procesos: estructura, validación por filas y registros normalizados
+        registros_path = os.path.join(REGISTROS_DIR, f"{lote_id}.csv")
+        # Correcciones aprendidas del cliente: se aplican a los registros antes de validarlos
+        reemplazos = homologation_memory.reemplazos(cliente) if cliente else None
+        procesado = job_queue.run_in_process(procesar_archivo, file_path, formato_final, filename, registros_path, reemplazos)
+        resultado_procesamiento = procesado["resultado"]
+        if cliente:
+            homologacion = procesado["homologacion"]
+            homologation_memory.registrar_consultas(cliente, homologacion["hits"], homologacion["misses"])
+            if homologacion["corregidas"]:
+                firebase_service.add_log(lote_id, f"{homologacion['corregidas']} valores corregidos con homologaciones previas de {cliente}", buffered=True)
         print(f"[CONSOLE LOG] Resultado procesamiento: {resultado_procesamiento}")
         
         if resultado_procesamiento["success"]:
             registros_totales = resultado_procesamiento["registros"]
             print(f"[CONSOLE LOG] Procesamiento exitoso. Registros: {registros_totales}")
             
-            # Simular errores realistas basados en las reglas de negocio
+            # Validación por columnas (NIT/DV, IVA, fecha, numéricos, total), hecha durante la lectura
             errores_count = 0
-            errores_simulados = []
-            
             if registros_totales > 0:
-                # Simulación más inteligente de errores
-                import random
-                random.seed(42)  # Para reproducibilidad en testing
+                tabla_errores = procesado["errores"]
                 
-                # Calcular número de errores (entre 3% y 7% para ser realista)
-                error_rate = random.uniform(0.03, 0.07)
-                num_errores = max(1, int(registros_totales * error_rate))
-                print(f"[CONSOLE LOG] Simulando {num_errores} errores ({error_rate:.1%} de {registros_totales} registros)")
+                # NIT con homologación sin valor de reemplazo: el revisor los aceptó, no generan error ni excepción
+                if cliente and not tabla_errores.empty:
+                    es_nit = tabla_errores['campo'].isin(['NIT_VENDEDOR', 'NIT_COMPRADOR'])
+                    conocidos = homologation_memory.buscar_muchos(cliente, 'nit', tabla_errores.loc[es_nit, 'valor'].unique())
+                    if conocidos:
+                        resueltos = es_nit & tabla_errores['valor'].isin(list(conocidos))
+                        tabla_errores = tabla_errores[~resueltos]
+                        firebase_service.add_log(lote_id, f"{int(resueltos.sum())} errores de NIT resueltos con homologaciones previas de {cliente}", buffered=True)
                 
-                # Generar filas con errores (distribuidas aleatoriamente)
-                filas_con_error = random.sample(range(1, registros_totales + 1), min(num_errores, registros_totales))
+                errores_count = len(tabla_errores)
+                print(f"[CONSOLE LOG] Validación: {errores_count} errores {resumen_errores(tabla_errores)}")
                 
-                for idx, fila in enumerate(filas_con_error):
-                    # Tipos de errores basados en las reglas de negocio
-                    error_types = [
-                        {
-                            "campo": "PRODUCTO",
-                            "mensaje": f"Fila {fila}: Producto '{generate_product_name()}' no encontrado en catálogo BMC",
-                            "severidad": "WARNING",
-                            "create_exception": False
-                        },
-                        {
-                            "campo": "NIT_COMPRADOR",
-                            "mensaje": f"Fila {fila}: NIT comprador no encontrado en DIAN",
-                            "severidad": "ERROR",
-                            "create_exception": True
-                        },
-                        {
-                            "campo": "CANTIDAD",
-                            "mensaje": f"Fila {fila}: Cantidad no especificada en kilos/litros. Requiere conversión manual",
-                            "severidad": "WARNING",
-                            "create_exception": False
-                        },
-                        {
-                            "campo": "% IVA PRODUCTO",
-                            "mensaje": f"Fila {fila}: IVA debe ser número entero (0, 19, 5). Valor actual inválido",
-                            "severidad": "ERROR",
-                            "create_exception": False
-                        },
-                        {
-                            "campo": "FECHA",
-                            "mensaje": f"Fila {fila}: Fecha debe estar en formato DD/MM/AAAA",
-                            "severidad": "WARNING",
-                            "create_exception": False
-                        },
-                        {
-                            "campo": "NIT_VENDEDOR",
-                            "mensaje": f"Fila {fila}: NIT vendedor no encontrado en DIAN",
-                            "severidad": "ERROR",
-                            "create_exception": True
-                        }
-                    ]
-                    
-                    # Seleccionar tipo de error de manera balanceada
-                    error_tipo = error_types[idx % len(error_types)]
-                    
-                    print(f"[CONSOLE LOG] Error simulado - Fila {fila}: {error_tipo['campo']} - {error_tipo['severidad']}")
-                    
-                    # Agregar error
-                    firebase_service.add_error(
-                        lote_id,
-                        fila,
-                        error_tipo["campo"],
-                        error_tipo["mensaje"],
-                        error_tipo["severidad"]
-                    )
-                    
-                    errores_count += 1
-                    
-                    # Crear excepción DIAN si es necesario
-                    if error_tipo["create_exception"]:
-                        nit_type = "vendedor" if "VENDEDOR" in error_tipo["campo"] else "comprador"
-                        excepcion_data = {
-                            "loteId": lote_id,
-                            "filaOrigen": fila,
-                            "documento": f"{random.randint(800000000, 999999999)}-{random.randint(1,9)}",
-                            "nombreReportado": f"Empresa {fila} SAS",
-                            "estadoValidacion": random.choice(["No_Encontrado", "Inconsistente"]),
-                            "estadoGestion": "Pendiente",
-                            "notas": f"Error en validación de NIT {nit_type}",
-                            "tipoTercero": nit_type
-                        }
-                        firebase_service.create_excepcion_dian(excepcion_data)
-                        print(f"[CONSOLE LOG] Excepción DIAN creada para fila {fila}")
+                if errores_count > VALIDATION_MAX_STORED_ERRORS:
+                    firebase_service.add_log(lote_id, f"Se encontraron {errores_count} errores; se guardan los primeros {VALIDATION_MAX_STORED_ERRORS}", "WARNING", buffered=True)
+                    tabla_errores = tabla_errores.head(VALIDATION_MAX_STORED_ERRORS)
+                
+                errores = documentos_error(tabla_errores)
+                excepciones_pendientes = documentos_excepcion(tabla_errores, lote_id, cliente)
+                
+                # Escrituras agrupadas en WriteBatch (máximo 500 operaciones por commit)
+                firebase_service.add_errors_bulk(lote_id, errores)
+                firebase_service.create_excepciones_bulk(excepciones_pendientes)
+                print(f"[CONSOLE LOG] {len(errores)} errores y {len(excepciones_pendientes)} excepciones DIAN guardados")
+                
+                # Registros normalizados para las descargas (el archivo original se elimina al terminar)
+                firebase_service.update_lote(lote_id, {"registrosPath": registros_path, "registrosVersion": procesado["registrosVersion"]})
+                print(f"[CONSOLE LOG] {procesado['guardados']} registros normalizados guardados en {registros_path}")
             
             # Determinar estado final
             if errores_count == 0:
@@ -659,8 +625,10 @@ async def cargar_archivo(
             errores_count = len(resultado_procesamiento["errores"])
             estado = "Error"
             
-            for error in resultado_procesamiento["errores"]:
-                firebase_service.add_error(lote_id, 0, "ARCHIVO", error, "ERROR")
+            firebase_service.add_errors_bulk(lote_id, [
+                {"fila": 0, "campo": "ARCHIVO", "mensaje": error, "severidad": "ERROR"}
+                for error in resultado_procesamiento["errores"]
+            ])
         
         # Actualizar lote con resultados del procesamiento
         print(f"[CONSOLE LOG] Actualizando lote en Firestore")
@@ -671,66 +639,209 @@ async def cargar_archivo(
             "tipoArchivoDetectado": resultado_procesamiento.get("tipo", formato_final)
         })
         
-        firebase_service.add_log(lote_id, f"Procesamiento completado. Estado: {estado}. Registros: {registros_totales}. Errores: {errores_count}")
+        firebase_service.add_log(lote_id, f"Procesamiento completado. Estado: {estado}. Registros: {registros_totales}. Errores: {errores_count}", buffered=True)
         
     except Exception as e:
         print(f"[CONSOLE LOG] EXCEPCIÓN en procesamiento: {str(e)}")
         firebase_service.update_lote(lote_id, {"estado": "Error", "errores": 1})
-        firebase_service.add_log(lote_id, f"Error en procesamiento: {str(e)}", "ERROR")
-        estado = "Error"
-        registros_totales = 0
-        errores_count = 1
+        firebase_service.add_log(lote_id, f"Error en procesamiento: {str(e)}", "ERROR", buffered=True)
+    finally:
+        firebase_service.flush_logs(lote_id)
     
-    # Limpiar archivo temporal
+    # Liberar el archivo de staging (y su cupo)
     try:
-        os.remove(file_path)
+        staging.liberar(file_path)
         print(f"[CONSOLE LOG] Archivo temporal eliminado")
     except Exception as e:
         print(f"[CONSOLE LOG] WARNING: No se pudo eliminar archivo temporal: {e}")
     
-    print(f"[CONSOLE LOG] ==== FIN CARGA ARCHIVO ====")
+    print(f"[CONSOLE LOG] ==== FIN PROCESAMIENTO LOTE {lote_id} ====")
+
+job_queue = JobQueue(procesar_lote, workers=JOB_WORKERS, process_workers=PARSE_PROCESSES)
+homologation_memory = HomologationMemory(firebase_service, recarga_segundos=HOMOLOGACION_RECARGA_SEGUNDOS)
+artifact_store = ArtifactStore(EXPORTS_DIR, max_bytes=ARTIFACT_STORE_MAX_BYTES)
+cargas_reanudables = ResumableUploadManager(
+    UPLOAD_SESSIONS_DIR,
+    max_bytes=MAX_UPLOAD_SIZE,
+    max_chunk_bytes=UPLOAD_MAX_CHUNK_SIZE,
+    ttl_segundos=UPLOAD_SESSION_TTL_HOURS * 3600,
+    max_reservados=UPLOAD_SESSIONS_MAX_BYTES,
+    max_sesiones=UPLOAD_MAX_SESSIONS,
+    retry_after=STAGING_RETRY_AFTER_SECONDS
+)
+UPLOAD_WRITE_BUFFER = 1024 * 1024  # El cuerpo de cada PUT se escribe a disco de a 1MB
+staging = StagingArea(
+    STAGING_DIR,
+    max_bytes=STAGING_MAX_BYTES,
+    retry_after=STAGING_RETRY_AFTER_SECONDS,
+    huerfanos_segundos=STAGING_ORPHAN_HOURS * 3600
+)
+
+def rutas_en_proceso() -> List[str]:
+    """Archivos de staging que pertenecen a trabajos en cola o en proceso"""
+    return [payload["file_path"] for payload in job_queue.payloads_activos()]
+
+ESTADOS_PENDIENTES = ["En Cola", "Procesando"]
+
+def recuperar_lotes_huerfanos(reencolar: bool) -> dict:
+    """
+    Lotes 'En Cola'/'Procesando' sin trabajo en esta instancia (la cola vive
+    en memoria y se pierde al reiniciar).
+
+    Con reencolar=True (solo al arrancar, antes de aceptar cargas y antes del
+    primer pase del janitor) los que aún tienen su archivo en staging vuelven
+    a la cola. Los que no tienen archivo pasan a Error cuando llevan más de
+    JOB_HUERFANO_MINUTOS sin cambios: antes pueden pertenecer a otra instancia.
+    """
+    activos = {payload["lote_id"] for payload in job_queue.payloads_activos()}
+    limite = datetime.now(timezone.utc) - timedelta(minutes=JOB_HUERFANO_MINUTOS)
+    reencolados = fallidos = 0
+    for lote in firebase_service.get_lotes_by_estados(ESTADOS_PENDIENTES):
+        if lote["id"] in activos:
+            continue
+        path = lote.get("filePath")
+        if reencolar and path and staging.contiene(path) and os.path.exists(path):
+            encolar_lote(lote["id"], lote, "Lote reencolado tras reiniciar el servidor")
+            reencolados += 1
+            continue
+        fecha = lote.get("fechaUltimaActualizacion") or lote.get("fechaCarga")
+        if fecha is not None and fecha.tzinfo is None:
+            fecha = fecha.replace(tzinfo=timezone.utc)
+        if fecha is None or fecha < limite:
+            firebase_service.update_lote(lote["id"], {"estado": "Error", "errores": 1})
+            firebase_service.add_log(lote["id"], "El procesamiento se interrumpió y el archivo ya no está disponible: cárguelo de nuevo", "ERROR", buffered=True)
+            firebase_service.flush_logs(lote["id"])
+            fallidos += 1
+    if reencolados or fallidos:
+        print(f"[CONSOLE LOG] Lotes huérfanos: {reencolados} reencolados, {fallidos} marcados Error")
+    return {"reencolados": reencolados, "fallidos": fallidos}
+
+def iniciar_vigilancia_huerfanos(intervalo_segundos: float) -> threading.Event:
+    """Marca Error periódicamente los lotes pendientes que ninguna instancia procesa; set() la detiene"""
+    detener = threading.Event()
+    
+    def _loop():
+        while not detener.wait(intervalo_segundos):
+            try:
+                recuperar_lotes_huerfanos(reencolar=False)
+            except Exception as e:
+                print(f"[CONSOLE LOG] ERROR revisando lotes huérfanos: {e}")
+    
+    threading.Thread(target=_loop, name="lotes-huerfanos", daemon=True).start()
+    return detener
+
+def iniciar_reconciliacion_estadisticas(intervalo_segundos: float) -> threading.Event:
+    """Recalcula los contadores de 'estadisticas' cada intervalo (corrige incrementos perdidos); set() lo detiene"""
+    detener = threading.Event()
+    
+    def _loop():
+        # Primer arranque con datos previos: el documento aún no existe
+        primera = not firebase_service.get_estadisticas()
+        while primera or not detener.wait(intervalo_segundos):
+            primera = False
+            try:
+                resultado = firebase_service.reconcile_estadisticas()
+                if resultado["correcciones"]:
+                    print(f"[CONSOLE LOG] Estadísticas: {resultado['correcciones']} contadores corregidos")
+            except Exception as e:
+                print(f"[CONSOLE LOG] ERROR en reconciliación de estadísticas: {e}")
+    
+    threading.Thread(target=_loop, name="reconciliacion-estadisticas", daemon=True).start()
+    return detener
+
+@app.on_event("startup")
+async def iniciar_cola():
+    job_queue.start()
+    eliminadas = await run_in_threadpool(cargas_reanudables.limpiar_expiradas)
+    if eliminadas:
+        print(f"[CONSOLE LOG] {eliminadas} cargas reanudables expiradas eliminadas")
+    # Lotes que el proceso anterior dejó pendientes: se reencolan antes de que el janitor vea sus archivos
+    try:
+        await run_in_threadpool(recuperar_lotes_huerfanos, True)
+    except Exception as e:
+        print(f"[CONSOLE LOG] ERROR recuperando lotes pendientes: {e}")
+    app.state.detener_huerfanos = iniciar_vigilancia_huerfanos(JOB_HUERFANO_MINUTOS * 60)
+    # Tras una caída los archivos de staging quedan sin trabajo: el janitor los recoge
+    app.state.detener_janitor = staging.iniciar_janitor(rutas_en_proceso, STAGING_JANITOR_MINUTES * 60)
+    app.state.detener_reconciliacion = iniciar_reconciliacion_estadisticas(ESTADISTICAS_RECONCILIACION_MINUTOS * 60)
+
+@app.on_event("shutdown")
+async def detener_cola():
+    job_queue.shutdown(wait=False)
+    app.state.detener_janitor.set()
+    app.state.detener_huerfanos.set()
+    app.state.detener_reconciliacion.set()
+
+@app.get("/api/facturas/cola")
+async def estado_cola():
+    """Métricas de la cola de procesamiento (profundidad, workers, tiempos por trabajo)"""
+    return {
+        "success": True,
+        "data": job_queue.stats()
+    }
+
+@app.get("/api/estadisticas")
+async def obtener_estadisticas():
+    """Dashboard: contadores materializados en un solo documento (una lectura, sin recorrer colecciones)"""
+    stats = firebase_service.get_estadisticas()
+    lotes_por_fecha = stats.get("lotesPorFecha") or {}
+    fecha_reconciliacion = stats.get("fechaReconciliacion")
     return {
         "success": True,
-        "message": "Archivo recibido y procesado",
         "data": {
-            "loteId": lote_id,
-            "nombreArchivo": archivo.filename,
-            "estado": estado,
-            "fechaCarga": datetime.utcnow().isoformat(),
-            "registrosEstimados": registros_totales,
-            "erroresEncontrados": errores_count,
-            "formatoDetectado": resultado_procesamiento.get("tipo", formato_final) if 'resultado_procesamiento' in locals() else formato_final
+            "lotesPorEstado": {k: v for k, v in (stats.get("lotesPorEstado") or {}).items() if v},
+            "lotesHoy": lotes_por_fecha.get(datetime.utcnow().strftime("%Y-%m-%d"), 0),
+            "lotesPorFecha": dict(sorted((k, v) for k, v in lotes_por_fecha.items() if v)),
+            "excepcionesPorEstado": {k: v for k, v in (stats.get("excepcionesPorEstado") or {}).items() if v},
+            "registrosProcesados": stats.get("registrosProcesados", 0),
+            "erroresDetectados": stats.get("erroresDetectados", 0),
+            "fechaReconciliacion": fecha_reconciliacion.isoformat() if fecha_reconciliacion else None
         }
     }
 
-# Función auxiliar para generar nombres de productos realistas
-def generate_product_name():
-    productos = [
-        "LECHUGA ROMANA", "PAPA CRIOLLA", "AREPA BLANCA", "QUESO MOZARELLA",
-        "TOMATE CHONTO", "CEBOLLA CABEZONA", "ZANAHORIA", "CILANTRO",
-        "BANANO BOCADILLO", "MANGO TOMMY", "AGUACATE HASS", "LIMÓN TAHITÍ"
-    ]
-    import random
-    return random.choice(productos)
+@app.post("/api/estadisticas/reconciliar")
+async def reconciliar_estadisticas():
+    """Recuenta lotes y excepciones y corrige la deriva de los contadores"""
+    resultado = await run_in_threadpool(firebase_service.reconcile_estadisticas)
+    return {"success": True, "data": resultado}
+
+@app.get("/api/metricas/cache")
+async def metricas_cache():
+    """Contadores hit/miss de la caché local de lecturas a Firestore"""
+    return {
+        "success": True,
+        "data": firebase_service.cache_stats()
+    }
+
+@app.get("/api/metricas/staging")
+async def metricas_staging():
+    """Ocupación del cupo de staging, rechazos por cupo y huérfanos eliminados"""
+    return {
+        "success": True,
+        "data": staging.stats()
+    }
+
+@app.get("/api/metricas/artefactos")
+async def metricas_artefactos():
+    """Ocupación y hit rate del almacén de plantillas generadas"""
+    return {
+        "success": True,
+        "data": artifact_store.stats()
+    }
 
 # Resto de endpoints sin cambios...
 @app.get("/api/facturas/lotes")
 async def obtener_lotes(
-    page: int = 1,
-    limit: int = 20,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
     estado: Optional[str] = None
 ):
-    # Get lotes from Firestore
-    lotes = firebase_service.get_lotes(limit=limit * page)  # Simple pagination
-    
-    # Filter by estado if provided
-    if estado:
-        lotes = [l for l in lotes if l.get("estado") == estado]
-    
-    # Simple pagination (can be improved with cursor-based pagination)
-    start = (page - 1) * limit
-    end = start + limit
-    lotes_pagina = lotes[start:end]
+    # Paginación por cursor (fechaCarga + id) con el filtro de estado resuelto en Firestore
+    try:
+        lotes_pagina, next_cursor = firebase_service.get_lotes(limit=limit, cursor=cursor, estado=estado)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+    total_registros = firebase_service.count_lotes(estado=estado)
     
     # Convert Firestore timestamps to ISO format
     for lote in lotes_pagina:
@@ -744,9 +855,10 @@ async def obtener_lotes(
         "data": {
             "lotes": lotes_pagina,
             "paginacion": {
-                "paginaActual": page,
-                "totalPaginas": (len(lotes) + limit - 1) // limit,
-                "totalRegistros": len(lotes),
+                "nextCursor": next_cursor,
+                "hayMas": next_cursor is not None,
+                "totalPaginas": (total_registros + limit - 1) // limit,
+                "totalRegistros": total_registros,
                 "registrosPorPagina": limit
             }
         }
@@ -796,67 +908,90 @@ async def obtener_detalle_lote(lote_id: str):
             "logs": logs,
             "errores": errores,
             "erroresPorTipo": errores_por_tipo,
+            "procesamiento": job_queue.get_job(lote_id),
             "puedeDescargar": lote.get("estado") in ["Completado", "Completado con Advertencias"]
         }
     }
 
+def etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (admite lista y '*')"""
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip().removeprefix("W/") for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in etiquetas
+
+def cabeceras_artefacto(etag: str) -> dict:
+    # no-cache: el navegador guarda la copia pero revalida con If-None-Match en cada descarga
+    return {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, no-cache"}
+
+def respuesta_artefacto(request: Request, archivo: BinaryIO, etag: str, filename: str, media_type: str):
+    """
+    Archivo inmutable con ETag; 206 para descargas por rangos (reanudables).
+
+    Se transmite desde el archivo ya abierto por el almacén: si el desalojo LRU
+    lo borra durante la descarga, el descriptor sigue siendo válido.
+    """
+    headers = {**cabeceras_artefacto(etag), "Content-Disposition": f'attachment; filename="{filename}"'}
+    size = os.fstat(archivo.fileno()).st_size
+    inicio, fin, status_code = 0, size - 1, 200
+    rango = request.headers.get("range")
+    # If-Range con otro ETag: el cliente tiene una versión anterior, se envía completo
+    if rango and request.headers.get("if-range", etag) == etag:
+        try:
+            limites = parse_range(rango, size)
+        except ValueError:
+            archivo.close()
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if limites is not None:
+            inicio, fin = limites
+            status_code = 206
+            headers["Content-Range"] = f"bytes {inicio}-{fin}/{size}"
+    
+    # Por bloques, sin cargar el archivo en memoria
+    return StreamingResponse(
+        iter_rango(archivo, inicio, fin),
+        status_code=status_code,
+        media_type=media_type,
+        headers={**headers, "Content-Length": str(fin - inicio + 1)}
+    )
+
 @app.get("/api/facturas/lotes/{lote_id}/descargar")
-async def descargar_plantilla(lote_id: str):
+async def descargar_plantilla(
+    lote_id: str,
+    request: Request,
+    formato: str = Query("xlsx", alias="format", description="xlsx | csv | jsonl | parquet")
+):
+    formato = formato.lower()
+    if formato not in FORMATOS_EXPORTACION:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}. Opciones: {', '.join(FORMATOS_EXPORTACION)}")
+    if formato not in formatos_disponibles():
+        raise HTTPException(status_code=501, detail=f"El formato {formato} no está disponible en este servidor")
+    
     lote = firebase_service.get_lote_by_id(lote_id)
     if not lote or lote.get("estado") not in ["Completado", "Completado con Advertencias"]:
         raise HTTPException(status_code=404, detail="Plantilla no disponible")
     
-    # Generate Excel file based on PLANTILLA51_SIMONA structure
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Plantilla Comiagro"
-    
-    # Headers based on PLANTILLA51_SIMONA
-    headers = [
-        "NOMBRE USUARIO (CLIENTE DEL CLIENTE)",
-        "NIT USUARIO (CLIENTE DEL CLIENTE)", 
-        "CIUDAD DE ENTREGA DEL PRODUCTO",
-        "FACT NRO",
-        "FECHA",
-        "FORMA DE PAGO",
-        "PRODUCTO",
-        "PRESENTACION",
-        "CANTIDAD",
-        "VALOR UNITARIO",
-        "TOTAL",
-        "% IVA PRODUCTO"
-    ]
+    registros_path = lote.get("registrosPath")
+    if not registros_path or not os.path.exists(registros_path):
+        raise HTTPException(status_code=404, detail="Los registros del lote ya no están disponibles")
     
-    # Add headers
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header)
-    
-    # Add sample data based on the lote
-    registros = lote.get('registrosTotales', 1)
-    for row in range(2, min(registros + 2, 10)):  # Máximo 8 filas de ejemplo
-        ws.cell(row=row, column=1, value=f"Cliente {row-1} SAS")
-        ws.cell(row=row, column=2, value=f"9012345{row-1:02d}")
-        ws.cell(row=row, column=3, value="Bogotá")
-        ws.cell(row=row, column=4, value=f"F-{row-1:04d}")
-        ws.cell(row=row, column=5, value=datetime.now().strftime("%Y-%m-%d"))
-        ws.cell(row=row, column=6, value="CREDITO")
-        ws.cell(row=row, column=7, value=f"PRODUCTO_{row-1}")
-        ws.cell(row=row, column=8, value="KG")
-        ws.cell(row=row, column=9, value=10)
-        ws.cell(row=row, column=10, value=25000)
-        ws.cell(row=row, column=11, value=250000)
-        ws.cell(row=row, column=12, value=19)
-    
-    # Save to temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-        wb.save(tmp.name)
-        temp_path = tmp.name
-    
-    return FileResponse(
-        temp_path,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename=f"plantilla_comiagro_lote_{lote_id}.xlsx"
-    )
+    # Clave por contenido: lote + versión de los registros + versión del formato de la plantilla
+    version_datos = lote.get("registrosVersion") or version_por_stat(registros_path)
+    version = hashlib.sha256(f"{version_datos}|{PLANTILLA_FORMATO_VERSION}".encode()).hexdigest()
+    nombre = ArtifactStore.clave("plantilla_comiagro", lote_id, version, formato)
+    etag = ArtifactStore.etag(nombre)
+    # Revalidación sin tocar disco ni generar nada
+    if etag_coincide(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cabeceras_artefacto(etag))
+    
+    def generar(destino):
+        filas = job_queue.run_in_process(generar_exportacion, registros_path, destino, formato)
+        print(f"[CONSOLE LOG] Plantilla {formato} del lote {lote_id} generada: {filas} filas")
+    
+    # Todos los formatos salen del mismo iterador de registros; se generan una vez
+    # (memoria constante, en el pool de procesos) y se sirven desde el almacén
+    archivo = await run_in_threadpool(artifact_store.abrir_o_generar, nombre, generar)
+    return respuesta_artefacto(request, archivo, etag, f"plantilla_comiagro_lote_{lote_id}.{formato}", FORMATOS_EXPORTACION[formato])
 
 @app.get("/api/terceros/excepciones")
 async def obtener_excepciones(
@@ -895,34 +1030,21 @@ async def obtener_excepciones(
         }
     }
 
-@app.post("/api/terceros/excepciones/{excepcion_id}/{action}")
-async def actualizar_estado_tercero(
-    excepcion_id: str,
-    action: str,
-    payload: Optional[dict] = None
-):
-    # Get excepcion from Firestore
-    excepciones = firebase_service.get_excepciones_dian()
-    excepcion = next((e for e in excepciones if e.get('id') == excepcion_id), None)
-    
-    if not excepcion:
-        raise HTTPException(status_code=404, detail="Excepción no encontrada")
-    
-    estado_anterior = excepcion.get('estadoValidacion')
-    
-    # Mapear acciones a estados
-    accion_map = {
-        "corregir": "Corregida",
-        "crear": "En_Creacion_Manual",
-        "ignorar": "Ignorada",
-        "reintentar": "Reintentando"
-    }
-    
-    if action not in accion_map:
+# Mapear acciones a estados
+ACCIONES_EXCEPCION = {
+    "corregir": "Corregida",
+    "crear": "En_Creacion_Manual",
+    "ignorar": "Ignorada",
+    "reintentar": "Reintentando"
+}
+
+def construir_actualizacion_excepcion(action: str, payload: Optional[dict]) -> dict:
+    """Valida la acción y arma los campos a actualizar en la excepción"""
+    if action not in ACCIONES_EXCEPCION:
         raise HTTPException(status_code=400, detail="Acción no válida")
     
     updates = {
-        "estadoGestion": accion_map[action]
+        "estadoGestion": ACCIONES_EXCEPCION[action]
     }
     
     if payload:
@@ -931,12 +1053,109 @@ async def actualizar_estado_tercero(
         if 'datosCorreccion' in payload:
             updates['datosCorreccion'] = payload['datosCorreccion']
     
-    # Update in Firestore
-    success = firebase_service.update_excepcion_dian(excepcion_id, updates)
+    return updates
+
+def aprender_correcciones(action: str, payload: Optional[dict], resultados: dict) -> int:
+    """Guarda en la memoria de homologación los NIT corregidos con datosCorreccion"""
+    correccion = (payload or {}).get('datosCorreccion')
+    if action != "corregir" or not isinstance(correccion, dict) or not correccion:
+        return 0
+    
+    entradas = []
+    for excepcion_id, resultado in resultados.items():
+        previa = resultado["previous"]
+        if resultado["status"] != "updated" or not previa.get('documento'):
+            continue
+        # Excepciones anteriores a la memoria no guardan el cliente: se toma del lote
+        cliente = previa.get('cliente') or (firebase_service.get_lote_by_id(previa.get('loteId', '')) or {}).get('cliente')
+        if cliente:
+            entradas.append({
+                "cliente": cliente,
+                "tipo": "nit",
+                "valorOriginal": previa['documento'],
+                "correccion": correccion,
+                "excepcionId": excepcion_id
+            })
+    try:
+        return homologation_memory.aprender_muchos(entradas)
+    except Exception as e:
+        # La excepción ya quedó actualizada; la memoria es un atajo para próximos lotes
+        print(f"[CONSOLE LOG] ERROR guardando homologaciones: {e}")
+        return 0
+
+@app.post("/api/terceros/excepciones/bulk/{action}")
+async def actualizar_estado_terceros_bulk(
+    action: str,
+    payload: dict
+):
+    """Aplica la misma acción a varias excepciones en transacciones (payload: ids, notas, datosCorreccion)"""
+    ids = payload.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise HTTPException(status_code=400, detail="ids debe ser una lista con al menos un id de excepción")
+    if len(ids) > MAX_EXCEPCIONES_BULK:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_EXCEPCIONES_BULK} excepciones por solicitud")
+    # Ids de documento de Firestore: texto no vacío y sin '/'
+    if not all(isinstance(i, str) and i.strip() and '/' not in i for i in ids):
+        raise HTTPException(status_code=400, detail="Cada id de excepción debe ser un texto no vacío")
     
-    if not success:
+    updates = construir_actualizacion_excepcion(action, payload)
+    resultados = firebase_service.update_excepciones_transactional(
+        ids, updates, payload.get('estadoGestionEsperado')
+    )
+    
+    detalle = [
+        {
+            "excepcionId": excepcion_id,
+            "resultado": resultado["status"],
+            "estadoAnterior": (resultado["previous"] or {}).get('estadoValidacion')
+        }
+        for excepcion_id, resultado in resultados.items()
+    ]
+    actualizadas = sum(1 for r in resultados.values() if r["status"] == "updated")
+    homologaciones = aprender_correcciones(action, payload, resultados)
+    
+    return {
+        "success": True,
+        "message": f"{actualizadas} de {len(resultados)} excepciones actualizadas: {action}",
+        "data": {
+            "accionAplicada": action,
+            "estadoNuevo": ACCIONES_EXCEPCION[action],
+            "actualizadas": actualizadas,
+            "homologacionesAprendidas": homologaciones,
+            "resultados": detalle,
+            "fechaActualizacion": datetime.utcnow().isoformat()
+        }
+    }
+
+@app.post("/api/terceros/excepciones/{excepcion_id}/{action}")
+async def actualizar_estado_tercero(
+    excepcion_id: str,
+    action: str,
+    payload: Optional[dict] = None
+):
+    updates = construir_actualizacion_excepcion(action, payload)
+    
+    # Lectura directa del documento + escritura en una transacción
+    expected = payload.get('estadoGestionEsperado') if payload else None
+    try:
+        resultado = firebase_service.update_excepciones_transactional(
+            [excepcion_id], updates, expected
+        )[excepcion_id]
+    except Exception as e:
+        print(f"[CONSOLE LOG] ERROR actualizando excepción {excepcion_id}: {e}")
         raise HTTPException(status_code=500, detail="Error al actualizar excepción")
     
+    if resultado["status"] == "not_found":
+        raise HTTPException(status_code=404, detail="Excepción no encontrada")
+    if resultado["status"] == "conflict":
+        raise HTTPException(
+            status_code=409,
+            detail=f"La excepción fue modificada por otro usuario (estado actual: {resultado['previous'].get('estadoGestion')})"
+        )
+    
+    estado_anterior = resultado["previous"].get('estadoValidacion')
+    homologaciones = aprender_correcciones(action, payload, {excepcion_id: resultado})
+    
     return {
         "success": True,
         "message": f"Excepción actualizada: {action}",
@@ -944,11 +1163,49 @@ async def actualizar_estado_tercero(
             "excepcionId": excepcion_id,
             "accionAplicada": action,
             "estadoAnterior": estado_anterior,
-            "estadoNuevo": accion_map[action],
+            "estadoNuevo": ACCIONES_EXCEPCION[action],
+            "homologacionAprendida": homologaciones > 0,
             "fechaActualizacion": datetime.utcnow().isoformat()
         }
     }
 
+@app.get("/api/homologaciones/exportar")
+async def exportar_homologaciones(cliente: Optional[str] = None):
+    """Mapeos aprendidos (todos o de un cliente) en el formato que acepta /importar"""
+    mapeos = homologation_memory.exportar(cliente)
+    return {
+        "success": True,
+        "data": {
+            "cliente": cliente,
+            "total": len(mapeos),
+            "mapeos": mapeos
+        }
+    }
+
+@app.post("/api/homologaciones/importar")
+async def importar_homologaciones(payload: dict):
+    """Carga mapeos exportados (payload: {mapeos: [...]})"""
+    mapeos = payload.get('mapeos') or []
+    if not mapeos:
+        raise HTTPException(status_code=400, detail="Debe indicar al menos un mapeo")
+    try:
+        importados = homologation_memory.importar(mapeos)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "message": f"{importados} mapeos importados",
+        "data": {"importados": importados}
+    }
+
+@app.get("/api/metricas/homologacion")
+async def metricas_homologacion():
+    """Hit rate de la memoria de homologación por cliente"""
+    return {
+        "success": True,
+        "data": homologation_memory.stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8080))
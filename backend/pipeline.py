@@ -0,0 +1,117 @@
+# backend/pipeline.py
+"""
+Procesamiento de un lote en una sola lectura del archivo.
+
+process_file_by_type recorre el archivo una vez (estructura y conteo) y
+entrega cada bloque de registros a la validación por filas y al escritor de
+registros normalizados, en el mismo recorrido: el archivo original no se
+vuelve a parsear para validar ni para preparar las descargas. Antes de eso,
+cada bloque recibe las correcciones aprendidas del cliente (homologation.py).
+
+Igual que file_processors, no depende de FastAPI ni de Firebase para poder
+ejecutarse en el pool de procesos.
+"""
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from artifact_store import hash_archivo
+from exports import escritor_registros_normalizados
+from file_processors import detect_file_format_by_content, process_file_by_type
+from homologation import normalizar_valor
+from validation import resolver_columnas, tabla_vacia, validar_registros
+
+
+def columnas_homologables(columnas_archivo, columnas: Dict[str, str]) -> Dict[str, List[str]]:
+    """Columnas del archivo a las que se aplica cada tipo de homologación"""
+    producto = next((c for c in columnas_archivo if str(c).strip().upper() == 'PRODUCTO'), None)
+    return {
+        'nit': [columnas[campo] for campo in ('NIT_VENDEDOR', 'NIT_COMPRADOR') if campo in columnas],
+        'producto': [producto] if producto is not None else [],
+    }
+
+def aplicar_homologaciones(chunk: pd.DataFrame, columnas: Dict[str, List[str]],
+                           reemplazos: Dict[str, Dict[str, str]], vistos: Dict[str, Dict]) -> int:
+    """
+    Reemplaza en el bloque los valores con corrección conocida; devuelve las celdas corregidas.
+
+    Cada valor distinto se busca una sola vez por archivo: `vistos[tipo]`
+    guarda valor -> corrección (o None) entre bloques.
+    """
+    corregidas = 0
+    for tipo, cols in columnas.items():
+        mapa = reemplazos.get(tipo)
+        if not mapa:
+            continue
+        cache = vistos.setdefault(tipo, {})
+        for col in cols:
+            serie = chunk[col]
+            cambios = {}
+            for valor in serie.dropna().unique():
+                if valor not in cache:
+                    cache[valor] = mapa.get(normalizar_valor(tipo, valor))
+                if cache[valor] is not None and cache[valor] != valor:
+                    cambios[valor] = cache[valor]
+            if cambios:
+                afectadas = serie.isin(list(cambios))
+                chunk[col] = serie.where(~afectadas, serie.map(cambios))
+                corregidas += int(afectadas.sum())
+    return corregidas
+
+
+def procesar_archivo(file_path: str, formato: str, filename: str, registros_path: str,
+                     reemplazos: Optional[Dict[str, Dict[str, str]]] = None) -> Dict:
+    """
+    Procesa, homologa, valida y normaliza el archivo en una pasada.
+
+    `reemplazos` viene de HomologationMemory.reemplazos(cliente). Devuelve
+    {'resultado', 'errores', 'guardados', 'registrosVersion', 'homologacion'}:
+    'resultado' es el de process_file_by_type, 'errores' la tabla de
+    validar_registros de todos los bloques y 'homologacion' las celdas
+    corregidas y los valores distintos con y sin corrección. Los registros
+    normalizados quedan en `registros_path` solo si el archivo se procesó con
+    registros; si no, 'guardados' y 'registrosVersion' son None.
+    """
+    if formato == 'auto_detect':
+        formato = detect_file_format_by_content(file_path, filename)
+
+    partes = []
+    columnas = homologables = None
+    guardados = corregidas = 0
+    vistos: Dict[str, Dict] = {}
+    with escritor_registros_normalizados(registros_path) as escribir:
+        def al_bloque(chunk: pd.DataFrame):
+            nonlocal columnas, homologables, guardados, corregidas
+            chunk = chunk.dropna(how='all')
+            if columnas is None:
+                columnas = resolver_columnas(chunk.columns)
+                homologables = columnas_homologables(chunk.columns, columnas)
+            if reemplazos:
+                corregidas += aplicar_homologaciones(chunk, homologables, reemplazos, vistos)
+            tabla = validar_registros(chunk, columnas)
+            if not tabla.empty:
+                partes.append(tabla)
+            guardados += escribir(chunk)
+
+        resultado = process_file_by_type(file_path, formato, filename, al_bloque=al_bloque)
+
+    hits = sum(c is not None for cache in vistos.values() for c in cache.values())
+    homologacion = {
+        'corregidas': corregidas,
+        'hits': hits,
+        'misses': sum(len(cache) for cache in vistos.values()) - hits,
+    }
+    if not resultado["success"] or resultado["registros"] == 0:
+        os.remove(registros_path)
+        return {'resultado': resultado, 'errores': tabla_vacia(), 'guardados': None,
+                'registrosVersion': None, 'homologacion': homologacion}
+
+    return {
+        'resultado': resultado,
+        'errores': pd.concat(partes, ignore_index=True) if partes else tabla_vacia(),
+        'guardados': guardados,
+        # Hash de contenido: versión de los datos para la clave de los artefactos de descarga
+        'registrosVersion': hash_archivo(registros_path),
+        'homologacion': homologacion,
+    }
@@ -0,0 +1,305 @@
+# backend/resumable_upload.py
+"""
+Cargas reanudables por bloques (init → PUT con offset → finalizar).
+
+Cada sesión reserva un archivo del tamaño final (posix_fallocate) y los
+bloques se escriben en su posición con pwrite, así que pueden llegar en
+cualquier orden, repetirse o reintentarse tras un corte sin reenviar lo ya
+recibido. Los rangos recibidos se guardan junto al archivo (.json) y
+sobreviven a un reinicio del servidor. Lo preasignado por las sesiones
+abiertas descuenta de un cupo propio (bytes y número de sesiones): sin cupo,
+iniciar lanza StagingFullError (la API responde 503 + Retry-After) en vez de
+llenar el disco con sesiones que nunca suben nada.
+
+El SHA-256 se calcula mientras llegan los bloques en orden; al finalizar
+solo se lee del disco la parte que no se pudo hashear en línea. Un bloque
+que reescribe bytes ya hasheados (reintento con otros datos) descarta el
+hash en línea y el archivo se hashea completo desde disco al finalizar.
+
+El formato se detecta en cuanto llega el primer KB y se informa en el
+estado de la sesión, de modo que el cliente puede abortar un archivo
+inválido antes de subir gigas. El parseo posterior (file_processors) ya lee
+por bloques, sin límite de tamaño en memoria.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from file_processors import detect_file_format_by_content
+from staging import StagingFullError
+
+HASH_BLOCK_SIZE = 1024 * 1024
+DETECCION_BYTES = 1024  # detect_file_format_by_content lee el primer KB
+
+
+class UploadError(Exception):
+    """Operación inválida sobre una sesión (el mensaje se devuelve al cliente)"""
+
+    def __init__(self, mensaje: str, status_code: int = 400):
+        super().__init__(mensaje)
+        self.status_code = status_code
+
+
+def _fusionar_rangos(rangos: List[List[int]]) -> List[List[int]]:
+    """Rangos [inicio, fin) ordenados y sin solapamientos"""
+    fusionados: List[List[int]] = []
+    for inicio, fin in sorted(rangos):
+        if fusionados and inicio <= fusionados[-1][1]:
+            fusionados[-1][1] = max(fusionados[-1][1], fin)
+        else:
+            fusionados.append([inicio, fin])
+    return fusionados
+
+def _preasignar(path: str, tamano: int):
+    """Reserva el espacio del archivo completo (cae a un archivo disperso si el FS no soporta fallocate)"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, tamano)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, tamano)
+    finally:
+        os.close(fd)
+
+
+class _Sesion:
+    def __init__(self, meta: Dict):
+        self.meta = meta
+        self.lock = threading.Lock()
+        # Hash en línea del prefijo [0, hash_offset); se pierde en un reinicio y se recalcula al finalizar
+        self.hash = hashlib.sha256()
+        self.hash_offset = 0
+
+
+class ResumableUploadManager:
+    """Sesiones de carga en `root`: <id>.part (datos) y <id>.json (estado)"""
+
+    def __init__(self, root: str, max_bytes: int, max_chunk_bytes: int, ttl_segundos: float,
+                 max_reservados: int, max_sesiones: int, retry_after: int = 30):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self.ttl_segundos = ttl_segundos
+        self.max_reservados = max_reservados
+        self.max_sesiones = max_sesiones
+        self.retry_after = retry_after
+        self._sesiones: Dict[str, _Sesion] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # upload_id -> bytes preasignados; incluye las sesiones que sobrevivieron a un reinicio
+        self._reservas: Dict[str, int] = self._medir()
+
+    def _medir(self) -> Dict[str, int]:
+        reservas = {}
+        for entrada in os.scandir(self.root):
+            if not entrada.name.endswith('.json'):
+                continue
+            try:
+                with open(entrada.path, encoding='utf-8') as f:
+                    reservas[entrada.name[:-len('.json')]] = int(json.load(f)['tamano'])
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+        return reservas
+
+    def _reservar(self, upload_id: str, tamano: int):
+        with self._lock:
+            reservados = sum(self._reservas.values())
+            if len(self._reservas) >= self.max_sesiones or reservados + tamano > self.max_reservados:
+                raise StagingFullError(
+                    f"Sin espacio para cargas reanudables ({len(self._reservas)} sesiones, "
+                    f"{reservados} de {self.max_reservados} bytes reservados)", self.retry_after
+                )
+            self._reservas[upload_id] = tamano
+
+    def _liberar(self, upload_id: str):
+        with self._lock:
+            self._reservas.pop(upload_id, None)
+            self._sesiones.pop(upload_id, None)
+
+    def _path(self, upload_id: str, extension: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.{extension}")
+
+    def _guardar_meta(self, sesion: _Sesion):
+        meta_path = self._path(sesion.meta['id'], 'json')
+        temporal = meta_path + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(sesion.meta, f)
+        os.replace(temporal, meta_path)
+
+    def _sesion(self, upload_id: str) -> _Sesion:
+        """Sesión en memoria o recargada desde disco (tras un reinicio)"""
+        with self._lock:
+            sesion = self._sesiones.get(upload_id)
+            if sesion is not None:
+                return sesion
+            # Solo ids generados por iniciar(): evita rutas arbitrarias
+            try:
+                uuid.UUID(hex=upload_id)
+            except ValueError:
+                raise UploadError("Carga no encontrada", 404)
+            try:
+                with open(self._path(upload_id, 'json'), encoding='utf-8') as f:
+                    sesion = _Sesion(json.load(f))
+            except FileNotFoundError:
+                raise UploadError("Carga no encontrada", 404)
+            self._sesiones[upload_id] = sesion
+            return sesion
+
+    def iniciar(self, nombre_archivo: str, tamano: int, sha256: Optional[str] = None, **extra) -> Dict:
+        """Crea la sesión y preasigna el archivo; `extra` se conserva para finalizar (cliente, formato...)"""
+        if tamano <= 0:
+            raise UploadError("El tamaño debe ser mayor que cero")
+        if tamano > self.max_bytes:
+            raise UploadError(f"Archivo muy grande (máximo {self.max_bytes} bytes)", 413)
+        upload_id = uuid.uuid4().hex
+        self._reservar(upload_id, tamano)
+        ahora = time.time()
+        sesion = _Sesion({
+            'id': upload_id,
+            'nombreArchivo': nombre_archivo,
+            'tamano': tamano,
+            'sha256': sha256.lower() if sha256 else None,
+            'recibidos': [],
+            'formatoDetectado': None,
+            'creado': ahora,
+            'actualizado': ahora,
+            **extra,
+        })
+        try:
+            _preasignar(self._path(upload_id, 'part'), tamano)
+            self._guardar_meta(sesion)
+        except BaseException:
+            self._eliminar(upload_id)
+            raise
+        with self._lock:
+            self._sesiones[upload_id] = sesion
+        return self.estado(upload_id)
+
+    def escribir(self, upload_id: str, offset: int, datos: bytes) -> int:
+        """Escribe `datos` en `offset`; devuelve el offset siguiente. El estado se persiste con confirmar()"""
+        sesion = self._sesion(upload_id)
+        tamano = sesion.meta['tamano']
+        fin = offset + len(datos)
+        if offset < 0 or fin > tamano:
+            raise UploadError(f"Bloque fuera del archivo: [{offset}, {fin}) de {tamano} bytes", 416)
+        if not datos:
+            return offset
+
+        # Escritura y hash bajo el lock de la sesión: PUT concurrentes sobre el mismo rango
+        # no pueden dejar en disco bytes distintos de los que entraron al hash
+        with sesion.lock:
+            fd = os.open(self._path(upload_id, 'part'), os.O_WRONLY)
+            try:
+                escritos = 0
+                while escritos < len(datos):
+                    escritos += os.pwrite(fd, datos[escritos:], offset + escritos)
+            finally:
+                os.close(fd)
+
+            if offset < sesion.hash_offset:
+                # Reescribe bytes ya hasheados: el hash en línea ya no corresponde al disco
+                sesion.hash = hashlib.sha256()
+                sesion.hash_offset = 0
+            if offset <= sesion.hash_offset < fin:
+                sesion.hash.update(datos[sesion.hash_offset - offset:])
+                sesion.hash_offset = fin
+            sesion.meta['recibidos'] = _fusionar_rangos(sesion.meta['recibidos'] + [[offset, fin]])
+            sesion.meta['actualizado'] = time.time()
+            recibidos = sesion.meta['recibidos']
+            detectar = sesion.meta['formatoDetectado'] is None and recibidos[0][0] == 0 \
+                and recibidos[0][1] >= min(tamano, DETECCION_BYTES)
+        if detectar:
+            # El primer KB ya está en disco: el formato se conoce sin esperar el resto
+            formato = detect_file_format_by_content(self._path(upload_id, 'part'), sesion.meta['nombreArchivo'])
+            with sesion.lock:
+                sesion.meta['formatoDetectado'] = formato
+        return fin
+
+    def confirmar(self, upload_id: str):
+        """Persiste los rangos recibidos (al terminar cada PUT, aunque se haya cortado)"""
+        sesion = self._sesion(upload_id)
+        with sesion.lock:
+            self._guardar_meta(sesion)
+
+    def estado(self, upload_id: str) -> Dict:
+        sesion = self._sesion(upload_id)
+        with sesion.lock:
+            meta = dict(sesion.meta)
+        recibidos = meta['recibidos']
+        bytes_recibidos = sum(fin - inicio for inicio, fin in recibidos)
+        # Primer hueco: desde ahí debe continuar un cliente que sube en orden
+        siguiente = recibidos[0][1] if recibidos and recibidos[0][0] == 0 else 0
+        return {
+            'uploadId': meta['id'],
+            'nombreArchivo': meta['nombreArchivo'],
+            'tamano': meta['tamano'],
+            'bytesRecibidos': bytes_recibidos,
+            'siguienteOffset': siguiente,
+            'rangosRecibidos': recibidos,
+            'completo': bytes_recibidos == meta['tamano'],
+            'formatoDetectado': meta['formatoDetectado'],
+            'maxBytesPorBloque': self.max_chunk_bytes,
+        }
+
+    def finalizar(self, upload_id: str, destino: str, sha256: Optional[str] = None) -> Dict:
+        """Verifica que el archivo esté completo y su SHA-256, y lo mueve a `destino`"""
+        sesion = self._sesion(upload_id)
+        part_path = self._path(upload_id, 'part')
+        with sesion.lock:
+            meta = sesion.meta
+            tamano = meta['tamano']
+            if meta['recibidos'] != [[0, tamano]]:
+                faltan = tamano - sum(fin - inicio for inicio, fin in meta['recibidos'])
+                raise UploadError(f"Carga incompleta: faltan {faltan} bytes", 409)
+
+            # Solo se lee del disco lo que no se hasheó en línea (bloques fuera de orden o reinicio)
+            digest = sesion.hash.copy()
+            with open(part_path, 'rb') as f:
+                f.seek(sesion.hash_offset)
+                for bloque in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                    digest.update(bloque)
+            calculado = digest.hexdigest()
+            esperado = (sha256 or meta['sha256'] or '').lower()
+            if esperado and esperado != calculado:
+                raise UploadError(f"Checksum no coincide: esperado {esperado}, calculado {calculado}", 422)
+
+            os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+            shutil.move(part_path, destino)
+            os.remove(self._path(upload_id, 'json'))
+        # El archivo pasa a staging, que lo contabiliza en su propio cupo
+        self._liberar(upload_id)
+        return {**meta, 'sha256': calculado, 'path': destino}
+
+    def cancelar(self, upload_id: str):
+        self._sesion(upload_id)
+        self._eliminar(upload_id)
+
+    def _eliminar(self, upload_id: str):
+        for extension in ('part', 'json'):
+            try:
+                os.remove(self._path(upload_id, extension))
+            except FileNotFoundError:
+                pass
+        self._liberar(upload_id)
+
+    def limpiar_expiradas(self) -> int:
+        """Elimina sesiones sin actividad por más de ttl_segundos"""
+        limite = time.time() - self.ttl_segundos
+        eliminadas = 0
+        for entrada in os.scandir(self.root):
+            if not entrada.name.endswith('.json'):
+                continue
+            upload_id = entrada.name[:-len('.json')]
+            try:
+                actualizado = self._sesion(upload_id).meta['actualizado']
+            except (UploadError, ValueError):
+                continue
+            if actualizado < limite:
+                self.cancelar(upload_id)
+                eliminadas += 1
+        return eliminadas
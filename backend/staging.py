@@ -0,0 +1,216 @@
+# backend/staging.py
+"""
+Área de staging para archivos cargados, antes y durante su procesamiento.
+
+- Ruta única por carga (<root>/<uuid>/<nombre>): dos cargas con el mismo
+  nombre nunca se pisan.
+- Escritura por bloques con SHA-256 calculado en el mismo recorrido.
+- Cupo de disco: cada bloque descuenta del cupo bajo un lock, así que muchas
+  cargas en paralelo no pueden superarlo entre todas. Si no hay espacio se
+  lanza StagingFullError (la API responde 503 + Retry-After).
+- Janitor: elimina archivos huérfanos (de un proceso que murió a mitad de
+  carga o de procesamiento) que ya no pertenecen a ningún trabajo activo.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from typing import BinaryIO, Callable, Dict, Iterable, Optional
+
+COPY_BLOCK_SIZE = 1024 * 1024
+
+_NOMBRE_INSEGURO_RE = re.compile(r'[^A-Za-z0-9_.() -]+')
+
+
+class StagingFullError(Exception):
+    """No hay cupo en staging para el archivo"""
+
+    def __init__(self, mensaje: str, retry_after: int):
+        super().__init__(mensaje)
+        self.retry_after = retry_after
+
+
+class StagedFileTooLarge(ValueError):
+    """El archivo supera el límite por archivo"""
+
+
+def nombre_seguro(nombre: str) -> str:
+    """Nombre base sin rutas ni caracteres problemáticos (conserva la extensión)"""
+    base = os.path.basename((nombre or '').replace('\\', '/')).strip()
+    base = _NOMBRE_INSEGURO_RE.sub('_', base).lstrip('.')
+    return base[:200] or 'archivo'
+
+
+class StagingArea:
+    """Directorio de staging con cupo de bytes compartido entre cargas concurrentes"""
+
+    def __init__(self, root: str, max_bytes: int, retry_after: int = 30, huerfanos_segundos: float = 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.retry_after = retry_after
+        self.huerfanos_segundos = huerfanos_segundos
+        self._lock = threading.Lock()
+        self._usados = 0
+        self._stats = {'archivos': 0, 'rechazosPorCupo': 0, 'huerfanosEliminados': 0}
+        os.makedirs(root, exist_ok=True)
+        self._usados = self._medir()
+
+    def _medir(self) -> int:
+        total = 0
+        for directorio, _, archivos in os.walk(self.root):
+            for archivo in archivos:
+                try:
+                    total += os.path.getsize(os.path.join(directorio, archivo))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def _lleno(self) -> StagingFullError:
+        self._stats['rechazosPorCupo'] += 1
+        return StagingFullError(
+            f"Staging sin espacio ({self._usados} de {self.max_bytes} bytes en uso)", self.retry_after
+        )
+
+    def _consumir(self, n: int):
+        with self._lock:
+            if self._usados + n > self.max_bytes:
+                raise self._lleno()
+            self._usados += n
+
+    def _devolver(self, n: int):
+        with self._lock:
+            self._usados = max(0, self._usados - n)
+
+    def verificar_cupo(self, tamano: int):
+        """Falla rápido si un archivo de `tamano` bytes no cabe hoy (no reserva)"""
+        with self._lock:
+            if self._usados + tamano > self.max_bytes:
+                raise self._lleno()
+
+    def nueva_ruta(self, nombre: str) -> str:
+        """Ruta única para un archivo nuevo"""
+        directorio = os.path.join(self.root, uuid.uuid4().hex)
+        os.makedirs(directorio)
+        return os.path.join(directorio, nombre_seguro(nombre))
+
+    def guardar(self, origen: BinaryIO, nombre: str, tamano: Optional[int] = None,
+                limite: Optional[int] = None) -> Dict:
+        """
+        Copia `origen` por bloques a una ruta única y calcula su SHA-256.
+
+        Devuelve {'path', 'nombre', 'tamano', 'sha256'}. Si el cupo se agota a
+        mitad de camino o se supera `limite`, borra lo escrito y relanza.
+        """
+        if tamano is not None:
+            if limite is not None and tamano > limite:
+                raise StagedFileTooLarge("Archivo muy grande")
+            self.verificar_cupo(tamano)
+        path = self.nueva_ruta(nombre)
+        digest = hashlib.sha256()
+        escritos = 0
+        try:
+            with open(path, 'wb') as f:
+                for bloque in iter(lambda: origen.read(COPY_BLOCK_SIZE), b''):
+                    if limite is not None and escritos + len(bloque) > limite:
+                        raise StagedFileTooLarge("Archivo muy grande")
+                    self._consumir(len(bloque))
+                    escritos += len(bloque)
+                    digest.update(bloque)
+                    f.write(bloque)
+        except BaseException:
+            self._eliminar(path)
+            self._devolver(escritos)
+            raise
+        with self._lock:
+            self._stats['archivos'] += 1
+        return {'path': path, 'nombre': os.path.basename(path), 'tamano': escritos, 'sha256': digest.hexdigest()}
+
+    def registrar(self, path: str) -> int:
+        """
+        Contabiliza un archivo escrito por fuera en una ruta de nueva_ruta() (p. ej. una carga reanudable).
+
+        Los bytes ya están en disco: se suman aunque superen el cupo (el cupo
+        se verificó al iniciar la carga con verificar_cupo).
+        """
+        tamano = os.path.getsize(path)
+        with self._lock:
+            self._usados += tamano
+            self._stats['archivos'] += 1
+        return tamano
+
+    def _eliminar(self, path: str) -> int:
+        """Borra el archivo y su directorio único; devuelve los bytes liberados"""
+        try:
+            tamano = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            tamano = 0
+        directorio = os.path.dirname(path)
+        if os.path.dirname(os.path.abspath(directorio)) == os.path.abspath(self.root):
+            try:
+                os.rmdir(directorio)
+            except OSError:
+                pass
+        return tamano
+
+    def liberar(self, path: str):
+        """Elimina un archivo de staging al terminar su procesamiento"""
+        self._devolver(self._eliminar(path))
+
+    def contiene(self, path: str) -> bool:
+        return os.path.abspath(path).startswith(os.path.abspath(self.root) + os.sep)
+
+    def limpiar_huerfanos(self, activos: Callable[[], Iterable[str]]) -> int:
+        """
+        Elimina archivos sin actividad por más de huerfanos_segundos que no estén
+        en `activos()` (rutas de trabajos en cola o en proceso).
+
+        El mtime protege las cargas en curso: cada bloque escrito lo actualiza.
+        """
+        limite = time.time() - self.huerfanos_segundos
+        en_uso = {os.path.abspath(p) for p in activos()}
+        eliminados = 0
+        for entrada in os.scandir(self.root):
+            if not entrada.is_dir():
+                continue
+            for archivo in os.scandir(entrada.path):
+                try:
+                    viejo = archivo.stat().st_mtime < limite
+                except FileNotFoundError:
+                    continue
+                if viejo and os.path.abspath(archivo.path) not in en_uso:
+                    self.liberar(archivo.path)
+                    eliminados += 1
+            try:
+                # Directorios vacíos de cargas que fallaron antes de escribir
+                if entrada.stat().st_mtime < limite:
+                    os.rmdir(entrada.path)
+            except OSError:
+                pass
+        with self._lock:
+            self._stats['huerfanosEliminados'] += eliminados
+        return eliminados
+
+    def iniciar_janitor(self, activos: Callable[[], Iterable[str]], intervalo_segundos: float) -> threading.Event:
+        """Ejecuta limpiar_huerfanos cada `intervalo_segundos` en un hilo daemon; set() en el evento lo detiene"""
+        detener = threading.Event()
+
+        def _loop():
+            while True:
+                try:
+                    eliminados = self.limpiar_huerfanos(activos)
+                    if eliminados:
+                        print(f"[CONSOLE LOG] Staging: {eliminados} archivos huérfanos eliminados")
+                except Exception as e:
+                    print(f"[CONSOLE LOG] ERROR en janitor de staging: {e}")
+                if detener.wait(intervalo_segundos):
+                    return
+
+        threading.Thread(target=_loop, name="staging-janitor", daemon=True).start()
+        return detener
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'bytesEnUso': self._usados, 'maxBytes': self.max_bytes, **self._stats}
@@ -0,0 +1,14 @@
+"""
+Backend modules import each other flat (`from file_processors import ...`),
+the way main.py runs them from backend/: put that directory first on sys.path.
+
+backend/app (configuration) shares its name with the Flask app.py at the
+repository root; importing it here binds `app` to the backend package before
+root tests put the repository root ahead on sys.path.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.config  # noqa: E402,F401
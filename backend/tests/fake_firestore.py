@@ -0,0 +1,189 @@
+"""
+In-memory stand-in for the Firestore client used by firebase_service.
+
+Covers what the service calls: collections, documents, add/set/update with
+merge, Increment and DELETE_FIELD, write batches (rejected above the 500-op
+limit, like the server), transactions and simple queries (where, select,
+order_by, limit, start_after). Naive datetimes read back as UTC, as they do
+from Firestore. Every committed batch or transaction is recorded in
+`commits` as the list of (collection, doc id) it wrote, and every query in
+`reads` as (collection, documents returned).
+"""
+import uuid
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+
+BATCH_LIMIT = 500
+
+
+def _apply(existing, data, merge):
+    result = dict(existing) if merge and existing else {}
+    for key, value in data.items():
+        if value is firestore.DELETE_FIELD:
+            result.pop(key, None)
+        elif isinstance(value, firestore.Increment):
+            result[key] = (result.get(key) or 0) + value.value
+        elif isinstance(value, dict):
+            current = result.get(key) if merge and isinstance(result.get(key), dict) else {}
+            result[key] = _apply(current, value, True)
+        elif isinstance(value, datetime) and value.tzinfo is None:
+            result[key] = value.replace(tzinfo=timezone.utc)
+        else:
+            result[key] = value
+    return result
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeDocument:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self.collection_name = collection
+        self.id = doc_id
+
+    @property
+    def _key(self):
+        return (self.collection_name, self.id)
+
+    def get(self, transaction=None):
+        return FakeSnapshot(self, self._client.docs.get(self._key))
+
+    def set(self, data, merge=False):
+        self._client._commit([('set', self, data, merge)])
+
+    def update(self, data):
+        self._client._commit([('update', self, data, True)])
+
+
+class FakeQuery:
+    def __init__(self, client, collection, filters=(), order=None, count=None, after=None, fields=None):
+        self._client = client
+        self._collection = collection
+        self._filters = list(filters)
+        self._order = order
+        self._count = count
+        self._after = after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, order=self._order, count=self._count,
+                     after=self._after, fields=self._fields)
+        state.update(changes)
+        return FakeQuery(self._client, self._collection, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self._filters + [(field, op, value)])
+
+    def select(self, fields):
+        return self._copy(fields=list(fields))
+
+    def order_by(self, field, direction=None):
+        return self._copy(order=field)
+
+    def limit(self, count):
+        return self._copy(count=count)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot.id)
+
+    def get(self, transaction=None):
+        docs = []
+        for (collection, doc_id), data in self._client.docs.items():
+            if collection != self._collection:
+                continue
+            if all(data.get(f) == v if op == '==' else data.get(f) in v for f, op, v in self._filters):
+                docs.append((doc_id, data))
+        if self._order == '__name__':
+            docs.sort(key=lambda doc: doc[0])
+            if self._after is not None:
+                docs = [doc for doc in docs if doc[0] > self._after]
+        elif self._order is not None:
+            docs.sort(key=lambda doc: doc[1].get(self._order))
+        if self._count is not None:
+            docs = docs[:self._count]
+        self._client.reads.append((self._collection, len(docs)))
+        return [
+            FakeSnapshot(FakeDocument(self._client, self._collection, doc_id),
+                         {f: data[f] for f in self._fields if f in data} if self._fields else data)
+            for doc_id, data in docs
+        ]
+
+    stream = get
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client, name):
+        super().__init__(client, name)
+        self.name = name
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._client, self.name, doc_id or uuid.uuid4().hex)
+
+    def add(self, data):
+        doc_ref = self.document()
+        doc_ref.set(data)
+        return None, doc_ref
+
+
+class FakeBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, doc_ref, data, merge=False):
+        self._writes.append(('set', doc_ref, data, merge))
+
+    def update(self, doc_ref, data):
+        self._writes.append(('update', doc_ref, data, True))
+
+    def commit(self):
+        if len(self._writes) > BATCH_LIMIT:
+            raise ValueError(f"maximum {BATCH_LIMIT} writes allowed per request")
+        self._client._commit(self._writes)
+
+
+class FakeTransaction(FakeBatch):
+    def get(self, ref_or_query):
+        return ref_or_query.get(transaction=self)
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.commits = []
+        self.reads = []
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def _commit(self, writes):
+        for kind, doc_ref, data, merge in writes:
+            if kind == 'update' and doc_ref._key not in self.docs:
+                raise KeyError(f"No document to update: {doc_ref._key}")
+            self.docs[doc_ref._key] = _apply(self.docs.get(doc_ref._key), data, merge)
+        self.commits.append([doc_ref._key for _, doc_ref, _, _ in writes])
+
+
+def transactional(function):
+    """firestore.transactional for FakeTransaction: run once, then commit the buffered writes"""
+    def run(transaction, *args, **kwargs):
+        result = function(transaction, *args, **kwargs)
+        transaction.commit()
+        return result
+    return run
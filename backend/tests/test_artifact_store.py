@@ -0,0 +1,104 @@
+"""
+Range parsing for artifact downloads and the per-artifact generation lock
+of ArtifactStore.
+"""
+import os
+import threading
+
+import pytest
+
+from artifact_store import ArtifactStore, iter_rango, parse_range
+
+
+@pytest.mark.parametrize('header, size, rango', [
+    ('bytes=0-99', 1000, (0, 99)),
+    ('bytes=500-', 1000, (500, 999)),
+    ('bytes=900-5000', 1000, (900, 999)),
+    ('bytes=-100', 1000, (900, 999)),
+    ('bytes=-5000', 1000, (0, 999)),
+    ('bytes=999-', 1000, (999, 999)),
+    (' BYTES = 10 - 20 ', 1000, (10, 20)),
+])
+def test_parse_range(header, size, rango):
+    assert parse_range(header, size) == rango
+
+
+@pytest.mark.parametrize('header', [
+    'items=0-10', 'bytes=0-10,20-30', 'bytes=10', 'bytes=-', 'bytes=a-b', 'bytes=20-10', 'bytes=--5',
+])
+def test_parse_range_not_applicable_serves_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize('header, size', [
+    ('bytes=1000-', 1000),
+    ('bytes=1000-2000', 1000),
+    ('bytes=-0', 1000),
+    ('bytes=-10', 0),
+    ('bytes=0-', 0),
+])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+def test_iter_rango_reads_inclusive_range_and_closes(tmp_path):
+    path = tmp_path / 'artefacto.csv'
+    path.write_bytes(bytes(range(256)) * 4)
+    archivo = open(path, 'rb')
+
+    assert b''.join(iter_rango(archivo, 250, 260, bloque=4)) == (bytes(range(256)) * 4)[250:261]
+    assert archivo.closed
+
+
+def test_concurrent_downloads_wait_for_one_generation(tmp_path):
+    store = ArtifactStore(str(tmp_path / 'exports'), max_bytes=1024 * 1024)
+    generando = threading.Event()
+    continuar = threading.Event()
+    llamadas = []
+
+    def generar(ruta):
+        llamadas.append(ruta)
+        generando.set()
+        continuar.wait(5)
+        with open(ruta, 'wb') as f:
+            f.write(b'plantilla')
+
+    contenidos = []
+
+    def descargar():
+        with store.abrir_o_generar('plantilla.xlsx', generar) as archivo:
+            contenidos.append(archivo.read())
+
+    hilos = [threading.Thread(target=descargar) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    assert generando.wait(5)
+    continuar.set()
+    for hilo in hilos:
+        hilo.join(5)
+
+    assert len(llamadas) == 1
+    assert contenidos == [b'plantilla'] * 4
+    assert store.stats()['misses'] == 1 and store.stats()['hits'] == 3
+
+
+def test_failed_generation_leaves_no_entry_and_is_retried(tmp_path):
+    store = ArtifactStore(str(tmp_path / 'exports'), max_bytes=1024 * 1024)
+
+    def fallar(ruta):
+        with open(ruta, 'wb') as f:
+            f.write(b'parcial')
+        raise RuntimeError('fallo generando')
+
+    with pytest.raises(RuntimeError):
+        store.abrir_o_generar('plantilla.xlsx', fallar)
+    assert os.listdir(store.root) == []
+    assert store.abrir('plantilla.xlsx') is None
+
+    def generar(ruta):
+        with open(ruta, 'wb') as f:
+            f.write(b'plantilla')
+
+    with store.abrir_o_generar('plantilla.xlsx', generar) as archivo:
+        assert archivo.read() == b'plantilla'
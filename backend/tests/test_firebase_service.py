@@ -0,0 +1,117 @@
+"""
+FirebaseService against the in-memory Firestore fake: statistics
+reconciliation, batched writes split at the 500-operation limit with their
+statistics increments, and buffered logs.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+firebase_admin = pytest.importorskip('firebase_admin')
+from firebase_admin import firestore
+
+from fake_firestore import FakeFirestore, transactional
+
+STATS = ('estadisticas', 'global')
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(firebase_admin, 'initialize_app', lambda *args, **kwargs: None)
+    monkeypatch.setattr(firebase_admin.credentials, 'ApplicationDefault', lambda: None)
+    monkeypatch.setattr(firestore, 'client', FakeFirestore)
+    monkeypatch.setattr(firestore, 'transactional', transactional)
+    import firebase_service
+
+    service = firebase_service.firebase_service
+    monkeypatch.setattr(service, 'db', FakeFirestore())
+    monkeypatch.setattr(service, '_log_buffer', [])
+    return service
+
+
+def lote(estado, fecha, registros=0, errores=0):
+    return {'estado': estado, 'fechaCarga': fecha, 'registrosTotales': registros, 'errores': errores}
+
+
+def test_reconcile_corrects_counters_with_deltas(service):
+    hoy = datetime.utcnow()
+    service.create_lotes_bulk([lote('Completado', hoy, 10, 2), lote('En Cola', hoy)])
+    service.create_excepciones_bulk([{'estadoGestion': 'Pendiente'}])
+    viejo = (hoy - timedelta(days=400)).strftime('%Y-%m-%d')
+    service.db.docs[STATS]['lotesPorEstado']['Error'] = 3
+    service.db.docs[STATS]['lotesPorFecha'][viejo] = 7
+
+    resultado = service.reconcile_estadisticas()
+
+    stats = service.db.docs[STATS]
+    assert resultado == {'correcciones': 3, 'eliminados': 1}
+    assert {k: v for k, v in stats['lotesPorEstado'].items() if v} == {'Completado': 1, 'En Cola': 1}
+    assert stats['lotesPorFecha'] == {hoy.strftime('%Y-%m-%d'): 2}
+    assert stats['excepcionesPorEstado'] == {'Pendiente': 1}
+    assert stats['registrosProcesados'] == 10
+    assert stats['erroresDetectados'] == 2
+
+
+def test_reconcile_transaction_writes_only_the_statistics_document(service):
+    service.create_lotes_bulk([lote('En Cola', datetime.utcnow()) for _ in range(3)])
+
+    assert service.reconcile_estadisticas() == {'correcciones': 0, 'eliminados': 0}
+    assert service.db.commits[-1] == [STATS]
+
+
+def test_recount_reads_collections_in_pages(service):
+    service.create_lotes_bulk([lote('En Cola', datetime.utcnow()) for _ in range(5)])
+    service.db.reads.clear()
+
+    docs = list(service._iter_paged(service.db.collection('lotes').select(['estado']), page_size=2))
+
+    assert len({doc.id for doc in docs}) == 5
+    assert service.db.reads == [('lotes', 2), ('lotes', 2), ('lotes', 1)]
+
+
+def test_bulk_writes_split_at_the_batch_limit(service):
+    ids = service.create_lotes_bulk([lote('En Cola', datetime.utcnow()) for _ in range(1000)])
+
+    assert len(set(ids)) == 1000
+    # 499 lotes + the statistics increment per batch, never more than 500 writes
+    assert [len(commit) for commit in service.db.commits] == [500, 500, 3]
+    assert sum(1 for key in service.db.docs if key[0] == 'lotes') == 1000
+
+
+def test_stats_increments_commit_in_the_same_batch(service):
+    hoy = datetime.utcnow()
+    service.create_lotes_bulk([lote('En Cola', hoy), lote('Completado', hoy)])
+    service.create_excepcion_dian({'estadoGestion': 'Pendiente'})
+
+    lotes_commit, excepcion_commit = service.db.commits
+    assert lotes_commit.count(STATS) == 1 and len(lotes_commit) == 3
+    assert excepcion_commit.count(STATS) == 1 and len(excepcion_commit) == 2
+    stats = service.db.docs[STATS]
+    assert stats['lotesPorEstado'] == {'En Cola': 1, 'Completado': 1}
+    assert stats['lotesPorFecha'] == {hoy.strftime('%Y-%m-%d'): 2}
+    assert stats['excepcionesPorEstado'] == {'Pendiente': 1}
+
+
+def test_writes_without_stats_use_full_batches(service):
+    for i in range(1001):
+        service.add_log('lote-1', f'linea {i}', buffered=True)
+
+    assert service.flush_logs() == 1001
+    assert [len(commit) for commit in service.db.commits] == [500, 500, 1]
+    assert STATS not in service.db.docs
+
+
+def test_buffered_logs_are_written_only_on_flush(service):
+    service.add_log('lote-1', 'inicio', buffered=True)
+    service.add_log('lote-2', 'inicio', buffered=True)
+    service.add_log('lote-1', 'fin', buffered=True)
+    assert service.db.commits == []
+
+    assert service.flush_logs('lote-1') == 2
+    mensajes = [data['mensaje'] for key, data in service.db.docs.items() if key[0] == 'logs']
+    assert mensajes == ['inicio', 'fin']
+    assert [log['loteId'] for log in service._log_buffer] == ['lote-2']
+
+    assert service.flush_logs() == 1
+    assert service._log_buffer == []
+    assert service.flush_logs() == 0
@@ -0,0 +1,58 @@
+"""
+HomologationMemory import/export with an in-memory store: malformed
+mappings are rejected with ValueError (the API answers 400) before anything
+is written.
+"""
+import pytest
+
+from homologation import HomologationMemory
+
+
+class MemoryStore:
+    def __init__(self):
+        self.mapeos = {}
+
+    def get_homologaciones(self, cliente=None):
+        return [m for m in self.mapeos.values() if cliente is None or m['cliente'] == cliente]
+
+    def set_homologaciones_many(self, mapeos):
+        self.mapeos.update((m['id'], m) for m in mapeos)
+        return len(mapeos)
+
+
+@pytest.fixture
+def memoria():
+    return HomologationMemory(MemoryStore())
+
+
+def test_export_then_import_round_trip(memoria):
+    memoria.aprender('cliente-1', 'nit', '900.123.456', {'nitCorrecto': '900123457'})
+    exportados = memoria.exportar()
+
+    destino = HomologationMemory(MemoryStore())
+    assert destino.importar(exportados) == 1
+    assert destino.buscar('cliente-1', 'nit', '900123456')['correccion'] == {'nitCorrecto': '900123457'}
+
+
+@pytest.mark.parametrize('mapeos', [
+    ['no es un mapeo'],
+    [None],
+    [['cliente', 'nit']],
+    {'cliente': 'cliente-1'},
+    'mapeos',
+], ids=['string', 'none', 'list', 'dict', 'not-a-list'])
+def test_import_rejects_malformed_mappings(memoria, mapeos):
+    with pytest.raises(ValueError):
+        memoria.importar(mapeos)
+    assert memoria.store.mapeos == {}
+
+
+def test_import_validates_every_mapping_before_writing(memoria):
+    valido = {'cliente': 'cliente-1', 'tipo': 'nit', 'valorOriginal': '900123456',
+              'correccion': {'nitCorrecto': '900123457'}}
+
+    with pytest.raises(ValueError, match='Mapeo sin corrección'):
+        memoria.importar([valido, {**valido, 'correccion': {}}])
+    with pytest.raises(ValueError, match='Mapeo inválido'):
+        memoria.importar([valido, 42])
+    assert memoria.store.mapeos == {}
@@ -0,0 +1,113 @@
+"""
+Resumable uploads: the SHA-256 checked by finalizar must match the bytes on
+disk, whatever order or how many times the chunks were written.
+"""
+import hashlib
+import os
+
+import pytest
+
+from resumable_upload import ResumableUploadManager, UploadError
+from staging import StagingFullError
+
+CONTENIDO = b'NIT;FACTURA;TOTAL\n900123456;F-1;1000\n' * 64
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ResumableUploadManager(str(tmp_path / 'sesiones'), max_bytes=1024 * 1024,
+                                  max_chunk_bytes=1024, ttl_segundos=3600,
+                                  max_reservados=4 * len(CONTENIDO), max_sesiones=3)
+
+
+def subir(manager, upload_id, datos, bloque=512, offset=0):
+    for inicio in range(0, len(datos), bloque):
+        manager.escribir(upload_id, offset + inicio, datos[inicio:inicio + bloque])
+
+
+def test_in_order_chunks_finalize_with_inline_hash(manager, tmp_path):
+    sesion = manager.iniciar('facturas.csv', len(CONTENIDO))
+    subir(manager, sesion['uploadId'], CONTENIDO)
+    destino = str(tmp_path / 'facturas.csv')
+
+    resultado = manager.finalizar(sesion['uploadId'], destino, hashlib.sha256(CONTENIDO).hexdigest())
+
+    assert resultado['sha256'] == hashlib.sha256(CONTENIDO).hexdigest()
+    with open(destino, 'rb') as f:
+        assert f.read() == CONTENIDO
+
+
+def test_rewritten_chunk_is_hashed_from_disk(manager, tmp_path):
+    sesion = manager.iniciar('facturas.csv', len(CONTENIDO))
+    upload_id = sesion['uploadId']
+    # First attempt hashes bytes that a retry then replaces with different ones
+    subir(manager, upload_id, b'X' * 512)
+    subir(manager, upload_id, CONTENIDO)
+
+    with pytest.raises(UploadError) as error:
+        manager.finalizar(upload_id, str(tmp_path / 'malo.csv'),
+                          hashlib.sha256(b'X' * 512 + CONTENIDO[512:]).hexdigest())
+    assert error.value.status_code == 422
+
+    resultado = manager.finalizar(upload_id, str(tmp_path / 'facturas.csv'),
+                                  hashlib.sha256(CONTENIDO).hexdigest())
+    assert resultado['sha256'] == hashlib.sha256(CONTENIDO).hexdigest()
+
+
+def test_out_of_order_chunks(manager, tmp_path):
+    sesion = manager.iniciar('facturas.csv', len(CONTENIDO))
+    upload_id = sesion['uploadId']
+    subir(manager, upload_id, CONTENIDO[1024:], offset=1024)
+    subir(manager, upload_id, CONTENIDO[:1024])
+
+    resultado = manager.finalizar(upload_id, str(tmp_path / 'facturas.csv'))
+
+    assert resultado['sha256'] == hashlib.sha256(CONTENIDO).hexdigest()
+
+
+def test_incomplete_upload_is_rejected(manager, tmp_path):
+    sesion = manager.iniciar('facturas.csv', len(CONTENIDO))
+    subir(manager, sesion['uploadId'], CONTENIDO[:512])
+
+    with pytest.raises(UploadError) as error:
+        manager.finalizar(sesion['uploadId'], str(tmp_path / 'facturas.csv'))
+    assert error.value.status_code == 409
+
+
+def test_preallocated_bytes_count_against_the_quota(manager, tmp_path):
+    for _ in range(2):
+        manager.iniciar('facturas.csv', 2 * len(CONTENIDO) - 1)
+
+    with pytest.raises(StagingFullError) as error:
+        manager.iniciar('facturas.csv', 3)
+    assert error.value.retry_after == manager.retry_after
+    # Nothing is preallocated for the rejected session
+    assert len([n for n in os.listdir(manager.root) if n.endswith('.part')]) == 2
+
+
+def test_session_count_is_capped(manager):
+    for _ in range(3):
+        manager.iniciar('facturas.csv', 1)
+
+    with pytest.raises(StagingFullError):
+        manager.iniciar('facturas.csv', 1)
+
+
+def test_finalize_and_cancel_release_the_quota(manager, tmp_path):
+    primera = manager.iniciar('facturas.csv', 2 * len(CONTENIDO))
+    segunda = manager.iniciar('facturas.csv', 2 * len(CONTENIDO))
+    subir(manager, primera['uploadId'], CONTENIDO * 2)
+    manager.finalizar(primera['uploadId'], str(tmp_path / 'facturas.csv'))
+    manager.cancelar(segunda['uploadId'])
+
+    for _ in range(2):
+        manager.iniciar('facturas.csv', 2 * len(CONTENIDO))
+
+
+def test_quota_survives_a_restart(manager):
+    manager.iniciar('facturas.csv', 4 * len(CONTENIDO))
+
+    reiniciado = ResumableUploadManager(manager.root, manager.max_bytes, manager.max_chunk_bytes,
+                                        manager.ttl_segundos, manager.max_reservados, manager.max_sesiones)
+    with pytest.raises(StagingFullError):
+        reiniciado.iniciar('facturas.csv', 1)
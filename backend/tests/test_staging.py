@@ -0,0 +1,76 @@
+"""
+StagingArea quota: bytes consumed by a guardar that fails halfway are given
+back, together with the partial file and its unique directory.
+"""
+import io
+import os
+
+import pytest
+
+from staging import COPY_BLOCK_SIZE, StagedFileTooLarge, StagingArea, StagingFullError
+
+MB = COPY_BLOCK_SIZE
+
+
+class CorteDeConexion(io.RawIOBase):
+    """Upload stream that delivers `bloques` full blocks and then fails"""
+
+    def __init__(self, bloques):
+        self.bloques = bloques
+
+    def read(self, n=-1):
+        if self.bloques == 0:
+            raise ConnectionResetError('cliente desconectado')
+        self.bloques -= 1
+        return b'x' * n
+
+
+@pytest.fixture
+def staging(tmp_path):
+    return StagingArea(str(tmp_path / 'staging'), max_bytes=3 * MB)
+
+
+def assert_vacio(staging):
+    assert staging.stats()['bytesEnUso'] == 0
+    assert os.listdir(staging.root) == []
+
+
+def test_failed_read_releases_the_quota(staging):
+    with pytest.raises(ConnectionResetError):
+        staging.guardar(CorteDeConexion(2), 'facturas.csv')
+
+    assert_vacio(staging)
+
+
+def test_file_over_the_limit_releases_the_quota(staging):
+    with pytest.raises(StagedFileTooLarge):
+        staging.guardar(io.BytesIO(b'x' * (2 * MB + 1)), 'facturas.csv', limite=2 * MB)
+
+    assert_vacio(staging)
+
+
+def test_quota_exhausted_midway_releases_what_was_written(staging):
+    with pytest.raises(StagingFullError):
+        # Size not declared (chunked upload): the quota runs out during the copy
+        staging.guardar(io.BytesIO(b'x' * (4 * MB)), 'grande.csv')
+
+    assert_vacio(staging)
+    assert staging.stats()['rechazosPorCupo'] == 1
+    guardado = staging.guardar(io.BytesIO(b'x' * (3 * MB)), 'cabe.csv')
+    assert staging.stats()['bytesEnUso'] == guardado['tamano'] == 3 * MB
+
+
+def test_declared_size_over_the_quota_is_rejected_before_writing(staging):
+    with pytest.raises(StagingFullError):
+        staging.guardar(io.BytesIO(b''), 'grande.csv', tamano=4 * MB)
+
+    assert_vacio(staging)
+
+
+def test_liberar_returns_the_quota(staging):
+    guardado = staging.guardar(io.BytesIO(b'x' * MB), 'facturas.csv')
+    assert staging.stats()['bytesEnUso'] == MB
+
+    staging.liberar(guardado['path'])
+
+    assert_vacio(staging)
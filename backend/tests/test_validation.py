@@ -0,0 +1,89 @@
+"""
+Row validation edge cases: NIT check digit, IVA rates and the TOTAL
+tolerance (1% or one peso).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from validation import digito_verificacion, validar_nit, validar_registros
+
+
+def reglas(df):
+    tabla = validar_registros(df)
+    return list(zip(tabla['fila'].tolist(), tabla['regla'].astype(str).tolist()))
+
+
+@pytest.mark.parametrize('nit, dv', [
+    ('800197268', 4),   # DIAN
+    ('900000002', 1),   # residuo 1: el DV es 1
+    ('900000009', 0),   # residuo 0: el DV es 0
+    ('1', 8),
+])
+def test_digito_verificacion(nit, dv):
+    assert digito_verificacion(nit) == dv
+
+
+@pytest.mark.parametrize('nit', ['800197268-4', '900000002-1', '900000009-0', '800197268', '1-8', '9' * 15])
+def test_valid_nits(nit):
+    formato_invalido, dv_invalido = validar_nit(np.array([nit], dtype=object))
+    assert not formato_invalido[0] and not dv_invalido[0]
+
+
+@pytest.mark.parametrize('nit', ['800197268-5', '900000002-0', '900000009-1', '1-0'])
+def test_wrong_check_digit(nit):
+    formato_invalido, dv_invalido = validar_nit(np.array([nit], dtype=object))
+    assert not formato_invalido[0] and dv_invalido[0]
+
+
+@pytest.mark.parametrize('nit', [
+    '', '-', '-4', '800197268-', '80019-7268-4', '800197268-45', '8001972A8', '800.197.268-4',
+    '9' * 16, '9' * 16 + '-1', '800197268 4',
+])
+def test_invalid_nit_format(nit):
+    formato_invalido, dv_invalido = validar_nit(np.array([nit], dtype=object))
+    assert formato_invalido[0] and not dv_invalido[0]
+
+
+def test_vectorized_check_digit_matches_scalar():
+    rng = np.random.default_rng(7)
+    cuerpos = [str(n) for n in rng.integers(1, 10 ** 12, size=500)]
+    correctos = np.array([f'{c}-{digito_verificacion(c)}' for c in cuerpos], dtype=object)
+    incorrectos = np.array([f'{c}-{(digito_verificacion(c) + 1) % 10}' for c in cuerpos], dtype=object)
+
+    assert not validar_nit(correctos)[1].any()
+    assert validar_nit(incorrectos)[1].all()
+
+
+def test_nit_rules_report_row_and_padding_is_ignored():
+    df = pd.DataFrame({'NIT VENDEDOR': [' 800197268-4 ', '800197268-5', 'ABC', None]})
+    assert reglas(df) == [(2, 'NIT_VENDEDOR_DV'), (3, 'NIT_VENDEDOR_FORMATO'), (4, 'NIT_VENDEDOR_FORMATO')]
+
+
+def test_iva_accepts_only_colombian_rates():
+    df = pd.DataFrame({'% IVA PRODUCTO': ['0', '5', '19', '19.0', 19, '16', '19%', 'IVA', '', None]})
+    assert reglas(df) == [(fila, 'IVA') for fila in range(6, 11)]
+
+
+@pytest.mark.parametrize('cantidad, valor_unitario, total, descuadre', [
+    ('3', '100', '300', False),
+    ('3', '100', '304', False),      # 1% de 300 + 1 peso de redondeo
+    ('3', '100', '296', False),
+    ('3', '100', '305', True),
+    ('3', '100', '295', True),
+    ('1', '0.5', '1.5', False),      # montos pequeños: 1 peso de redondeo
+    ('1', '0.5', '2', True),
+    ('1000', '1000', '1010000', False),
+    ('1000', '1000', '1010002', True),
+    ('0', '100', '0', False),
+    ('3', '100', 'N/A', False),      # TOTAL no numérico: no se compara
+    ('X', '100', '300', False),
+])
+def test_total_tolerance(cantidad, valor_unitario, total, descuadre):
+    df = pd.DataFrame({'CANTIDAD': [cantidad], 'VALOR UNITARIO': [valor_unitario], 'TOTAL': [total]})
+    assert ((1, 'TOTAL') in reglas(df)) is descuadre
+
+
+def test_rows_continue_across_chunks():
+    df = pd.DataFrame({'% IVA PRODUCTO': ['19', '16']}, index=pd.RangeIndex(50_000, 50_002))
+    assert reglas(df) == [(50_002, 'IVA')]
@@ -0,0 +1,274 @@
+# backend/validation.py
+"""
+Motor de validación por filas para registros de facturación.
+
+Las reglas se evalúan por columna sobre arreglos pandas/NumPy (sin bucles
+Python por fila). El resultado es una tabla compacta de errores
+(fila, campo, severidad, regla, valor) que alimenta las escrituras a Firestore.
+
+Igual que file_processors, no depende de FastAPI ni de Firebase para poder
+ejecutarse en el pool de procesos.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+IVA_VALIDOS = (0, 5, 19)
+FORMATO_FECHA = '%d/%m/%Y'
+TOTAL_TOLERANCIA_RELATIVA = 0.01  # TOTAL ≈ CANTIDAD x VALOR UNITARIO (1%)
+TOTAL_TOLERANCIA_ABSOLUTA = 1.0   # Redondeo a pesos
+
+# Pesos DIAN del dígito de verificación, desde el dígito menos significativo
+NIT_PESOS = np.array([3, 7, 13, 17, 19, 23, 29, 37, 41, 43, 47, 53, 59, 67, 71], dtype=np.int64)
+NIT_MAX_DIGITOS = len(NIT_PESOS)
+NIT_ANCHO = NIT_MAX_DIGITOS + 3  # cuerpo + '-' + DV + 1 carácter para detectar valores truncados
+
+# Encabezados aceptados por campo (CSV/Excel y Plantilla 51 usan 'NIT USUARIO', TXT 'NIT COMPRADOR')
+COLUMNAS_ALIAS = {
+    'NIT_VENDEDOR': ('NIT VENDEDOR',),
+    'NIT_COMPRADOR': ('NIT COMPRADOR', 'NIT USUARIO', 'NIT USUARIO (CLIENTE DEL CLIENTE)'),
+    'NOMBRE_VENDEDOR': ('NOMBRE VENDEDOR',),
+    'NOMBRE_COMPRADOR': ('NOMBRE COMPRADOR', 'NOMBRE USUARIO', 'NOMBRE USUARIO (CLIENTE DEL CLIENTE)'),
+    'FECHA': ('FECHA',),
+    'CANTIDAD': ('CANTIDAD',),
+    'VALOR UNITARIO': ('VALOR UNITARIO',),
+    'TOTAL': ('TOTAL',),
+    '% IVA PRODUCTO': ('% IVA PRODUCTO', '% IVA'),
+}
+
+# regla -> (campo, severidad, plantilla del mensaje, genera excepción DIAN)
+REGLAS = {
+    'NIT_VENDEDOR_FORMATO': ('NIT_VENDEDOR', 'ERROR', "Fila {fila}: NIT vendedor con formato inválido ('{valor}')", True),
+    'NIT_VENDEDOR_DV': ('NIT_VENDEDOR', 'ERROR', "Fila {fila}: Dígito de verificación del NIT vendedor no corresponde ('{valor}')", True),
+    'NIT_COMPRADOR_FORMATO': ('NIT_COMPRADOR', 'ERROR', "Fila {fila}: NIT comprador con formato inválido ('{valor}')", True),
+    'NIT_COMPRADOR_DV': ('NIT_COMPRADOR', 'ERROR', "Fila {fila}: Dígito de verificación del NIT comprador no corresponde ('{valor}')", True),
+    'IVA': ('% IVA PRODUCTO', 'ERROR', "Fila {fila}: IVA debe ser número entero (0, 19, 5). Valor actual inválido ('{valor}')", False),
+    'FECHA': ('FECHA', 'WARNING', "Fila {fila}: Fecha debe estar en formato DD/MM/AAAA ('{valor}')", False),
+    'CANTIDAD': ('CANTIDAD', 'ERROR', "Fila {fila}: CANTIDAD no es numérica ('{valor}')", False),
+    'VALOR_UNITARIO': ('VALOR UNITARIO', 'ERROR', "Fila {fila}: VALOR UNITARIO no es numérico ('{valor}')", False),
+    'TOTAL': ('TOTAL', 'WARNING', "Fila {fila}: TOTAL ({valor}) no coincide con CANTIDAD x VALOR UNITARIO", False),
+}
+
+_CAMPOS = pd.CategoricalDtype(sorted({r[0] for r in REGLAS.values()}))
+_SEVERIDADES = pd.CategoricalDtype(['ERROR', 'WARNING'])
+_REGLAS = pd.CategoricalDtype(list(REGLAS))
+# Campo y severidad de cada regla, indexados por el código categórico de la regla
+_CAMPO_POR_REGLA = np.array([_CAMPOS.categories.get_loc(r[0]) for r in REGLAS.values()], dtype=np.int8)
+_SEVERIDAD_POR_REGLA = np.array([_SEVERIDADES.categories.get_loc(r[1]) for r in REGLAS.values()], dtype=np.int8)
+
+Columna = Tuple[np.ndarray, np.ndarray]  # (códigos por fila, valores distintos)
+
+
+def tabla_vacia() -> pd.DataFrame:
+    """Tabla de errores sin filas, con los mismos tipos que la de validar_registros"""
+    return pd.DataFrame({
+        'fila': np.empty(0, dtype=np.int64),
+        'campo': pd.Categorical([], dtype=_CAMPOS),
+        'severidad': pd.Categorical([], dtype=_SEVERIDADES),
+        'regla': pd.Categorical([], dtype=_REGLAS),
+        'valor': np.empty(0, dtype=object),
+        'nombre': np.empty(0, dtype=object),
+    })
+
+def resolver_columnas(columnas) -> Dict[str, str]:
+    """Mapea cada campo validado a la columna real del archivo (sin distinguir mayúsculas)"""
+    normalizadas = {str(c).strip().upper(): c for c in columnas}
+    resueltas = {}
+    for campo, alias in COLUMNAS_ALIAS.items():
+        for nombre in alias:
+            if nombre in normalizadas:
+                resueltas[campo] = normalizadas[nombre]
+                break
+    return resueltas
+
+def _factorizar(serie: pd.Series) -> Columna:
+    """
+    Códigos por fila y valores distintos como texto sin espacios.
+
+    Las reglas se evalúan sobre los valores distintos (fechas, tarifas, NITs y
+    precios se repiten mucho) y se expanden a las filas indexando con los códigos.
+    El último elemento de los únicos es '' y corresponde a las celdas nulas (código -1).
+    """
+    # np.asarray sobre el array de pandas evita la copia con reemplazo de nulos de to_numpy
+    codigos, unicos = pd.factorize(np.asarray(serie.array, dtype=object))
+    unicos = pd.Series(unicos, dtype=object)
+    if pd.api.types.infer_dtype(unicos, skipna=True) not in ('string', 'empty'):
+        # Excel (dtype=object) entrega las celdas de fecha como datetime
+        unicos = unicos.map(lambda v: v.strftime(FORMATO_FECHA) if isinstance(v, datetime) else v)
+    textos = unicos.astype(str).str.strip().to_numpy(dtype=object)
+    return codigos, np.append(textos, '')
+
+def validar_nit(valores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Verifica NITs con o sin dígito de verificación ('900123456' o '900123456-7').
+
+    Devuelve dos máscaras: formato inválido y dígito de verificación incorrecto.
+    Los caracteres se procesan como una matriz de códigos UCS-4 (n x NIT_ANCHO).
+    """
+    n = len(valores)
+    if n == 0:
+        vacio = np.zeros(0, dtype=bool)
+        return vacio, vacio
+
+    codigos = np.asarray(valores, dtype=f'U{NIT_ANCHO}').view(np.int32).reshape(n, NIT_ANCHO)
+    filas = np.arange(n)
+    posiciones = np.arange(NIT_ANCHO)
+
+    longitud = np.count_nonzero(codigos, axis=1)
+    digitos = codigos - 48
+    es_digito = (digitos >= 0) & (digitos <= 9)
+    es_guion = codigos == 45
+    guiones = es_guion.sum(axis=1)
+
+    # Un solo guion, y únicamente antes del último carácter
+    con_dv = (guiones == 1) & es_guion[filas, np.maximum(longitud - 2, 0)]
+    cuerpo = np.where(con_dv, longitud - 2, longitud)
+    caracteres_validos = (es_digito | es_guion | (posiciones >= longitud[:, None])).all(axis=1)
+    formato_valido = (
+        caracteres_validos
+        & ((guiones == 0) | con_dv)
+        & (cuerpo >= 1) & (cuerpo <= NIT_MAX_DIGITOS)
+    )
+
+    # Peso de cada posición según su distancia al final del cuerpo
+    desde_derecha = cuerpo[:, None] - 1 - posiciones
+    pesos = np.where(desde_derecha >= 0, NIT_PESOS[np.clip(desde_derecha, 0, NIT_MAX_DIGITOS - 1)], 0)
+    suma = (np.where(es_digito, digitos, 0) * pesos).sum(axis=1)
+    residuo = suma % 11
+    esperado = np.where(residuo > 1, 11 - residuo, residuo)
+    dv = digitos[filas, np.maximum(longitud - 1, 0)]
+
+    return ~formato_valido, formato_valido & con_dv & (dv != esperado)
+
+def digito_verificacion(nit: str) -> int:
+    """Dígito de verificación DIAN de un NIT sin DV (utilidad para datos de prueba)"""
+    suma = sum(int(d) * p for d, p in zip(reversed(nit), NIT_PESOS))
+    residuo = suma % 11
+    return 11 - residuo if residuo > 1 else residuo
+
+def validar_registros(df: pd.DataFrame, columnas: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Aplica todas las reglas a un bloque de registros.
+
+    El número de fila reportado es el índice del DataFrame + 1, de modo que los
+    bloques de un mismo archivo se numeran de forma continua. Las reglas cuyas
+    columnas no existen en el archivo se omiten.
+    """
+    columnas = columnas if columnas is not None else resolver_columnas(df.columns)
+    if df.empty:
+        return tabla_vacia()
+
+    fila_base = df.index.to_numpy(dtype=np.int64) + 1
+    # (regla, máscara por fila, columna factorizada del valor, columna factorizada del nombre)
+    hallazgos: List[Tuple[str, np.ndarray, Columna, Optional[Columna]]] = []
+
+    for tipo in ('VENDEDOR', 'COMPRADOR'):
+        col = columnas.get(f'NIT_{tipo}')
+        if col is None:
+            continue
+        codigos, nits = nit = _factorizar(df[col])
+        formato_invalido, dv_invalido = validar_nit(nits)
+        col_nombre = columnas.get(f'NOMBRE_{tipo}')
+        nombre = _factorizar(df[col_nombre]) if col_nombre is not None else None
+        hallazgos.append((f'NIT_{tipo}_FORMATO', formato_invalido[codigos], nit, nombre))
+        hallazgos.append((f'NIT_{tipo}_DV', dv_invalido[codigos], nit, nombre))
+
+    if '% IVA PRODUCTO' in columnas:
+        codigos, unicos = iva = _factorizar(df[columnas['% IVA PRODUCTO']])
+        invalidos = ~np.isin(pd.to_numeric(unicos, errors='coerce'), IVA_VALIDOS)
+        hallazgos.append(('IVA', invalidos[codigos], iva, None))
+
+    if 'FECHA' in columnas:
+        serie = df[columnas['FECHA']]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            # Excel entrega fechas ya tipadas: solo las vacías son inválidas
+            fecha = (np.arange(len(serie)), serie.astype(str).to_numpy(dtype=object))
+            hallazgos.append(('FECHA', serie.isna().to_numpy(), fecha, None))
+        else:
+            codigos, unicos = fecha = _factorizar(serie)
+            invalidas = pd.to_datetime(unicos, format=FORMATO_FECHA, errors='coerce').isna()
+            hallazgos.append(('FECHA', invalidas[codigos], fecha, None))
+
+    numericos = {}
+    for campo, regla in (('CANTIDAD', 'CANTIDAD'), ('VALOR UNITARIO', 'VALOR_UNITARIO'), ('TOTAL', None)):
+        if campo not in columnas:
+            continue
+        codigos, unicos = columna = _factorizar(df[columnas[campo]])
+        numericos[campo] = (pd.to_numeric(unicos, errors='coerce').astype(float)[codigos], columna)
+        if regla is not None:
+            hallazgos.append((regla, np.isnan(numericos[campo][0]), columna, None))
+
+    if len(numericos) == 3:
+        total, columna_total = numericos['TOTAL']
+        calculado = numericos['CANTIDAD'][0] * numericos['VALOR UNITARIO'][0]
+        # Solo se compara cuando los tres valores son numéricos
+        descuadre = ~np.isclose(total, calculado, rtol=TOTAL_TOLERANCIA_RELATIVA,
+                                atol=TOTAL_TOLERANCIA_ABSOLUTA) & np.isfinite(total) & np.isfinite(calculado)
+        hallazgos.append(('TOTAL', descuadre, columna_total, None))
+
+    # Los valores solo se materializan para las filas con error
+    filas, reglas, valores, nombres = [], [], [], []
+    for regla, mascara, (codigos, unicos), nombre in hallazgos:
+        idx = np.flatnonzero(mascara)
+        if idx.size == 0:
+            continue
+        filas.append(fila_base[idx])
+        reglas.append(np.full(idx.size, _REGLAS.categories.get_loc(regla), dtype=np.int8))
+        valores.append(unicos[codigos[idx]])
+        nombres.append(nombre[1][nombre[0][idx]] if nombre is not None else np.full(idx.size, None, dtype=object))
+    if not filas:
+        return tabla_vacia()
+
+    filas = np.concatenate(filas)
+    orden = np.argsort(filas, kind='stable')
+    codigos_regla = np.concatenate(reglas)[orden]
+    return pd.DataFrame({
+        'fila': filas[orden],
+        'campo': pd.Categorical.from_codes(_CAMPO_POR_REGLA[codigos_regla], dtype=_CAMPOS),
+        'severidad': pd.Categorical.from_codes(_SEVERIDAD_POR_REGLA[codigos_regla], dtype=_SEVERIDADES),
+        'regla': pd.Categorical.from_codes(codigos_regla, dtype=_REGLAS),
+        'valor': np.concatenate(valores)[orden],
+        'nombre': pd.Series(np.concatenate(nombres)[orden], dtype=object),
+    })
+
+def resumen_errores(tabla: pd.DataFrame) -> Dict[str, int]:
+    """Conteo de errores por regla"""
+    conteo = tabla['regla'].value_counts()
+    return {str(regla): int(n) for regla, n in conteo.items() if n}
+
+def documentos_error(tabla: pd.DataFrame) -> List[Dict]:
+    """Convierte la tabla en documentos para firebase_service.add_errors_bulk"""
+    documentos = []
+    for fila, regla, valor in zip(tabla['fila'].tolist(), tabla['regla'].tolist(), tabla['valor'].tolist()):
+        campo, severidad, plantilla, _ = REGLAS[regla]
+        documentos.append({
+            "fila": fila,
+            "campo": campo,
+            "mensaje": plantilla.format(fila=fila, valor=valor),
+            "severidad": severidad
+        })
+    return documentos
+
+def documentos_excepcion(tabla: pd.DataFrame, lote_id: str, cliente: Optional[str] = None) -> List[Dict]:
+    """Excepciones DIAN pendientes para los NIT inválidos de la tabla"""
+    reglas_nit = [regla for regla, definicion in REGLAS.items() if definicion[3]]
+    nits = tabla[tabla['regla'].isin(reglas_nit)]
+    excepciones = []
+    for fila, regla, valor, nombre in zip(nits['fila'].tolist(), nits['regla'].tolist(),
+                                          nits['valor'].tolist(), nits['nombre'].tolist()):
+        tipo_tercero = "vendedor" if regla.startswith('NIT_VENDEDOR') else "comprador"
+        motivo = "formato inválido" if regla.endswith('FORMATO') else "dígito de verificación incorrecto"
+        excepciones.append({
+            "loteId": lote_id,
+            "cliente": cliente,
+            "filaOrigen": fila,
+            "documento": valor,
+            "nombreReportado": nombre or "",
+            "estadoValidacion": "Inconsistente",
+            "estadoGestion": "Pendiente",
+            "notas": f"Error en validación de NIT {tipo_tercero}: {motivo}",
+            "tipoTercero": tipo_tercero
+        })
+    return excepciones
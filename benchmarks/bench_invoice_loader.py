@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark: load a synthetic invoice CSV into facturas/items_factura.
+
+Builds a temporary database (DatabaseSetup-like tables plus every migration,
+so the items_count triggers are part of the cost), a product catalog and a
+terceros table, then times read_invoice_file + load_invoices for a fresh lote
+and for reloading the same lote (idempotent replace).
+
+Usage:
+    python benchmarks/bench_invoice_loader.py [--lines 100000] [--lines-per-factura 5]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_loader import load_invoices, read_invoice_file
+from migrations import apply_migrations
+from product_matcher import ProductMatcher, generate_catalog
+from sqlite_pool import DEFAULT_PRAGMAS
+
+HEADERS = ['NOMBRE USUARIO', 'NIT USUARIO', 'CIUDAD', 'FACT NRO', 'FECHA', 'FORMA DE PAGO', 'PRODUCTO',
+           'PRESENTACION', 'CANTIDAD', 'VALOR UNITARIO', 'TOTAL', '% IVA PRODUCTO']
+
+
+def create_database(path: str, catalog, nits):
+    conn = sqlite3.connect(path)
+    for name, value in DEFAULT_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    conn.executescript('''
+        CREATE TABLE lotes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre_archivo TEXT, tipo_archivo TEXT,
+            fecha_carga TEXT DEFAULT CURRENT_TIMESTAMP,
+            estado TEXT, total_facturas INTEGER DEFAULT 0, facturas_procesadas INTEGER DEFAULT 0,
+            errores_productos INTEGER DEFAULT 0, errores_terceros INTEGER DEFAULT 0
+        );
+        CREATE TABLE facturas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, lote_id INTEGER REFERENCES lotes(id),
+            numero_factura TEXT, nit_tercero TEXT REFERENCES terceros(nit), fecha TEXT,
+            forma_pago TEXT, total REAL, tercero_valido INTEGER
+        );
+        CREATE TABLE items_factura (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, factura_id INTEGER REFERENCES facturas(id),
+            producto TEXT, codigo_bmc TEXT REFERENCES productos_bmc(codigo_bmc),
+            cantidad REAL, valor_unitario REAL, total REAL, iva REAL
+        );
+        CREATE TABLE terceros (
+            nit TEXT PRIMARY KEY, razon_social TEXT, tipo_tercero TEXT, ciudad TEXT, estado_dian TEXT
+        );
+        CREATE TABLE productos_bmc (
+            codigo_bmc TEXT PRIMARY KEY, desc_subya TEXT, desc_caracteristica TEXT, grupo TEXT, activo INTEGER
+        );
+    ''')
+    conn.executemany('INSERT INTO productos_bmc VALUES (?, ?, ?, ?, 1)',
+                     [(p['codigo_bmc'], p['desc_subya'], p['desc_caracteristica'], p['grupo']) for p in catalog])
+    conn.executemany("INSERT INTO terceros VALUES (?, ?, 'CLIENTE', 'BOGOTA', 'ACTIVO')",
+                     [(nit, f'CLIENTE {nit}') for nit in nits])
+    conn.commit()
+    apply_migrations(conn)
+    return conn
+
+
+def write_csv(path: str, lines: int, lines_per_factura: int, catalog, nits, seed: int = 3):
+    """Invoice lines; ~2% unknown products and ~2% facturas for unregistered NITs"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(','.join(f'"{h}"' for h in HEADERS) + '\n')
+        for i in range(lines):
+            numero = i // lines_per_factura + 1
+            nit = nits[numero % len(nits)] if numero % 50 else '999999999'
+            product = catalog[rng.randrange(len(catalog))]
+            nombre = (f"{product['desc_subya']} {product['desc_caracteristica']}" if rng.random() > 0.02
+                      else f'PRODUCTO DESCONOCIDO {rng.randrange(500)}')
+            cantidad, valor = rng.randint(1, 50), rng.randint(500, 90000)
+            f.write(f'CLIENTE {nit},{nit},BOGOTA,{numero},2026-01-{numero % 28 + 1:02d},30,{nombre},UND,'
+                    f'{cantidad},{valor},{cantidad * valor},19\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--lines-per-factura', type=int, default=5)
+    parser.add_argument('--catalog-size', type=int, default=5000)
+    parser.add_argument('--terceros', type=int, default=2000)
+    args = parser.parse_args()
+
+    catalog = generate_catalog(args.catalog_size)
+    nits = [str(900000000 + i) for i in range(args.terceros)]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = create_database(os.path.join(tmp, 'bench.db'), catalog, nits)
+        csv_path = os.path.join(tmp, 'facturas.csv')
+        write_csv(csv_path, args.lines, args.lines_per_factura, catalog, nits)
+        lote_id = conn.execute("INSERT INTO lotes (nombre_archivo, tipo_archivo, estado) "
+                               "VALUES ('facturas.csv', 'CSV', 'PROCESANDO')").lastrowid
+        conn.commit()
+        matcher = ProductMatcher.from_sqlite(conn)
+
+        for run in ('load', 'reload'):
+            started = time.perf_counter()
+            df = read_invoice_file(csv_path, 'CSV')
+            parsed = time.perf_counter() - started
+            summary = load_invoices(conn, lote_id, df, matcher)
+            elapsed = time.perf_counter() - started
+            print(f"{run:6s} {args.lines} lines in {elapsed:.2f}s (parse {parsed:.2f}s, "
+                  f"resolve+write {elapsed - parsed:.2f}s) -> {args.lines / elapsed:,.0f} lines/s")
+        print(f"Lote: {summary}")
+
+        facturas, items = conn.execute('''
+            SELECT COUNT(*), COALESCE(SUM(items_count), 0) FROM facturas WHERE lote_id = ?
+        ''', (lote_id,)).fetchone()
+        stored_items = conn.execute('SELECT COUNT(*) FROM items_factura').fetchone()[0]
+        print(f"Stored: {facturas} facturas, {stored_items} items (items_count sum {items})")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
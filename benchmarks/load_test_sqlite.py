@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Load test: SQLite access in the Flask API, per-call connections vs SQLitePool.
+
+Mixed workload of reads (lote list and lote detail queries) and uploads
+(insert lote, mark PROCESANDO, parse, write results) from concurrent threads.
+
+Default mode runs the API's queries directly against a temporary database
+with both access layers:
+  legacy  sqlite3.connect() per call, rollback journal, connection held while parsing
+  pooled  SQLitePool (WAL, synchronous=NORMAL, busy_timeout, mmap, statement cache)
+
+--url runs the same mix over HTTP against a running app.py (start it once on
+the old commit and once on the new one to compare).
+
+Usage:
+    python benchmarks/load_test_sqlite.py [--threads 16] [--seconds 10] [--upload-ratio 0.1]
+    python benchmarks/load_test_sqlite.py --url http://localhost:8080 [--threads 16] [--seconds 10]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlite_pool import SQLitePool
+
+LOTES_SQL = '''
+    SELECT id, nombre_archivo, tipo_archivo, fecha_carga, estado,
+           total_facturas, facturas_procesadas, errores_productos, errores_terceros
+    FROM lotes
+    ORDER BY fecha_carga DESC
+    LIMIT 100
+'''
+DETAIL_SQL = '''
+    SELECT f.*, COUNT(i.id) as items_count
+    FROM facturas f
+    LEFT JOIN items_factura i ON f.id = i.factura_id
+    WHERE f.lote_id = ?
+    GROUP BY f.id
+'''
+
+def create_database(path: str, lotes: int, facturas_per_lote: int):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE lotes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre_archivo TEXT, tipo_archivo TEXT,
+            fecha_carga TEXT DEFAULT CURRENT_TIMESTAMP,
+            estado TEXT, total_facturas INTEGER DEFAULT 0, facturas_procesadas INTEGER DEFAULT 0,
+            errores_productos INTEGER DEFAULT 0, errores_terceros INTEGER DEFAULT 0
+        );
+        CREATE TABLE facturas (id INTEGER PRIMARY KEY, lote_id INTEGER, numero_factura TEXT, total REAL);
+        CREATE TABLE items_factura (id INTEGER PRIMARY KEY, factura_id INTEGER, cantidad REAL);
+        CREATE INDEX idx_facturas_lote ON facturas(lote_id);
+        CREATE INDEX idx_items_factura ON items_factura(factura_id);
+    ''')
+    conn.executemany('INSERT INTO lotes (nombre_archivo, tipo_archivo, estado) VALUES (?, ?, ?)',
+                     [(f'archivo_{i}.csv', 'CSV', 'COMPLETADO_EXITOSO') for i in range(lotes)])
+    conn.executemany('INSERT INTO facturas (lote_id, numero_factura, total) VALUES (?, ?, ?)',
+                     [(i % lotes + 1, f'F-{i}', 1000.0) for i in range(lotes * facturas_per_lote)])
+    conn.executemany('INSERT INTO items_factura (factura_id, cantidad) VALUES (?, ?)',
+                     [(i % (lotes * facturas_per_lote) + 1, 1.0) for i in range(lotes * facturas_per_lote * 3)])
+    conn.commit()
+    conn.close()
+
+class LegacyAccess:
+    """What app.py did before: a fresh connection per call, default journal mode"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def connection(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+def read(db, lotes: int):
+    conn = db.connection()
+    try:
+        conn.execute(LOTES_SQL).fetchall()
+        conn.execute(DETAIL_SQL, (random.randint(1, lotes),)).fetchall()
+    finally:
+        conn.close()
+
+def upload(db, parse_seconds: float, hold_while_parsing: bool):
+    conn = db.connection()
+    try:
+        cursor = conn.execute("INSERT INTO lotes (nombre_archivo, tipo_archivo, estado) VALUES (?, 'CSV', 'RECIBIDO')",
+                              (f'{uuid.uuid4().hex}.csv',))
+        lote_id = cursor.lastrowid
+        conn.commit()
+        conn.execute("UPDATE lotes SET estado = 'PROCESANDO' WHERE id = ?", (lote_id,))
+        conn.commit()
+        if not hold_while_parsing:
+            conn.close()
+        time.sleep(parse_seconds)  # pd.read_csv + product matching
+        if not hold_while_parsing:
+            conn = db.connection()
+        conn.execute('''
+            UPDATE lotes SET estado = 'COMPLETADO_EXITOSO', total_facturas = 100, facturas_procesadas = 100
+            WHERE id = ?
+        ''', (lote_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_load(worker, threads: int, seconds: float, upload_ratio: float):
+    latencies = {'read': [], 'upload': []}
+    errors = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def loop():
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            kind = 'upload' if rng.random() < upload_ratio else 'read'
+            started = time.perf_counter()
+            try:
+                worker(kind)
+            except Exception as e:
+                with lock:
+                    errors[str(e)[:60]] = errors.get(str(e)[:60], 0) + 1
+                continue
+            with lock:
+                latencies[kind].append(time.perf_counter() - started)
+
+    pool = [threading.Thread(target=loop) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors, time.perf_counter() - started
+
+def report(name: str, latencies, errors, elapsed: float):
+    total = sum(len(v) for v in latencies.values())
+    line = f"{name:8s} req/s={total / elapsed:8.1f}"
+    for kind, values in latencies.items():
+        values = sorted(values)
+        if values:
+            line += (f"  {kind}: n={len(values):6d} p50={values[len(values) // 2] * 1000:7.1f}ms"
+                     f" p95={values[int(len(values) * 0.95)] * 1000:7.1f}ms")
+    line += f"  errors={sum(errors.values())}"
+    print(line)
+    for message, count in errors.items():
+        print(f"           {count} x {message}")
+
+def run_direct(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('legacy', 'pooled'):
+            path = os.path.join(tmp, f'{name}.db')
+            create_database(path, args.lotes, args.facturas_per_lote)
+            if name == 'legacy':
+                db, hold = LegacyAccess(path), True
+            else:
+                db, hold = SQLitePool(path, max_connections=args.threads), False
+
+            def worker(kind):
+                if kind == 'read':
+                    read(db, args.lotes)
+                else:
+                    upload(db, args.parse_ms / 1000, hold)
+
+            report(name, *run_load(worker, args.threads, args.seconds, args.upload_ratio))
+
+def multipart(filename: str, content: bytes):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+               f'Content-Type: text/csv\r\n\r\n'.encode())
+    body.write(content)
+    body.write(f'\r\n--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+def run_http(args):
+    base = args.url.rstrip('/')
+    with urllib.request.urlopen(f'{base}/api/facturas/lotes') as response:
+        lote_ids = [lote['id'] for lote in json.load(response)] or [1]
+
+    def worker(kind):
+        if kind == 'read':
+            for url in (f'{base}/api/facturas/lotes', f'{base}/api/facturas/lotes/{random.choice(lote_ids)}'):
+                with urllib.request.urlopen(url) as response:
+                    response.read()
+            return
+        # Unique content every time so duplicate detection doesn't short-circuit the upload
+        rows = '\n'.join(f'F-{i},PAPA CRIOLLA,{i % 50 + 1}' for i in range(200))
+        body, content_type = multipart(f'{uuid.uuid4().hex}.csv', f'FACTURA,PRODUCTO,CANTIDAD\n{rows}\n'.encode())
+        request = urllib.request.Request(f'{base}/api/facturas/cargar', data=body, headers={'Content-Type': content_type})
+        with urllib.request.urlopen(request) as response:
+            response.read()
+
+    report('http', *run_load(worker, args.threads, args.seconds, args.upload_ratio))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--upload-ratio', type=float, default=0.1)
+    parser.add_argument('--parse-ms', type=float, default=50)
+    parser.add_argument('--lotes', type=int, default=2000)
+    parser.add_argument('--facturas-per-lote', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.url:
+        run_http(args)
+    else:
+        run_direct(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catalog Search
+==============
+
+Helpers for the paginated catalog endpoints (/api/productos, /api/terceros):
+- keyset pagination: the cursor holds the sort key of the last row, so every
+  page is an index seek (no OFFSET scans) and stays stable while rows change
+- FTS5 prefix search over the <table>_fts indexes created by migration 4
+- table versions (bumped by triggers) that identify a response for its ETag
+  without running the query
+"""
+
+import base64
+import json
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def encode_cursor(values: Sequence) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, size: int) -> List:
+    """Sort key from a cursor; ValueError when it was not produced by encode_cursor"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_predicate(columns: Sequence[str], values: Sequence):
+    """
+    SQL (and params) selecting rows that sort after `values` in ORDER BY `columns`.
+
+    Uses a row-value comparison, which SQLite turns into an index seek. Row
+    values never match NULL, so a key containing NULL (sorted first by SQLite)
+    is expanded column by column instead.
+    """
+    if all(v is not None for v in values):
+        placeholders = ', '.join('?' for _ in columns)
+        return f"({', '.join(columns)}) > ({placeholders})", list(values)
+
+    terms, params = [], []
+    for i, column in enumerate(columns):
+        equal = [f'{c} IS ?' for c in columns[:i]]
+        after = f'{column} IS NOT NULL' if values[i] is None else f'{column} > ?'
+        terms.append('(' + ' AND '.join(equal + [after]) + ')')
+        params.extend(values[:i])
+        if values[i] is not None:
+            params.append(values[i])
+    return '(' + ' OR '.join(terms) + ')', params
+
+
+def fts_match_query(text: str) -> Optional[str]:
+    """FTS5 MATCH expression: every word of `text` as a prefix ("arroz ext" -> "arroz"* "ext"*)"""
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def table_version(conn: sqlite3.Connection, table: str) -> int:
+    row = conn.execute('SELECT version FROM table_versions WHERE tabla = ?', (table,)).fetchone()
+    return row[0] if row is not None else 0
+
+
+def keyset_page(conn: sqlite3.Connection, select_sql: str, where: List[str], params: List,
+                order_columns: Sequence[str], cursor: Optional[str], limit: int) -> Dict:
+    """
+    One page of `select_sql` (which must select the order columns) filtered by
+    `where`, ordered by `order_columns` (the last one unique).
+
+    Returns {'items', 'next_cursor', 'has_more'}; raises ValueError for a bad cursor.
+    """
+    where, params = list(where), list(params)
+    if cursor:
+        predicate, cursor_params = keyset_predicate(order_columns, decode_cursor(cursor, len(order_columns)))
+        where.append(predicate)
+        params.extend(cursor_params)
+    sql = select_sql
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += f" ORDER BY {', '.join(order_columns)} LIMIT ?"
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+    items = [dict(row) for row in rows[:limit]]
+    has_more = len(rows) > limit
+    next_cursor = encode_cursor([items[-1][c] for c in order_columns]) if has_more else None
+    return {'items': items, 'next_cursor': next_cursor, 'has_more': has_more}
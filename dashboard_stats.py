@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard Statistics
+====================
+
+Reads and reconciles the materialized counters in the `estadisticas` table
+(created by migration 3). Triggers on lotes, terceros and productos_bmc keep
+the counters current, so the dashboard reads one small table instead of
+aggregating the source tables on every refresh. Reconciliation recomputes
+the counters from the source tables and fixes any drift (rows written with
+triggers disabled, restored backups, manual edits).
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict
+
+from migrations import STATISTICS_SOURCES
+
+LOTES_POR_FECHA_DAYS = 90  # Older per-day counters are dropped by reconciliation
+
+
+def read_statistics(conn: sqlite3.Connection) -> Dict[str, Dict]:
+    """{categoria: {clave: valor}}; '' keys (NULL in the source table) come back as None"""
+    stats: Dict[str, Dict] = {categoria: {} for categoria in STATISTICS_SOURCES}
+    for categoria, clave, valor in conn.execute('SELECT categoria, clave, valor FROM estadisticas WHERE valor != 0'):
+        stats.setdefault(categoria, {})[clave if clave != '' else None] = valor
+    return stats
+
+
+def _kept(key, cutoff: str) -> bool:
+    """Per-day lote counters older than the cutoff are dropped"""
+    return not (key[0] == 'lotes_por_fecha' and key[1] < cutoff)
+
+
+def reconcile_statistics(conn: sqlite3.Connection) -> int:
+    """Recompute every counter from the source tables; returns how many counters were wrong"""
+    cutoff = (datetime.utcnow() - timedelta(days=LOTES_POR_FECHA_DAYS)).strftime('%Y-%m-%d')
+    if conn.in_transaction:
+        conn.commit()
+    # IMMEDIATE: no writer (and no trigger) can run between the recount and the rewrite
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        stored = {(c, k): v for c, k, v in conn.execute('SELECT categoria, clave, valor FROM estadisticas')}
+        actual = {}
+        for sql in STATISTICS_SOURCES.values():
+            for categoria, clave, valor in conn.execute(sql):
+                actual[(categoria, clave)] = valor
+        actual = {key: valor for key, valor in actual.items() if _kept(key, cutoff)}
+        drift = sum(
+            1 for key in stored.keys() | actual.keys()
+            if _kept(key, cutoff) and stored.get(key, 0) != actual.get(key, 0)
+        )
+        conn.execute('DELETE FROM estadisticas')
+        conn.executemany('INSERT INTO estadisticas (categoria, clave, valor) VALUES (?, ?, ?)',
+                         [(categoria, clave, valor) for (categoria, clave), valor in actual.items()])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return drift
+
+
+def start_reconciler(connect: Callable[[], sqlite3.Connection], interval_seconds: float) -> threading.Event:
+    """Run reconcile_statistics every interval in a daemon thread; set() the event to stop it"""
+    stop = threading.Event()
+
+    def _loop():
+        while not stop.wait(interval_seconds):
+            conn = connect()
+            try:
+                drift = reconcile_statistics(conn)
+                if drift:
+                    print(f"Statistics reconciliation corrected {drift} counters")
+            except Exception as e:
+                print(f"Statistics reconciliation error: {e}")
+            finally:
+                conn.close()
+
+    threading.Thread(target=_loop, name='statistics-reconciler', daemon=True).start()
+    return stop
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DIAN Validation Client
+======================
+
+Async client for NIT validation against the DIAN with:
+- pluggable backends (simulated, HTTP; a local stub server is included for tests)
+- bounded concurrency and token-bucket rate limiting
+- retry with exponential backoff for transient failures
+- in-flight coalescing: concurrent requests for the same NIT share one upstream call
+
+The client runs its own event loop in a background thread so that sync Flask
+workers can share coalescing, rate limits and the concurrency pool.
+
+Run a local stub server:
+    python dian_client.py --stub-server 8099
+"""
+
+import asyncio
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Iterable, List, Optional
+
+ESTADOS_DIAN = ['ACTIVO', 'INACTIVO', 'NO_ENCONTRADO']
+
+
+class DianTransientError(Exception):
+    """Temporary upstream failure (timeout, 429, 5xx): safe to retry"""
+
+
+class DianError(Exception):
+    """Permanent upstream failure"""
+
+
+class SimulatedDianBackend:
+    """Simulated DIAN service (random result after a fixed delay)"""
+
+    def __init__(self, delay: float = 1.0):
+        self.delay = delay
+
+    async def consultar(self, nit: str) -> Dict:
+        await asyncio.sleep(self.delay)
+        return {'nit': nit, 'estado_dian': random.choice(ESTADOS_DIAN)}
+
+
+class HttpDianBackend:
+    """HTTP backend: GET {base_url}/nit/{nit} -> {"estado_dian": ...}"""
+
+    def __init__(self, base_url: str, timeout: float = 10.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, nit: str) -> Dict:
+        url = f"{self.base_url}/nit/{nit}"
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                data = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return {'nit': nit, 'estado_dian': 'NO_ENCONTRADO'}
+            if e.code == 429 or e.code >= 500:
+                raise DianTransientError(f"DIAN respondió {e.code}") from e
+            raise DianError(f"DIAN respondió {e.code}") from e
+        except (http.client.HTTPException, OSError) as e:
+            # URLError, timeouts, resets and malformed responses
+            raise DianTransientError(str(e)) from e
+        return {'nit': nit, 'estado_dian': data.get('estado_dian', 'NO_ENCONTRADO')}
+
+    async def consultar(self, nit: str) -> Dict:
+        # urllib is blocking; run it in the default executor
+        return await asyncio.get_running_loop().run_in_executor(None, self._get, nit)
+
+
+class TokenBucket:
+    """Token bucket: `rate` tokens per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DianClient:
+    """Concurrent, rate-limited DIAN client with retries and in-flight coalescing"""
+
+    def __init__(self, backend, max_concurrency: int = 10, rate_per_second: float = 5.0,
+                 burst: Optional[float] = None, max_retries: int = 3, backoff_base: float = 0.5):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.stats = {'solicitudes': 0, 'llamadasUpstream': 0, 'coalescidas': 0, 'reintentos': 0, 'fallidas': 0}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    # Background loop (shared by all Flask worker threads)
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def _run():
+                    asyncio.set_event_loop(loop)
+                    # Primitives are created inside the loop that will use them
+                    self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                    self._bucket = TokenBucket(self.rate_per_second, self.burst)
+                    ready.set()
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=_run, name='dian-client', daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+        return self._loop
+
+    async def _call_upstream(self, nit: str) -> Dict:
+        for intento in range(self.max_retries + 1):
+            async with self._semaphore:
+                await self._bucket.acquire()
+                self.stats['llamadasUpstream'] += 1
+                try:
+                    return await self.backend.consultar(nit)
+                except DianTransientError:
+                    if intento == self.max_retries:
+                        raise
+            self.stats['reintentos'] += 1
+            # Exponential backoff with jitter, outside the concurrency slot
+            await asyncio.sleep(self.backoff_base * (2 ** intento) * (0.5 + random.random()))
+
+    async def validar(self, nit: str) -> Dict:
+        """Validate one NIT; concurrent calls for the same NIT share the upstream request"""
+        self.stats['solicitudes'] += 1
+        future = self._inflight.get(nit)
+        if future is not None:
+            self.stats['coalescidas'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(self._call_upstream(nit))
+        self._inflight[nit] = future
+        future.add_done_callback(lambda _: self._inflight.pop(nit, None))
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            self.stats['fallidas'] += 1
+            raise
+
+    async def validar_muchos(self, nits: Iterable[str]) -> Dict[str, Dict]:
+        """Validate many NITs in parallel; failures are reported per NIT"""
+        unicos = list(dict.fromkeys(nits))
+        respuestas = await asyncio.gather(*(self.validar(nit) for nit in unicos), return_exceptions=True)
+        resultados = {}
+        for nit, respuesta in zip(unicos, respuestas):
+            if isinstance(respuesta, Exception):
+                resultados[nit] = {'nit': nit, 'error': str(respuesta)}
+            else:
+                resultados[nit] = respuesta
+        return resultados
+
+    # Sync wrappers for Flask routes
+    def validar_sync(self, nit: str) -> Dict:
+        return asyncio.run_coroutine_threadsafe(self.validar(nit), self._ensure_loop()).result()
+
+    def validar_muchos_sync(self, nits: List[str]) -> Dict[str, Dict]:
+        return asyncio.run_coroutine_threadsafe(self.validar_muchos(nits), self._ensure_loop()).result()
+
+
+def create_dian_client_from_env() -> DianClient:
+    """Build the client from DIAN_* environment variables"""
+    api_url = os.getenv('DIAN_API_URL')
+    if api_url:
+        backend = HttpDianBackend(api_url, timeout=float(os.getenv('DIAN_TIMEOUT', 10)))
+    else:
+        backend = SimulatedDianBackend(delay=float(os.getenv('DIAN_SIMULATED_DELAY', 1.0)))
+    return DianClient(
+        backend,
+        max_concurrency=int(os.getenv('DIAN_MAX_CONCURRENCY', 10)),
+        rate_per_second=float(os.getenv('DIAN_RATE_PER_SECOND', 5)),
+        burst=float(os.getenv('DIAN_RATE_BURST', 10)),
+        max_retries=int(os.getenv('DIAN_MAX_RETRIES', 3)),
+    )
+
+
+def run_stub_server(port: int, failure_rate: float = 0.1, delay: float = 0.05):
+    """Local DIAN stub for tests: deterministic estado per NIT, random transient 503s"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            partes = self.path.strip('/').split('/')
+            if len(partes) != 2 or partes[0] != 'nit':
+                self.send_error(404)
+                return
+            time.sleep(delay)
+            if random.random() < failure_rate:
+                self.send_error(503)
+                return
+            nit = partes[1]
+            body = json.dumps({'nit': nit, 'estado_dian': ESTADOS_DIAN[sum(map(ord, nit)) % len(ESTADOS_DIAN)]})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body.encode('utf-8'))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    print(f"DIAN stub server listening on http://127.0.0.1:{port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='DIAN validation client utilities')
+    parser.add_argument('--stub-server', type=int, metavar='PORT', help='Run a local DIAN stub server')
+    args = parser.parse_args()
+    if args.stub_server:
+        run_stub_server(args.stub_server)
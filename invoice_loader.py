@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Invoice Loader
+==============
+
+Writes the invoice lines of an uploaded file into facturas/items_factura:
+- lines are grouped into facturas by invoice number in memory
+- tercero and product foreign keys are resolved through dicts built once per
+  load (one SELECT over terceros, one ProductMatcher.match_many over the
+  distinct product names), never with per-row queries
+- facturas are inserted one by one so SQLite assigns their ids (lastrowid)
+  inside the transaction; items, the bulk of the rows, go in one executemany
+- the whole lote is replaced in one BEGIN IMMEDIATE transaction (previous
+  facturas and items deleted, new rows and lote counters written), so
+  reprocessing a lote is idempotent and readers never see half a load
+
+The facturas/items_factura schema comes from DatabaseSetup; a field is
+written only when its column exists in the table.
+
+CSV and TXT files are decoded with the backend's encoding detection (utf-8
+when the whole file is valid utf-8, latin-1 otherwise) and TXT layouts
+(header after title lines, tab/pipe/comma/multi-space columns) are read with
+the backend's TXT parser, so both loaders accept the same files.
+
+Benchmark: python benchmarks/bench_invoice_loader.py --lines 100000
+"""
+
+import math
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from backend.file_processors import TXT_EXPECTED_COLUMNS, detect_txt_layout, iter_txt_records, sniff_encoding
+
+# Column -> file headers it is read from (first header present wins)
+FACTURA_FIELDS = {
+    'numero_factura': ('FACT NRO', 'FACTURA', 'NUMERO FACTURA'),
+    'prefijo': ('PREFIJO',),
+    'nit_tercero': ('NIT USUARIO', 'NIT COMPRADOR', 'NIT'),
+    'nombre_tercero': ('NOMBRE USUARIO', 'NOMBRE COMPRADOR'),
+    'ciudad': ('CIUDAD', 'CIUDAD DE ENTREGA DEL PRODUCTO'),
+    'fecha': ('FECHA',),
+    'forma_pago': ('FORMA DE PAGO', 'FORMA DE PAGO(#DIAS)'),
+}
+ITEM_FIELDS = {
+    'producto': ('PRODUCTO',),
+    'presentacion': ('PRESENTACION', 'UNIDAD'),
+    'cantidad': ('CANTIDAD',),
+    'valor_unitario': ('VALOR UNITARIO',),
+    'total': ('TOTAL',),
+    'iva': ('% IVA PRODUCTO',),
+}
+NUMERIC_FIELDS = {'cantidad', 'valor_unitario', 'total', 'iva'}
+# Written by the loader itself rather than read from the file
+FACTURA_DERIVED = ('tercero_valido', 'total', 'items_count')
+ITEM_DERIVED = ('codigo_bmc',)
+
+_NIT_RE = re.compile(r'[^0-9A-Z]')
+# Integer part grouped in thousands ('1.234', '1,234,567'), optionally followed
+# by a decimal part with the other separator ('1.234,56', '1,234.56')
+_GROUPED_AMOUNT_RE = re.compile(r'[+-]?[1-9]\d{0,2}([.,])\d{3}(?:\1\d{3})*(?:(?!\1)[.,]\d+)?')
+
+
+def normalize_nit(nit) -> str:
+    """NIT without separators or verification digit ('900.123.456-7' -> '900123456')"""
+    if nit is None:
+        return ''
+    return _NIT_RE.sub('', str(nit).upper().split('-')[0])
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """
+    Number written with either decimal convention, None when it is not a number.
+
+    '1.234,56' and '1,234.56' -> 1234.56; a separator that repeats or groups
+    exactly three digits after a 1-3 digit integer part is a thousands
+    separator ('1.234' -> 1234, '1,234,567' -> 1234567); any other single
+    separator is the decimal point ('12,5' -> 12.5, '0.250' -> 0.25).
+    """
+    value = text.replace(' ', '').replace('$', '')
+    grouped = _GROUPED_AMOUNT_RE.fullmatch(value)
+    if grouped:
+        value = value.replace(grouped.group(1), '')
+    elif value.count('.') + value.count(',') > 1:
+        return None
+    try:
+        number = float(value.replace(',', '.'))
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def read_invoice_file(path: str, file_type: str) -> pd.DataFrame:
+    """
+    Raw lines of an uploaded CSV/TXT/EXCEL file, every cell as text ('' when
+    empty) except numeric Excel cells, which keep their number.
+    """
+    if file_type == 'EXCEL':
+        df = pd.read_excel(path, dtype=object)
+    elif file_type == 'CSV':
+        df = pd.read_csv(path, dtype=str, keep_default_na=False, encoding=sniff_encoding(path))
+    elif file_type == 'TXT':
+        encoding = sniff_encoding(path)
+        layout = detect_txt_layout(path, encoding)
+        if not layout['separador']:
+            raise ValueError(f"Unrecognized TXT layout: {layout['estructura']}")
+        df = pd.DataFrame.from_records(iter_txt_records(path, encoding, layout), columns=TXT_EXPECTED_COLUMNS)
+    else:
+        raise ValueError(f"Unsupported file type for invoice loading: {file_type}")
+    df.columns = [str(c).strip().upper() for c in df.columns]
+    return df.fillna('')
+
+
+def _column(df: pd.DataFrame, headers: Sequence[str]) -> Optional[List]:
+    for header in headers:
+        if header in df.columns:
+            values = df[header].astype(str).str.strip()
+            return values.where(values != '', None).tolist()
+    return None
+
+
+def _numeric_column(df: pd.DataFrame, headers: Sequence[str]) -> Tuple[Optional[List], List[bool]]:
+    """Parsed values (None when empty or not a number) and, per line, whether a non-empty cell failed to parse"""
+    for header in headers:
+        if header in df.columns:
+            values = df[header].tolist()
+            # Parse each distinct text once; amounts repeat heavily across lines
+            parsed = {text: parse_amount(text) for text in set(values) if isinstance(text, str)}
+            numbers, invalid = [], []
+            for value in values:
+                if isinstance(value, str):
+                    number = parsed[value]
+                    invalid.append(number is None and value.strip() != '')
+                else:
+                    number = None if value is None or pd.isna(value) else float(value)
+                    invalid.append(False)
+                numbers.append(number)
+            return numbers, invalid
+    return None, [False] * len(df)
+
+
+def load_invoices(conn: sqlite3.Connection, lote_id: int, df: pd.DataFrame, matcher) -> Dict:
+    """
+    Replace the facturas of `lote_id` with the lines in `df` and update the
+    lote's counters and estado in the same transaction.
+
+    `matcher` is a ProductMatcher; lines whose product has no BMC match are
+    stored with codigo_bmc NULL. Returns the counters written to the lote.
+    """
+    rows = len(df)
+    fields = {name: _column(df, headers)
+              for name, headers in {**FACTURA_FIELDS, **ITEM_FIELDS}.items() if name not in NUMERIC_FIELDS}
+    # Lines with an amount that is present but unparseable are stored with NULL and reported as warnings
+    lineas_invalidas = [False] * rows
+    for name in NUMERIC_FIELDS:
+        fields[name], invalid = _numeric_column(df, ITEM_FIELDS[name])
+        lineas_invalidas = [a or b for a, b in zip(lineas_invalidas, invalid)]
+    valores_invalidos = sum(lineas_invalidas)
+    numeros = fields['numero_factura'] or [None] * rows
+    prefijos = fields['prefijo'] or [None] * rows
+
+    productos = fields['producto'] or [None] * rows
+    matches = matcher.match_many({p for p in productos if p is not None})
+    codigos = [matches[p]['codigo_bmc'] if p is not None else None for p in productos]
+
+    terceros = {normalize_nit(nit): nit for (nit,) in conn.execute('SELECT nit FROM terceros')}
+
+    factura_columns = [c for c in table_columns(conn, 'facturas')
+                       if c in FACTURA_FIELDS or c in FACTURA_DERIVED]
+    item_columns = [c for c in table_columns(conn, 'items_factura')
+                    if c in ITEM_FIELDS or c in ITEM_DERIVED]
+    item_values = {**{name: fields[name] for name in ITEM_FIELDS}, 'codigo_bmc': codigos}
+
+    # Group lines into facturas (first line supplies the header fields); a line without number is its own factura
+    facturas: Dict = {}
+    index_of_line = []
+    for i, (prefijo, numero) in enumerate(zip(prefijos, numeros)):
+        key = (prefijo, numero) if numero is not None else i
+        factura = facturas.get(key)
+        if factura is None:
+            factura = facturas[key] = {'line': i, 'total': 0.0, 'sin_producto': 0}
+        if codigos[i] is None:
+            factura['sin_producto'] += 1
+        index_of_line.append(factura)
+
+    totals = fields['total']
+    if totals is None and fields['cantidad'] is not None and fields['valor_unitario'] is not None:
+        totals = [c * v if c is not None and v is not None else None
+                  for c, v in zip(fields['cantidad'], fields['valor_unitario'])]
+    if totals is not None:
+        for factura, total in zip(index_of_line, totals):
+            if total is not None:
+                factura['total'] += total
+
+    nits = fields['nit_tercero']
+    errores_terceros = 0
+    for factura in facturas.values():
+        raw = nits[factura['line']] if nits is not None else None
+        nit = terceros.get(normalize_nit(raw))
+        # Unregistered NITs are kept as reported so the factura can be fixed up later
+        factura['nit_tercero'] = nit if nit is not None else raw
+        factura['tercero_valido'] = 1 if nit is not None else 0
+        errores_terceros += 1 - factura['tercero_valido']
+
+    def factura_value(factura: Dict, column: str):
+        if column in ('nit_tercero', 'tercero_valido', 'total'):
+            return factura[column]
+        if column == 'items_count':
+            return 0  # Incremented by the items_factura insert trigger (migration 2)
+        values = fields[column]
+        return values[factura['line']] if values is not None else None
+
+    item_rows = [item_values[c] or [None] * rows for c in item_columns]
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM items_factura WHERE factura_id IN (SELECT id FROM facturas WHERE lote_id = ?)',
+                     (lote_id,))
+        conn.execute('DELETE FROM facturas WHERE lote_id = ?', (lote_id,))
+        # SQLite assigns the ids (AUTOINCREMENT never reuses those of deleted facturas)
+        cursor = conn.cursor()
+        insert_factura = (f"INSERT INTO facturas (lote_id{''.join(', ' + c for c in factura_columns)}) "
+                          f"VALUES (?{', ?' * len(factura_columns)})")
+        for factura in facturas.values():
+            cursor.execute(insert_factura, (lote_id, *(factura_value(factura, c) for c in factura_columns)))
+            factura['id'] = cursor.lastrowid
+        conn.executemany(
+            f"INSERT INTO items_factura (factura_id{''.join(', ' + c for c in item_columns)}) "
+            f"VALUES (?{', ?' * len(item_columns)})",
+            zip((factura['id'] for factura in index_of_line), *item_rows)
+        )
+
+        errores_productos = sum(1 for codigo in codigos if codigo is None)
+        facturas_procesadas = sum(1 for f in facturas.values() if f['tercero_valido'] and not f['sin_producto'])
+        if not facturas:
+            estado = 'ERROR_PROCESAMIENTO'  # Nothing readable in the file
+        elif facturas_procesadas == len(facturas) and not valores_invalidos:
+            estado = 'COMPLETADO_EXITOSO'
+        else:
+            estado = 'COMPLETADO_CON_ADVERTENCIAS'
+        summary = {
+            'estado': estado,
+            'total_facturas': len(facturas),
+            'facturas_procesadas': facturas_procesadas,
+            'errores_productos': errores_productos,
+            'errores_terceros': errores_terceros,
+            'valores_invalidos': valores_invalidos,
+            'lineas': rows,
+        }
+        conn.execute('''
+            UPDATE lotes
+            SET estado = ?, total_facturas = ?, facturas_procesadas = ?,
+                errores_productos = ?, errores_terceros = ?
+            WHERE id = ?
+        ''', (estado, len(facturas), facturas_procesadas, errores_productos, errores_terceros, lote_id))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return summary
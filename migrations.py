@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Schema Migrations
+=================
+
+Versioned changes on top of the schema created by DatabaseSetup. The
+applied version lives in SQLite's `PRAGMA user_version`; each migration runs
+in its own BEGIN IMMEDIATE transaction (DDL included), so a failed step
+leaves the previous version intact and concurrent starts apply it once.
+
+The query-plan checks assert that the API's hot queries use their indexes:
+
+    python migrations.py data/armorum_production.db          # apply pending migrations
+    python migrations.py data/armorum_production.db --check  # apply, then EXPLAIN QUERY PLAN checks
+"""
+
+import argparse
+import sqlite3
+import sys
+from typing import List, Tuple
+
+# Dashboard counters: categoria -> SELECT categoria, clave, COUNT(*) (used to backfill and reconcile)
+STATISTICS_SOURCES = {
+    'lotes_por_estado': "SELECT 'lotes_por_estado', COALESCE(estado, ''), COUNT(*) FROM lotes GROUP BY 2",
+    'lotes_por_fecha': "SELECT 'lotes_por_fecha', COALESCE(DATE(fecha_carga), ''), COUNT(*) FROM lotes GROUP BY 2",
+    'terceros_por_estado_dian': "SELECT 'terceros_por_estado_dian', COALESCE(estado_dian, ''), COUNT(*) FROM terceros GROUP BY 2",
+    'productos_por_categoria': "SELECT 'productos_por_categoria', COALESCE(grupo, ''), COUNT(*) FROM productos_bmc WHERE activo = 1 GROUP BY 2",
+}
+
+
+def _counter_triggers(table: str, categoria: str, *columns: str, key_sql: str = None,
+                      condition: str = '1') -> List[str]:
+    """
+    Insert/delete/update triggers that keep estadisticas(categoria, key) equal to
+    the number of `table` rows with that key (and matching `condition`).
+    """
+    key_sql = key_sql or f'{{row}}.{columns[0]}'
+
+    def add(row: str) -> str:
+        return f'''
+            INSERT INTO estadisticas (categoria, clave, valor)
+            SELECT '{categoria}', COALESCE({key_sql.format(row=row)}, ''), 1 WHERE {condition.format(row=row)}
+            ON CONFLICT(categoria, clave) DO UPDATE SET valor = valor + 1;'''
+
+    def remove(row: str) -> str:
+        return f'''
+            UPDATE estadisticas SET valor = valor - 1
+            WHERE categoria = '{categoria}' AND clave = COALESCE({key_sql.format(row=row)}, '')
+              AND {condition.format(row=row)};'''
+
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{categoria}_insert AFTER INSERT ON {table} BEGIN {add('NEW')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{categoria}_delete AFTER DELETE ON {table} BEGIN {remove('OLD')} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{categoria}_update AFTER UPDATE OF {', '.join(columns)} ON {table} "
+        f"BEGIN {remove('OLD')} {add('NEW')} END",
+    ]
+
+
+def _search_index(table: str, *columns: str) -> List[str]:
+    """External-content FTS5 table `<table>_fts` over `columns`, built and kept in sync by triggers"""
+    fts = f'{table}_fts'
+    cols = ', '.join(columns)
+
+    def values(row: str) -> str:
+        return ', '.join(f'{row}.{c}' for c in columns)
+
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (NEW.rowid, {values('NEW')});"
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', OLD.rowid, {values('OLD')});"
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {cols}, content='{table}', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {cols} ON {table} BEGIN {delete} {insert} END",
+    ]
+
+
+def _version_triggers(table: str) -> List[str]:
+    """Bump table_versions.<table> on every write (drives the ETags of the list endpoints)"""
+    bump = f"UPDATE table_versions SET version = version + 1 WHERE tabla = '{table}';"
+    return [f"INSERT OR IGNORE INTO table_versions (tabla, version) VALUES ('{table}', 1)"] + [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()} AFTER {event} ON {table} BEGIN {bump} END"
+        for event in ('INSERT', 'UPDATE', 'DELETE')
+    ]
+
+
+# (version, description, statements)
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, 'indexes for lote detail, lote list and statistics', [
+        'CREATE INDEX IF NOT EXISTS idx_facturas_lote_id ON facturas(lote_id)',
+        'CREATE INDEX IF NOT EXISTS idx_items_factura_factura_id ON items_factura(factura_id)',
+        'CREATE INDEX IF NOT EXISTS idx_lotes_fecha_carga ON lotes(fecha_carga)',
+        'CREATE INDEX IF NOT EXISTS idx_lotes_estado ON lotes(estado)',
+    ]),
+    (2, 'denormalized facturas.items_count maintained by triggers', [
+        'ALTER TABLE facturas ADD COLUMN items_count INTEGER NOT NULL DEFAULT 0',
+        '''
+        UPDATE facturas SET items_count = (
+            SELECT COUNT(*) FROM items_factura WHERE items_factura.factura_id = facturas.id
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_items_factura_insert AFTER INSERT ON items_factura
+        BEGIN
+            UPDATE facturas SET items_count = items_count + 1 WHERE id = NEW.factura_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_items_factura_delete AFTER DELETE ON items_factura
+        BEGIN
+            UPDATE facturas SET items_count = items_count - 1 WHERE id = OLD.factura_id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_items_factura_move AFTER UPDATE OF factura_id ON items_factura
+        WHEN OLD.factura_id IS NOT NEW.factura_id
+        BEGIN
+            UPDATE facturas SET items_count = items_count - 1 WHERE id = OLD.factura_id;
+            UPDATE facturas SET items_count = items_count + 1 WHERE id = NEW.factura_id;
+        END
+        ''',
+    ]),
+    (3, 'materialized dashboard counters (estadisticas) maintained by triggers', [
+        '''
+        CREATE TABLE IF NOT EXISTS estadisticas (
+            categoria TEXT NOT NULL,
+            clave TEXT NOT NULL,
+            valor INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (categoria, clave)
+        ) WITHOUT ROWID
+        ''',
+        *[f"INSERT INTO estadisticas (categoria, clave, valor) {sql}" for sql in STATISTICS_SOURCES.values()],
+        *_counter_triggers('lotes', 'lotes_por_estado', 'estado'),
+        *_counter_triggers('lotes', 'lotes_por_fecha', 'fecha_carga', key_sql='DATE({row}.fecha_carga)'),
+        *_counter_triggers('terceros', 'terceros_por_estado_dian', 'estado_dian'),
+        *_counter_triggers('productos_bmc', 'productos_por_categoria', 'grupo', 'activo',
+                           condition='{row}.activo = 1'),
+    ]),
+    (4, 'keyset indexes, FTS5 search and table versions for /api/productos and /api/terceros', [
+        'CREATE INDEX IF NOT EXISTS idx_productos_bmc_listado ON productos_bmc(activo, desc_subya, desc_caracteristica, codigo_bmc)',
+        'CREATE INDEX IF NOT EXISTS idx_productos_bmc_grupo ON productos_bmc(grupo, activo, desc_subya, desc_caracteristica, codigo_bmc)',
+        'CREATE INDEX IF NOT EXISTS idx_terceros_listado ON terceros(razon_social, nit)',
+        'CREATE INDEX IF NOT EXISTS idx_terceros_tipo ON terceros(tipo_tercero, razon_social, nit)',
+        'CREATE INDEX IF NOT EXISTS idx_terceros_estado_dian ON terceros(estado_dian, razon_social, nit)',
+        *_search_index('productos_bmc', 'desc_subya', 'desc_caracteristica'),
+        *_search_index('terceros', 'razon_social'),
+        'CREATE TABLE IF NOT EXISTS table_versions (tabla TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)',
+        *_version_triggers('productos_bmc'),
+        *_version_triggers('terceros'),
+    ]),
+    (5, 'content-hash index of processed uploads (duplicate detection)', [
+        '''CREATE TABLE IF NOT EXISTS file_hashes (
+            cliente TEXT NOT NULL DEFAULT '',
+            sha256 TEXT NOT NULL,
+            lote_id INTEGER NOT NULL REFERENCES lotes(id),
+            fecha_registro TEXT NOT NULL,
+            cargas_duplicadas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (cliente, sha256)
+        )''',
+    ]),
+    (6, 'local DIAN validation cache', [
+        '''CREATE TABLE IF NOT EXISTS dian_cache (
+            nit TEXT PRIMARY KEY,
+            estado_dian TEXT NOT NULL,
+            fecha_validacion TEXT NOT NULL
+        )''',
+    ]),
+]
+
+# (name, sql, params, index the plan must use); no check may sort through a temp B-tree
+QUERY_PLAN_CHECKS = [
+    ('lote list', '''
+        SELECT id, nombre_archivo, tipo_archivo, fecha_carga, estado,
+               total_facturas, facturas_procesadas, errores_productos, errores_terceros
+        FROM lotes
+        ORDER BY fecha_carga DESC
+    ''', (), 'idx_lotes_fecha_carga'),
+    ('lote detail facturas', '''
+        SELECT f.*
+        FROM facturas f
+        WHERE f.lote_id = ?
+        ORDER BY f.id
+    ''', (1,), 'idx_facturas_lote_id'),
+    ('items of a factura', '''
+        SELECT * FROM items_factura WHERE factura_id = ?
+    ''', (1,), 'idx_items_factura_factura_id'),
+    ('lotes by estado', '''
+        SELECT estado, COUNT(*) as count
+        FROM lotes
+        GROUP BY estado
+    ''', (), 'idx_lotes_estado'),
+    ('productos page', '''
+        SELECT codigo_bmc, desc_subya, desc_caracteristica, grupo, activo
+        FROM productos_bmc
+        WHERE activo = 1 AND (desc_subya, desc_caracteristica, codigo_bmc) > (?, ?, ?)
+        ORDER BY desc_subya, desc_caracteristica, codigo_bmc
+        LIMIT 101
+    ''', ('', '', ''), 'idx_productos_bmc_listado'),
+    ('productos page by grupo', '''
+        SELECT codigo_bmc, desc_subya, desc_caracteristica, grupo, activo
+        FROM productos_bmc
+        WHERE activo = 1 AND grupo = ? AND (desc_subya, desc_caracteristica, codigo_bmc) > (?, ?, ?)
+        ORDER BY desc_subya, desc_caracteristica, codigo_bmc
+        LIMIT 101
+    ''', ('', '', '', ''), 'idx_productos_bmc_grupo'),
+    ('terceros page by estado_dian', '''
+        SELECT nit, razon_social, tipo_tercero, ciudad, estado_dian
+        FROM terceros
+        WHERE estado_dian = ? AND (razon_social, nit) > (?, ?)
+        ORDER BY razon_social, nit
+        LIMIT 101
+    ''', ('', '', ''), 'idx_terceros_estado_dian'),
+    ('lotes loaded today', '''
+        SELECT COUNT(*) as count
+        FROM lotes
+        WHERE fecha_carga >= DATE('now') AND fecha_carga < DATE('now', '+1 day')
+    ''', (), 'idx_lotes_fecha_carga'),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations in order; returns the versions applied"""
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another process may have applied it while we waited for the write lock
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        print(f"Migration {version} applied: {description}")
+        applied.append(version)
+    return applied
+
+
+def query_plan(conn: sqlite3.Connection, sql: str, params=()) -> List[str]:
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+
+
+def check_query_plans(conn: sqlite3.Connection) -> List[str]:
+    """Failures (empty when every hot query uses its index without a temp B-tree)"""
+    failures = []
+    for name, sql, params, index in QUERY_PLAN_CHECKS:
+        plan = query_plan(conn, sql, params)
+        if not any(index in step for step in plan):
+            failures.append(f"{name}: does not use {index}: {plan}")
+        if any('TEMP B-TREE' in step for step in plan):
+            failures.append(f"{name}: sorts through a temp B-tree: {plan}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('db_path')
+    parser.add_argument('--check', action='store_true', help='Run the EXPLAIN QUERY PLAN checks')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db_path)
+    apply_migrations(conn)
+    print(f"Schema version: {schema_version(conn)}")
+    if args.check:
+        failures = check_query_plans(conn)
+        for failure in failures:
+            print(f"FAIL {failure}")
+        print(f"{len(QUERY_PLAN_CHECKS)} query plans checked, {len(failures)} failures")
+        conn.close()
+        sys.exit(1 if failures else 0)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
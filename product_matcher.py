@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BMC Product Matcher
+===================
+
+Homologates product descriptions reported in invoices against the
+productos_bmc catalog:
+- normalized exact-match hash index (desc_subya + desc_caracteristica, desc_subya)
+- token and trigram inverted indexes for fuzzy candidates (Dice similarity)
+- batch matching deduplicates names first: each distinct string is matched once
+
+Run the benchmark against a synthetic catalog:
+    python product_matcher.py --benchmark --catalog-size 50000
+"""
+
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+MIN_FUZZY_SCORE = 0.6
+TRIGRAM_WEIGHT = 0.7  # Remaining weight goes to token overlap
+MAX_POSTINGS = 2000  # Trigrams/tokens in more products are too common to generate candidates
+FUZZY_CANDIDATES = 25  # Candidates rescored exactly per query
+CANDIDATE_BUDGET = 4000  # Postings scanned per query, rarest keys first
+
+_NON_ALNUM_RE = re.compile(r'[^A-Z0-9]+')
+
+
+def normalize(text) -> str:
+    """Uppercase, strip accents and punctuation, collapse whitespace"""
+    if text is None:
+        return ''
+    # NFKD splits accented letters; the ascii encode drops the combining marks
+    text = unicodedata.normalize('NFKD', str(text).upper()).encode('ascii', 'ignore').decode('ascii')
+    return _NON_ALNUM_RE.sub(' ', text).strip()
+
+
+def trigrams(normalized: str) -> List[str]:
+    """Distinct character trigrams of a normalized string, padded at word boundaries"""
+    padded = f"  {normalized} "
+    return list({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+class ProductMatcher:
+    """In-memory index over productos_bmc"""
+
+    def __init__(self, products: List[Dict], min_score: float = MIN_FUZZY_SCORE):
+        self.products = products
+        self.min_score = min_score
+        self.stats = {'consultas': 0, 'distintas': 0, 'exactas': 0, 'aproximadas': 0, 'sinCoincidencia': 0}
+        self._stats_lock = threading.Lock()
+
+        self._exact: Dict[str, int] = {}
+        self._trigram_sets: List[frozenset] = []
+        self._token_sets: List[frozenset] = []
+        subya_counts = Counter(normalize(p.get('desc_subya')) for p in products)
+        postings = defaultdict(list)
+
+        for idx, product in enumerate(products):
+            subya = normalize(product.get('desc_subya'))
+            full = normalize(f"{product.get('desc_subya') or ''} {product.get('desc_caracteristica') or ''}")
+            self._exact.setdefault(full, idx)
+            # desc_subya alone only identifies the product when it is unique in the catalog
+            if subya and subya_counts[subya] == 1:
+                self._exact.setdefault(subya, idx)
+
+            tokens = frozenset(full.split())
+            grams = frozenset(trigrams(full))
+            self._token_sets.append(tokens)
+            self._trigram_sets.append(grams)
+            # Tokens and trigrams share one inverted index ('#' marks tokens)
+            for token in tokens:
+                postings['#' + token].append(idx)
+            for gram in grams:
+                postings[gram].append(idx)
+
+        self._postings = {k: np.array(v, dtype=np.int32) for k, v in postings.items() if len(v) <= MAX_POSTINGS}
+
+    @classmethod
+    def from_sqlite(cls, conn, **kwargs) -> 'ProductMatcher':
+        """Preload active products from the productos_bmc table"""
+        rows = conn.execute('''
+            SELECT codigo_bmc, desc_subya, desc_caracteristica, grupo
+            FROM productos_bmc
+            WHERE activo = 1
+        ''').fetchall()
+        columns = ('codigo_bmc', 'desc_subya', 'desc_caracteristica', 'grupo')
+        return cls([dict(zip(columns, row)) for row in rows], **kwargs)
+
+    def _result(self, text, idx: Optional[int], tipo: Optional[str], score: float) -> Dict:
+        result = {'entrada': text, 'tipo': tipo, 'puntaje': round(score, 4)}
+        if idx is None:
+            result.update(codigo_bmc=None, desc_subya=None, desc_caracteristica=None, grupo=None)
+        else:
+            product = self.products[idx]
+            result.update(
+                codigo_bmc=product.get('codigo_bmc'),
+                desc_subya=product.get('desc_subya'),
+                desc_caracteristica=product.get('desc_caracteristica'),
+                grupo=product.get('grupo'),
+            )
+        return result
+
+    def _fuzzy(self, normalized: str):
+        """Best candidate by weighted trigram/token Dice similarity"""
+        grams = frozenset(trigrams(normalized))
+        tokens = frozenset(normalized.split())
+        keys = list(grams) + ['#' + t for t in tokens]
+        hits = [self._postings[k] for k in keys if k in self._postings]
+        if not hits:
+            return None, 0.0
+
+        # Candidate generation: products sharing the most selective keys
+        hits.sort(key=len)
+        selected, scanned = [], 0
+        for postings in hits:
+            if selected and scanned + len(postings) > CANDIDATE_BUDGET:
+                break
+            selected.append(postings)
+            scanned += len(postings)
+        ids, counts = np.unique(np.concatenate(selected), return_counts=True)
+        if len(ids) > FUZZY_CANDIDATES:
+            ids = ids[np.argpartition(counts, -FUZZY_CANDIDATES)[-FUZZY_CANDIDATES:]]
+
+        best, best_score = None, 0.0
+        for idx in ids.tolist():
+            trigram_score = 2 * len(grams & self._trigram_sets[idx]) / (len(grams) + len(self._trigram_sets[idx]))
+            token_score = 2 * len(tokens & self._token_sets[idx]) / (len(tokens) + len(self._token_sets[idx]))
+            score = TRIGRAM_WEIGHT * trigram_score + (1 - TRIGRAM_WEIGHT) * token_score
+            if score > best_score:
+                best, best_score = idx, score
+        return best, best_score
+
+    def _match_normalized(self, text, normalized: str) -> Dict:
+        idx = self._exact.get(normalized)
+        if idx is not None:
+            return self._result(text, idx, 'exacto', 1.0)
+        if normalized:
+            idx, score = self._fuzzy(normalized)
+            if idx is not None and score >= self.min_score:
+                return self._result(text, idx, 'aproximado', score)
+        return self._result(text, None, None, 0.0)
+
+    def match(self, text) -> Dict:
+        """Match a single product description"""
+        return self.match_many([text])[text]
+
+    def match_many(self, texts: Iterable) -> Dict[str, Dict]:
+        """Match a batch; each distinct (normalized) description is matched only once"""
+        by_normalized: Dict[str, Dict] = {}
+        results: Dict = {}
+        total = 0
+        for text in texts:
+            total += 1
+            if text in results:
+                continue
+            normalized = normalize(text)
+            match = by_normalized.get(normalized)
+            if match is None:
+                match = by_normalized[normalized] = self._match_normalized(text, normalized)
+            results[text] = match if match['entrada'] == text else {**match, 'entrada': text}
+
+        with self._stats_lock:
+            self.stats['consultas'] += total
+            self.stats['distintas'] += len(by_normalized)
+            for match in by_normalized.values():
+                key = {'exacto': 'exactas', 'aproximado': 'aproximadas'}.get(match['tipo'], 'sinCoincidencia')
+                self.stats[key] += 1
+        return results
+
+
+def generate_catalog(size: int, seed: int = 7) -> List[Dict]:
+    """Synthetic catalog for benchmarks (unique desc_subya + desc_caracteristica pairs)"""
+    rng = np.random.default_rng(seed)
+    bases = ['PAPA', 'TOMATE', 'CEBOLLA', 'ZANAHORIA', 'LECHUGA', 'AREPA', 'QUESO', 'LECHE', 'ARROZ',
+             'FRIJOL', 'LENTEJA', 'MANGO', 'BANANO', 'AGUACATE', 'LIMON', 'PLATANO', 'YUCA', 'POLLO',
+             'CARNE', 'HUEVO', 'PANELA', 'CAFE', 'AZUCAR', 'SAL', 'ACEITE', 'HARINA', 'PASTA', 'MAIZ']
+    variants = ['CRIOLLA', 'PASTUSA', 'CHONTO', 'CABEZONA', 'ROMANA', 'BLANCA', 'AMARILLA', 'MOZARELLA',
+                'ENTERA', 'DESLACTOSADA', 'INTEGRAL', 'TOMMY', 'HASS', 'TAHITI', 'VERDE', 'MADURO',
+                'CAMPESINO', 'ORGANICO', 'PREMIUM', 'ECONOMICO', 'ROJA', 'NEGRA', 'DULCE', 'REFINADA']
+    units = ['KG', 'LB', 'G', 'L', 'ML', 'UND', 'BULTO', 'CANASTA', 'BOLSA', 'CAJA', 'PAQUETE']
+    groups = ['FRUTAS', 'VERDURAS', 'LACTEOS', 'GRANOS', 'PROTEINAS', 'ABARROTES']
+    catalog, seen = [], set()
+    while len(catalog) < size:
+        subya = f"{bases[rng.integers(len(bases))]} {variants[rng.integers(len(variants))]}"
+        caracteristica = f"{units[rng.integers(len(units))]} {int(rng.integers(1, 1000))}"
+        if (subya, caracteristica) in seen:
+            continue
+        seen.add((subya, caracteristica))
+        catalog.append({
+            'codigo_bmc': f"BMC{len(catalog):06d}",
+            'desc_subya': subya,
+            'desc_caracteristica': caracteristica,
+            'grupo': groups[rng.integers(len(groups))],
+        })
+    return catalog
+
+
+def run_benchmark(catalog_size: int, rows: int, distinct_ratio: float):
+    """Matches/sec on a synthetic batch with exact hits, accent/case noise and typos"""
+    import time
+
+    rng = np.random.default_rng(11)
+    inicio = time.perf_counter()
+    catalog = generate_catalog(catalog_size)
+    matcher = ProductMatcher(catalog)
+    print(f"Index: {catalog_size} products in {time.perf_counter() - inicio:.2f}s")
+
+    distinct = max(1, int(rows * distinct_ratio))
+    names, expected = [], {}
+    for i in range(distinct):
+        product = catalog[rng.integers(len(catalog))]
+        name = f"{product['desc_subya']} {product['desc_caracteristica']}"
+        kind = i % 4
+        if kind == 1:
+            name = name.lower().replace('a', 'á', 1)
+        elif kind == 2 and len(name) > 6:
+            pos = int(rng.integers(1, len(name) - 1))
+            name = name[:pos] + name[pos + 1:]  # dropped character
+        elif kind == 3:
+            name = f"{name} X{i}"  # unknown suffix
+        names.append(name)
+        expected[name] = product['codigo_bmc']
+    batch = [names[j] for j in rng.integers(0, distinct, rows)]
+
+    inicio = time.perf_counter()
+    results = matcher.match_many(batch)
+    elapsed = time.perf_counter() - inicio
+    tipos = Counter(r['tipo'] for r in results.values())
+    print(f"Batch: {rows} rows, {len(results)} distinct strings, {matcher.stats['distintas']} distinct normalized")
+    correct = sum(results[name]['codigo_bmc'] == codigo for name, codigo in expected.items())
+    print(f"Results: {dict(tipos)}, correct product for {correct / len(expected):.1%} of distinct names")
+    print(f"Time: {elapsed:.2f}s -> {matcher.stats['distintas'] / elapsed:,.0f} distinct matches/s, "
+          f"{rows / elapsed:,.0f} rows/s")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='BMC product matcher utilities')
+    parser.add_argument('--benchmark', action='store_true', help='Benchmark against a synthetic catalog')
+    parser.add_argument('--catalog-size', type=int, default=50_000)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--distinct-ratio', type=float, default=0.01)
+    args = parser.parse_args()
+    if args.benchmark:
+        run_benchmark(args.catalog_size, args.rows, args.distinct_ratio)
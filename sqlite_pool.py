@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite Pool
+===========
+
+Connection pool for the Flask API's SQLite database:
+- connections are opened once and reused (a thread that asks again while it
+  already holds one gets the same connection back)
+- WAL journal mode, so readers are never blocked by the single writer and
+  the writer is never blocked by readers
+- synchronous=NORMAL (durable across application crashes; WAL makes it safe),
+  busy_timeout so concurrent writers queue instead of failing with
+  "database is locked", mmap and a larger page cache for reads
+- per-connection prepared-statement cache (sqlite3 `cached_statements`):
+  the routes issue the same SQL strings, so they are compiled once
+
+conn.close() returns the connection to the pool instead of closing it, so
+code written for sqlite3.connect() works unchanged.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms a writer waits for the lock before raising
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # KiB (negative = size, not pages)
+    'temp_store': 'MEMORY',
+}
+
+
+class PoolTimeout(Exception):
+    """No connection became available within the pool timeout"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool"""
+
+    _pool: 'SQLitePool' = None
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def _close(self):
+        super().close()
+
+
+class SQLitePool:
+    """Bounded pool of tuned connections to one database file"""
+
+    def __init__(self, path: str, max_connections: int = 8, timeout: float = 10.0,
+                 cached_statements: int = 256, pragmas: Optional[Dict] = None):
+        self.path = path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self._idle: 'queue.LifoQueue[PooledConnection]' = queue.LifoQueue()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        self._stats = {'borrowed': 0, 'reused': 0, 'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0}
+
+    def _connect(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.path,
+            factory=PooledConnection,
+            check_same_thread=False,  # Connections move between request threads
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        conn._pool = self
+        return conn
+
+    def connection(self) -> PooledConnection:
+        """Borrow a connection; call close() (or use connect()) to give it back"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.max_connections:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except BaseException:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No SQLite connection available after {self.timeout}s")
+                with self._lock:
+                    self._stats['waits'] += 1
+                    self._stats['wait_seconds'] += time.perf_counter() - started
+        else:
+            with self._lock:
+                self._stats['reused'] += 1
+
+        with self._lock:
+            self._stats['borrowed'] += 1
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Return a connection (nested borrows from the same thread release on the outermost close)"""
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+        if conn.in_transaction:
+            # Never hand a half-finished transaction to the next request
+            conn.rollback()
+        if self._closed:
+            conn._close()
+        else:
+            self._idle.put(conn)
+
+    def release_thread(self):
+        """Give back whatever the current thread still holds (request teardown after an exception)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth = 1
+            self.release(conn)
+
+    @contextmanager
+    def connect(self):
+        conn = self.connection()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait()._close()
+            except queue.Empty:
+                return
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'connections': self._created,
+                'idle': self._idle.qsize(),
+                'max_connections': self.max_connections,
+                **self._stats,
+                'wait_seconds': round(self._stats['wait_seconds'], 4),
+            }
@@ -0,0 +1,68 @@
+"""
+Migrations applied to a fresh database: every hot query in QUERY_PLAN_CHECKS
+must use its index and never sort through a temp B-tree.
+
+The base tables mirror the DatabaseSetup schema columns the migrations and
+the checked queries touch.
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import MIGRATIONS, QUERY_PLAN_CHECKS, apply_migrations, query_plan, schema_version
+
+BASE_SCHEMA = '''
+    CREATE TABLE lotes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre_archivo TEXT, tipo_archivo TEXT,
+        fecha_carga TEXT DEFAULT CURRENT_TIMESTAMP,
+        estado TEXT, total_facturas INTEGER DEFAULT 0, facturas_procesadas INTEGER DEFAULT 0,
+        errores_productos INTEGER DEFAULT 0, errores_terceros INTEGER DEFAULT 0
+    );
+    CREATE TABLE facturas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, lote_id INTEGER REFERENCES lotes(id),
+        numero_factura TEXT, nit_tercero TEXT REFERENCES terceros(nit), fecha TEXT,
+        forma_pago TEXT, total REAL, tercero_valido INTEGER
+    );
+    CREATE TABLE items_factura (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, factura_id INTEGER REFERENCES facturas(id),
+        producto TEXT, codigo_bmc TEXT REFERENCES productos_bmc(codigo_bmc),
+        cantidad REAL, valor_unitario REAL, total REAL, iva REAL
+    );
+    CREATE TABLE terceros (
+        nit TEXT PRIMARY KEY, razon_social TEXT, tipo_tercero TEXT, ciudad TEXT, estado_dian TEXT
+    );
+    CREATE TABLE productos_bmc (
+        codigo_bmc TEXT PRIMARY KEY, desc_subya TEXT, desc_caracteristica TEXT, grupo TEXT, activo INTEGER
+    );
+'''
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    conn = sqlite3.connect(str(tmp_path_factory.mktemp('db') / 'migrations.db'))
+    conn.executescript(BASE_SCHEMA)
+    apply_migrations(conn)
+    yield conn
+    conn.close()
+
+
+def test_applies_every_migration_once(conn):
+    assert schema_version(conn) == MIGRATIONS[-1][0]
+    assert apply_migrations(conn) == []
+
+
+@pytest.mark.parametrize('name, sql, params, index', QUERY_PLAN_CHECKS, ids=[c[0] for c in QUERY_PLAN_CHECKS])
+def test_query_plan_uses_index(conn, name, sql, params, index):
+    plan = query_plan(conn, sql, params)
+    assert any(index in step for step in plan), plan
+    assert not any('TEMP B-TREE' in step for step in plan), plan
+
+
+def test_creates_tables_the_app_writes_at_runtime(conn):
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'file_hashes', 'dian_cache', 'table_versions'} <= tables